@@ -0,0 +1,38 @@
+"""Shared setup for the scripts in benchmarks/.
+
+Each script runs against a throwaway SQLite database (or `BENCH_DATABASE_URL`)
+so the checked-in db.sqlite3 is never touched.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def setup(migrate: bool = True):
+    db_url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp(prefix='bookx-bench-')}/bench.sqlite3"
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bookx.settings")
+    import django
+
+    django.setup()
+    if migrate:
+        from django.core.management import call_command
+
+        call_command("migrate", verbosity=0)
+    return db_url
+
+
+def timed(fn, repeat: int = 20):
+    """Return (p50, p95) wall time in milliseconds over `repeat` calls."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.95))]
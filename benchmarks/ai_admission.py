@@ -0,0 +1,200 @@
+"""Book-list latency while the AI endpoint is saturated, with and without admission control.
+
+One gunicorn gthread worker (`--threads` threads) on a seeded SQLite database,
+AI advice answered by benchmarks/fake_gemini.py after `--ai-delay` seconds.
+For each setup the list is timed twice: alone, then while AI advice requests
+with distinct prompts arrive at `--ai-rate` per second whether or not earlier
+ones have finished (open loop), far more than the model can answer.
+
+    off       no limiter: every AI request waits on the model
+    fallback  the default limiter; shed requests get the fallback suggestions
+    429       the default limiter; shed requests get 429 + Retry-After
+
+The per-caller quota is off in every setup (all load comes from one address).
+Reported: list p50/p95 and req/s, and how AI requests ended (model answer,
+fallback, 429) with their p50.
+
+    python benchmarks/ai_admission.py --seconds 10 --ai-rate 20 --ai-delay 2
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import fake_gemini
+from _bootstrap import ROOT
+from server_compare import free_port, stop, wait_healthy
+
+
+def run_clients(port, clients, seconds, path_for, classify):
+    """`clients` threads requesting back to back for `seconds`; returns ({outcome: [ms, ...]}, errors)."""
+    samples, errors, lock = {}, [0], threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(i):
+        conn, n = None, 0
+        while time.perf_counter() < deadline:
+            if conn is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path_for(i, n))
+                resp = conn.getresponse()
+                outcome = classify(resp.status, resp.read())
+                if resp.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                outcome, conn = None, None
+            with lock:
+                if outcome is None:
+                    errors[0] += 1
+                else:
+                    samples.setdefault(outcome, []).append((time.perf_counter() - t0) * 1000)
+            n += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, errors[0]
+
+
+def open_loop(port, rate, seconds, path_for, classify):
+    """One request every 1/`rate` seconds for `seconds`, each on its own connection; same result as run_clients."""
+    samples, errors, lock = {}, [0], threading.Lock()
+
+    def one(n):
+        t0 = time.perf_counter()
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        try:
+            conn.request("GET", path_for(0, n))
+            resp = conn.getresponse()
+            outcome = classify(resp.status, resp.read())
+        except (OSError, http.client.HTTPException):
+            outcome = None
+        finally:
+            conn.close()
+        with lock:
+            if outcome is None:
+                errors[0] += 1
+            else:
+                samples.setdefault(outcome, []).append((time.perf_counter() - t0) * 1000)
+
+    total = int(rate * seconds)
+    with ThreadPoolExecutor(max_workers=min(total, 1000) or 1) as pool:
+        start = time.perf_counter()
+        for n in range(total):
+            time.sleep(max(0.0, start + n / rate - time.perf_counter()))
+            pool.submit(one, n)
+    return samples, errors[0]
+
+
+def pick(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else 0.0
+
+
+def list_outcome(status, body):
+    return "ok" if status == 200 else None
+
+
+def ai_outcome(status, body):
+    if status == 429:
+        return "429"
+    if status != 200:
+        return None
+    return "fallback" if json.loads(body)["ai"].get("_warning") else "model"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--threads", type=int, default=4, help="GUNICORN_THREADS of the single worker")
+    ap.add_argument("--list-clients", type=int, default=2)
+    ap.add_argument("--ai-rate", type=float, default=20, help="AI requests per second")
+    ap.add_argument("--ai-delay", type=float, default=2.0, help="fake Gemini latency (s)")
+    args = ap.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="bookx-admission-"))
+    app_dir = work / "app"
+    shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns(".git", "db.sqlite3", "media", "staticfiles", "__pycache__"))
+    gemini = fake_gemini.start(delay=args.ai_delay)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{work}/serve.sqlite3",
+        "DEBUG": "0",
+        "GEMINI_BASE_URL": gemini.url,
+        "GEMINI_TIMEOUT": str(args.ai_delay * 10),
+        "REQUEST_LOG_LEVEL": "WARNING",
+        "WEB_CONCURRENCY": "1",
+        "GUNICORN_THREADS": str(args.threads),
+        "GUNICORN_TIMEOUT": str(int(args.ai_delay * 10 + 30)),
+        "AI_RATE_PER_MINUTE": "0",
+    }
+    manage = [sys.executable, "manage.py"]
+    subprocess.run(manage + ["migrate", "-v0"], cwd=app_dir, env=env, check=True)
+    subprocess.run(manage + ["seed_books", "--count", str(args.rows)], cwd=app_dir, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    setups = [
+        ("off", {"AI_MAX_CONCURRENCY": "1000", "AI_QUEUE_SIZE": "0"}),
+        ("fallback", {}),
+        ("429", {"AI_SHED_RESPONSE": "429"}),
+    ]
+    print(f"rows={args.rows} cpus={os.cpu_count()} 1 gthread worker x {args.threads} threads, "
+          f"ai upstream delay={args.ai_delay}s, {args.ai_rate:g} AI requests/s, {args.list_clients} list clients")
+    print(f"{'setup':>9} {'AI load':>8} {'list rps':>9} {'p50 ms':>8} {'p95 ms':>8}   AI requests (p50 ms)")
+    for name, extra in setups:
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn"], cwd=app_dir, env={**env, **extra, "PORT": str(port)},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        try:
+            wait_healthy(port, proc)
+            list_path = lambda i, n: "/api/books/?page_size=20"
+            run_clients(port, args.list_clients, 1, list_path, list_outcome)  # warm-up
+            for loaded in (False, True):
+                ai = {}
+                if loaded:
+                    def flood():
+                        ai.update(zip(("samples", "errors"), open_loop(
+                            port, args.ai_rate, args.seconds + 2,
+                            lambda i, n: f"/api/ai/books/advice/?prompt=admission+{name}+{n}", ai_outcome,
+                        )))
+
+                    flooder = threading.Thread(target=flood)
+                    flooder.start()
+                    time.sleep(2)  # let the AI requests fill the worker first
+                samples, errors = run_clients(port, args.list_clients, args.seconds, list_path, list_outcome)
+                if loaded:
+                    flooder.join()
+                ok = samples.get("ok", [])
+                ai_text = "-"
+                if loaded:
+                    counts = Counter({k: len(v) for k, v in ai["samples"].items()})
+                    ai_text = "  ".join(f"{k}={counts[k]} ({pick(ai['samples'][k], 0.5):.0f})"
+                                        for k in ("model", "fallback", "429") if counts[k])
+                    ai_text += f"  errors={ai['errors']}" if ai["errors"] else ""
+                print(f"{name:>9} {'yes' if loaded else 'no':>8} {len(ok) / args.seconds:>9.1f} "
+                      f"{pick(ok, 0.5):>8.1f} {pick(ok, 0.95):>8.1f}   {ai_text}"
+                      + (f"  list errors={errors}" if errors else ""))
+        finally:
+            stop(proc)
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Nightly-style advice for many prompts: one request per prompt vs one batch request.
+
+Both run through bookx.asgi against benchmarks/fake_gemini.py (fixed upstream
+delay, advice derived from the prompt so every prompt matches different
+books). "single" posts each prompt to /api/ai/books/advice/async/ with
+`--concurrency` requests in flight; "batch" posts all of them to
+/api/ai/books/advice/batch/ with AI_BATCH_CONCURRENCY set to the same value.
+The prompt list repeats `--unique` distinct prompts; the advice cache is
+cleared before each run.
+
+Reported: wall time, time to the first result, model calls, SQL queries.
+With `--fail-rate` some upstream calls fail; every prompt still gets a line.
+
+    python benchmarks/ai_batch.py --rows 20000 --prompts 400 --unique 300 --delay 0.2 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import fake_gemini
+from _bootstrap import setup
+from search import fill, vocabulary
+
+
+class QueryCounter:
+    """Counts statements on every connection (the async views query from pool threads)."""
+
+    def __init__(self):
+        self.n = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.n += 1
+        return execute(sql, params, many, context)
+
+
+async def _post(app, path, payload, token, on_chunk=None):
+    body = json.dumps(payload).encode()
+    sent = asyncio.Event()
+    status = {}
+
+    async def receive():
+        if not sent.is_set():
+            sent.set()
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # never disconnects
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body") and on_chunk:
+            on_chunk(message["body"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"content-type", b"application/json"),
+                    (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 5000), "server": ("localhost", 80),
+    }
+    await app(scope, receive, send)
+    return status.get("code")
+
+
+def run_single(app, prompts, token, concurrency):
+    first = []
+
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(prompt):
+            async with gate:
+                code = await _post(app, "/api/ai/books/advice/async/", {"prompt": prompt}, token)
+                first.append(time.perf_counter())
+                return code
+
+        return await asyncio.gather(*[one(p) for p in prompts])
+
+    t0 = time.perf_counter()
+    codes = asyncio.run(main())
+    return time.perf_counter() - t0, min(first) - t0, sum(1 for c in codes if c == 200)
+
+
+def run_batch(app, prompts, token):
+    first = []
+    buf = bytearray()
+
+    def on_chunk(chunk):
+        if not first:
+            first.append(time.perf_counter())
+        buf.extend(chunk)
+
+    t0 = time.perf_counter()
+    code = asyncio.run(_post(app, "/api/ai/books/advice/batch/", {"prompts": prompts}, token, on_chunk))
+    elapsed = time.perf_counter() - t0
+    lines = [json.loads(line) for line in bytes(buf).splitlines() if line]
+    assert code == 200 and sorted(l["index"] for l in lines) == list(range(len(prompts))), code
+    return elapsed, first[0] - t0, len(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--prompts", type=int, default=400)
+    ap.add_argument("--unique", type=int, default=300, help="distinct prompts among --prompts")
+    ap.add_argument("--delay", type=float, default=0.2, help="fake Gemini latency (s)")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    args = ap.parse_args()
+
+    rnd = random.Random(11)
+    vocab = vocabulary(rnd)
+    srv = fake_gemini.start(delay=args.delay, fail_rate=args.fail_rate)
+
+    def advice(request):
+        # "User prompt: w1 w2 w3 w4 w5\n\n..." -> topics and suggestions from those words
+        text = json.loads(request)["contents"][0]["parts"][0]["text"]
+        words = text.split("\n", 1)[0].split(": ", 1)[1].split()
+        return {
+            "query_intent": " ".join(words),
+            "topics": words[:2],
+            "suggested_books": [{"title": f"{words[2]} {words[3]}", "author": words[4], "why": "bench"}],
+        }
+
+    srv.advice = advice
+    os.environ["GEMINI_BASE_URL"] = srv.url
+    os.environ.setdefault("GEMINI_TIMEOUT", str(args.delay * 10 + 5))
+    os.environ["AI_BATCH_CONCURRENCY"] = str(args.concurrency)
+    os.environ.setdefault("GEMINI_POOL_SIZE", str(args.concurrency))
+    os.environ.setdefault("AI_BATCH_MAX_PROMPTS", str(max(args.prompts, 1000)))
+    # one user sends everything and calls never exceed --concurrency: no quota, nothing shed
+    os.environ.setdefault("AI_RATE_PER_MINUTE", "0")
+    os.environ.setdefault("AI_MAX_CONCURRENCY", str(args.concurrency))
+    os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.db.backends.signals import connection_created
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from bookx.asgi import application
+    from books.ai_cache import get_advice_cache
+
+    user = get_user_model().objects.create(username="bench")
+    fill(args.rows, user, vocab, [1 / (i + 1) for i in range(len(vocab))])
+    token = str(RefreshToken.for_user(user).access_token)
+
+    distinct = [" ".join(rnd.choices(vocab[:3000], k=5)) for _ in range(args.unique)]
+    prompts = [distinct[i % args.unique] for i in range(args.prompts)]
+    rnd.shuffle(prompts)
+
+    counter = QueryCounter()
+    connection_created.connect(lambda sender, connection, **kw: connection.execute_wrappers.append(counter), weak=False)
+    from django.db import connections
+
+    for conn in connections.all():
+        conn.close()
+
+    print(f"rows={args.rows} prompts={args.prompts} (unique {args.unique}) delay={args.delay}s "
+          f"concurrency={args.concurrency} db={os.environ['DATABASE_URL'].split(':', 1)[0]}")
+    print(f"{'mode':>7} {'wall s':>7} {'first s':>8} {'items':>6} {'model calls':>12} {'queries':>8}")
+    for name, fn in (
+        ("single", lambda: run_single(application, prompts, token, args.concurrency)),
+        ("batch", lambda: run_batch(application, prompts, token)),
+    ):
+        get_advice_cache().clear()
+        hits, counter.n = srv.hits, 0
+        elapsed, first, items = fn()
+        print(f"{name:>7} {elapsed:>7.2f} {first:>8.2f} {items:>6} {srv.hits - hits:>12} {counter.n:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""How many concurrent advice requests one process holds: sync view vs async view.
+
+Both variants talk to benchmarks/fake_gemini.py with a fixed upstream delay.
+"sync" drives the WSGI stack from `--threads` worker threads (gunicorn sync
+worker = 1); "async" drives the ASGI app with all requests in flight at once.
+
+    python benchmarks/ai_concurrency.py --requests 200 --delay 1.0 --threads 4
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_gemini
+from _bootstrap import setup
+
+
+class _Gauge:
+    def __init__(self):
+        self.now = self.peak = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.now += 1
+            self.peak = max(self.peak, self.now)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.now -= 1
+
+
+def run_sync(n, threads):
+    from django.test import Client
+
+    gauge = _Gauge()
+
+    def one(i):
+        with gauge:
+            resp = Client().get("/api/ai/books/advice/", {"prompt": f"sync prompt {i}"})
+        return resp.status_code
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        codes = list(pool.map(one, range(n)))
+    return time.perf_counter() - t0, gauge.peak, codes
+
+
+async def _asgi_get(app, path, query, gauge):
+    done = asyncio.Event()
+    status = {}
+
+    async def receive():
+        if not status.get("sent_body"):
+            status["sent_body"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 5000), "server": ("localhost", 80),
+    }
+    with gauge:
+        await app(scope, receive, send)
+    return status.get("code")
+
+
+def run_async(n):
+    from bookx.asgi import application
+
+    gauge = _Gauge()
+
+    async def main():
+        return await asyncio.gather(*[
+            _asgi_get(application, "/api/ai/books/advice/async/", f"prompt=async+prompt+{i}", gauge) for i in range(n)
+        ])
+
+    t0 = time.perf_counter()
+    codes = asyncio.run(main())
+    return time.perf_counter() - t0, gauge.peak, codes
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--delay", type=float, default=1.0)
+    ap.add_argument("--threads", type=int, default=1, help="threads of the sync worker being compared")
+    args = ap.parse_args()
+
+    srv = fake_gemini.start(delay=args.delay)
+    os.environ["GEMINI_BASE_URL"] = srv.url
+    os.environ.setdefault("GEMINI_TIMEOUT", str(args.delay * 5))
+    # measures what the process can hold, so admission (books/admission.py) is out of the way
+    os.environ.setdefault("AI_RATE_PER_MINUTE", "0")
+    os.environ.setdefault("AI_MAX_CONCURRENCY", str(args.requests))
+    setup()
+
+    for name, fn in (("sync", lambda: run_sync(args.requests, args.threads)), ("async", lambda: run_async(args.requests))):
+        elapsed, peak, codes = fn()
+        ok = sum(1 for c in codes if c == 200)
+        print(f"{name:>5}: {ok}/{len(codes)} ok in {elapsed:6.2f}s  peak in-flight={peak:<4} "
+              f"throughput={ok / elapsed:7.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
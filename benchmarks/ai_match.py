@@ -0,0 +1,73 @@
+"""AIAdviceView._match cost vs number of terms in the model output.
+
+Compares the previous unbounded icontains OR-chain with the bounded ranked
+query: queries issued while serializing, SQL size and latency.
+
+    python benchmarks/ai_match.py --rows 20000 --terms 1 5 25 100 500
+"""
+import argparse
+
+from _bootstrap import setup, timed
+from search import fill, vocabulary
+
+
+def legacy_match(data):
+    from django.db.models import Q
+    from books.models import Book
+
+    q_objects = Q()
+    for t in [t.lower() for t in data.get("topics", [])]:
+        q_objects |= Q(title__icontains=t) | Q(description__icontains=t) | Q(author__icontains=t)
+    for s in data.get("suggested_books", []):
+        if s.get("title"):
+            q_objects |= Q(title__icontains=s["title"])
+        if s.get("author"):
+            q_objects |= Q(author__icontains=s["author"])
+    return Book.objects.filter(is_active=True).filter(q_objects).distinct()[:50]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--terms", type=int, nargs="+", default=[1, 5, 25, 100, 500])
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+    setup()
+
+    import random
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from books.serializers import BookSerializer
+    from books.views import AIAdviceView
+
+    rnd = random.Random(7)
+    vocab = vocabulary(rnd)
+    fill(args.rows, get_user_model().objects.create(username="bench"), vocab, [1 / (i + 1) for i in range(len(vocab))])
+    view = AIAdviceView()
+
+    print(f"{'terms':>6} | {'legacy q':>8} {'sql KB':>7} {'p50 ms':>8} | {'bounded q':>9} {'sql KB':>7} {'p50 ms':>8}")
+    for n in args.terms:
+        data = {
+            "topics": [vocab[rnd.randrange(50, 2000)] for _ in range(n)],
+            "suggested_books": [
+                {"title": f"{vocab[rnd.randrange(2000)]} {vocab[rnd.randrange(2000)]}", "author": vocab[rnd.randrange(2000)]}
+                for _ in range(n)
+            ],
+        }
+        row = []
+        for fn in (legacy_match, lambda d: view._match(d)[0]):
+            def run():
+                return BookSerializer(fn(data), many=True, context={"request": None}).data
+
+            with CaptureQueriesContext(connection) as ctx:
+                run()
+            sql_kb = sum(len(q["sql"]) for q in ctx.captured_queries) / 1024
+            p50, _ = timed(run, args.repeat)
+            row.append((len(ctx.captured_queries), sql_kb, p50))
+        (lq, lk, lt), (bq, bk, bt) = row
+        print(f"{n:>6} | {lq:>8} {lk:>7.1f} {lt:>8.2f} | {bq:>9} {bk:>7.1f} {bt:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Authenticated requests with simplejwt's JWTAuthentication vs books.authentication.CachedJWTAuthentication.
+
+Same JWT, same requests through the Django test client; only the view's
+authentication class changes. Reported per request: SQL statements (all of
+them, and those reading the auth_user table itself rather than joining it) and
+p50/p95 latency.
+
+    python benchmarks/auth.py --rows 5000
+"""
+import argparse
+import os
+
+from _bootstrap import setup, timed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+    os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+    os.environ.setdefault("BOOKS_AUTH_CACHE_ALIAS", "default")  # one process, so locmem is exact here
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from books.authentication import CachedJWTAuthentication
+    from books.models import Book
+    from books.views import BookViewSet
+
+    call_command("seed_books", count=args.rows, verbosity=0)
+    user = get_user_model().objects.create(username="bench")
+    auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+    client = Client()
+    pk = Book.objects.create(owner=user, title="bench", location="Tashkent").pk
+
+    requests = {
+        "create": lambda: client.post("/api/books/", {"title": "New", "location": "Bukhara"},
+                                      content_type="application/json", **auth),
+        "patch": lambda: client.patch(f"/api/books/{pk}/", {"title": "Renamed"}, content_type="application/json", **auth),
+        "detail": lambda: client.get(f"/api/books/{pk}/", **auth),
+        "list": lambda: client.get("/api/books/?page_size=20", **auth),
+    }
+
+    print(f"{'auth class':>24} {'request':>8} {'queries':>8} {'user reads':>10} {'p50 ms':>7} {'p95 ms':>7}")
+    for auth_class in (JWTAuthentication, CachedJWTAuthentication):
+        BookViewSet.authentication_classes = [auth_class]
+        for name, fn in requests.items():
+            fn()  # warm: caches, principal
+            with CaptureQueriesContext(connection) as ctx:
+                response = fn()
+            assert response.status_code < 300, (name, response.status_code)
+            sql = [q["sql"] for q in ctx.captured_queries]
+            user_reads = sum('FROM "auth_user"' in q for q in sql)
+            p50, p95 = timed(fn, args.repeat)
+            print(f"{auth_class.__name__:>24} {name:>8} {len(sql):>8} {user_reads:>10} "
+                  f"{p50:>7.2f} {p95:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
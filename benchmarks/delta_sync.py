@@ -0,0 +1,83 @@
+"""Refreshing a client copy: re-downloading /api/books/ vs the /api/books/changes/ delta feed.
+
+After an initial sync, `--churn` of the rows are edited, deactivated or deleted;
+then both refresh strategies run and report bytes, queries and time.
+
+    python benchmarks/delta_sync.py --rows 20000 --churn 0.001 0.01
+"""
+import argparse
+import os
+import random
+import time
+from datetime import timedelta
+
+from _bootstrap import setup
+from search import fill, vocabulary
+
+
+def walk(client, url, params):
+    """Follow `next` to the end; returns (bytes, pages, queries, seconds, last body)."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    total = pages = 0
+    t0 = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx:
+        while url:
+            resp = client.get(url, params)
+            params = None
+            total += len(resp.content)
+            pages += 1
+            body = resp.json()
+            url = body["next"]
+    return total, pages, len(ctx.captured_queries), time.perf_counter() - t0, body
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--churn", type=float, nargs="+", default=[0.001, 0.01])
+    args = ap.parse_args()
+    os.environ.setdefault("BOOKS_SYNC_LAG_SECONDS", "0")
+    os.environ.setdefault("BOOKS_TASKS_MODE", "sync")
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.test import Client, override_settings
+    from django.utils import timezone
+    from books.models import Book
+
+    rnd = random.Random(9)
+    vocab = vocabulary(rnd)
+    fill(args.rows, get_user_model().objects.create(username="bench"), vocab, [1 / (i + 1) for i in range(len(vocab))])
+    client = Client()
+    page = {"page_size": 100}
+
+    print(f"rows={args.rows}")
+    print(f"{'churn':>6} {'changed':>7} | {'full KB':>8} {'pages':>5} {'queries':>7} {'ms':>8} | "
+          f"{'delta KB':>8} {'pages':>5} {'queries':>7} {'ms':>8}")
+    with override_settings(BOOKS_QUERY_CACHE_ALIAS=""):
+        # a new client downloads the list once, then syncs from when it started
+        started = timezone.now() - timedelta(minutes=5)
+        cursor = walk(client, "/api/books/changes/", {**page, "updated_since": started.isoformat()})[-1]["cursor"]
+        for churn in args.churn:
+            time.sleep(0.01)
+            n = max(1, int(Book.objects.count() * churn))
+            ids = list(Book.objects.filter(is_active=True).values_list("id", flat=True))
+            for i, pk in enumerate(rnd.sample(ids, n)):
+                book = Book.objects.get(pk=pk)
+                if i % 5 == 3:
+                    book.delete()
+                else:
+                    book.is_active = i % 5 != 4
+                    book.title += " (2nd ed.)"
+                    book.save()
+            full = walk(client, "/api/books/", page)
+            delta = walk(client, "/api/books/changes/", {**page, "cursor": cursor})
+            cursor = delta[-1]["cursor"]
+            print(f"{churn:>6.1%} {n:>7} | {full[0] / 1024:>8.0f} {full[1]:>5} {full[2]:>7} {full[3] * 1000:>8.0f} | "
+                  f"{delta[0] / 1024:>8.1f} {delta[1]:>5} {delta[2]:>7} {delta[3] * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Pulling the whole catalogue: following `next` through /api/books/ vs one /api/books/export/ stream.
+
+Seeds `--rows` books with `seed_books`, then through the Django test client:
+
+    paged     GET /api/books/?page_size=100 and every `next` page (what clients did before)
+    ndjson    GET /api/books/export/
+    csv       GET /api/books/export/?output=csv
+
+Reported: time to first byte, total time and rows/s; then, in a second pass
+under tracemalloc, peak Python heap while the export is consumed and thrown
+away. Paging is skipped above `--paged-max` rows (10k requests per 1M rows).
+
+    python benchmarks/export.py --rows 100000 1000000
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from _bootstrap import setup
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    ap.add_argument("--page-size", type=int, default=100)
+    ap.add_argument("--paged-max", type=int, default=200000)
+    args = ap.parse_args()
+    os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+    setup()
+
+    from django.core.management import call_command
+    from django.test import Client
+    from books.models import Book
+
+    client = Client()
+
+    def paged():
+        t0 = time.perf_counter()
+        first, n = None, 0
+        url = f"/api/books/?page_size={args.page_size}"
+        while url:
+            data = client.get(url).json()
+            first = first or time.perf_counter() - t0
+            n += len(data["results"])
+            url = data["next"]
+        return first, n
+
+    def export(output):
+        t0 = time.perf_counter()
+        response = client.get(f"/api/books/export/?output={output}")
+        first, lines = None, 0
+        for chunk in response.streaming_content:
+            first = first or time.perf_counter() - t0
+            lines += chunk.count(b"\n")
+        return first, lines - (output == "csv")
+
+    print(f"{'rows':>8} {'path':>7} {'first ms':>9} {'total s':>8} {'rows/s':>8} {'peak MiB':>9}")
+    for n in args.rows:
+        have = Book.objects.count()
+        if n > have:
+            call_command("seed_books", count=n - have, seed=n, inactive_ratio=0, verbosity=0)
+        active = Book.objects.filter(is_active=True).count()
+        client.get("/api/books/?page_size=1")  # first-request imports/URL resolution out of the timings
+        paths = [("ndjson", lambda: export("ndjson")), ("csv", lambda: export("csv"))]
+        if n <= args.paged_max:
+            paths.insert(0, ("paged", paged))
+        for name, fn in paths:
+            t0 = time.perf_counter()
+            first, got = fn()
+            total = time.perf_counter() - t0
+            assert got == active, (name, got, active)
+            peak = ""
+            if name != "paged":
+                tracemalloc.start()
+                fn()
+                peak = f"{tracemalloc.get_traced_memory()[1] / 2**20:.1f}"
+                tracemalloc.stop()
+            print(f"{n:>8} {name:>7} {first * 1000:>9.1f} {total:>8.1f} {got / total:>8.0f} {peak:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Ads per location/author: GROUP BY on every request vs the maintained counters (books.facets).
+
+Seeds `--rows` books with `seed_books`, then times:
+
+    group by    COUNT(*) per location and per author over the whole table
+    counters    facets.top_counts(), what /api/books/facets/ serves unfiltered
+    filtered    facets.matching_counts() for a search term, and for one location
+
+and what keeping the counters costs a write (create / update location /
+update title / delete), with the facet signal handlers connected vs not.
+
+    python benchmarks/facets.py --rows 50000 200000
+"""
+import argparse
+
+from _bootstrap import setup, timed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[50000, 200000])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    setup()
+
+    from django.core.management import call_command
+    from django.db.models import Count
+    from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+    from books import facets, signals
+    from books.models import Book
+    from books.search import canonical, get_search_backend
+
+    handlers = (
+        (pre_save, signals.facets_snapshot, "books.facets_snapshot"),
+        (post_save, signals.facets_save, "books.facets_save"),
+        (pre_delete, signals.facets_delete_snapshot, "books.facets_delete_snapshot"),
+        (post_delete, signals.facets_delete, "books.facets_delete"),
+    )
+
+    def group_by():
+        active = Book.objects.filter(is_active=True).order_by()
+        list(active.values("location").annotate(n=Count("*")).order_by("-n")[:20])
+        list(active.values("author").annotate(n=Count("*")).order_by("-n")[:20])
+
+    def writes():
+        book = Book.objects.create(owner_id=owner, title="bench", author="Bench Author", location="Benchville")
+        book.location = "Benchtown"
+        book.save()
+        book.title = "bench 2"
+        book.save()
+        book.delete()
+
+    print(f"{'rows':>8} | {'group by':>9} {'counters':>9} {'q':>9} {'location':>9} | "
+          f"{'write, no facets':>16} {'write, facets':>13}   (p50 ms)")
+    for n in args.rows:
+        have = Book.objects.count()
+        if n > have:
+            call_command("seed_books", count=n - have, seed=n, verbosity=0)
+        owner = Book.objects.values_list("owner_id", flat=True).first()
+        word = Book.objects.values_list("title", flat=True).first().split()[-1]
+        location = Book.objects.values_list("location", flat=True).first()
+        base = Book.objects.filter(is_active=True)
+
+        row = [timed(group_by, args.repeat)[0], timed(lambda: facets.top_counts(20), args.repeat)[0]]
+        row.append(timed(lambda: facets.matching_counts(get_search_backend().search(base, q=word), 20), args.repeat)[0])
+        row.append(timed(lambda: facets.matching_counts(base.filter(location_key=canonical(location)), 20),
+                         args.repeat)[0])
+        for signal, handler, uid in handlers:
+            signal.disconnect(sender=Book, dispatch_uid=uid)
+        row.append(timed(writes, args.repeat)[0])
+        for signal, handler, uid in handlers:
+            signal.connect(handler, sender=Book, dispatch_uid=uid)
+        row.append(timed(writes, args.repeat)[0])
+        print(f"{n:>8} | {row[0]:>9.2f} {row[1]:>9.2f} {row[2]:>9.2f} {row[3]:>9.2f} | {row[4]:>16.2f} {row[5]:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Local stand-in for the Gemini `generateContent` endpoint.
+
+    python benchmarks/fake_gemini.py --port 8765 --delay 1.5 --fail-rate 0.2
+    GEMINI_BASE_URL=http://127.0.0.1:8765 python manage.py runserver
+
+Also importable: `start(delay=..., fail_rate=..., status=...)` returns the
+running server; its `url` attribute is the base URL and `hits` counts requests.
+Set its `advice` attribute to a function of the request text to vary the answer.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ADVICE = {
+    "query_intent": "stop procrastinating",
+    "topics": ["habits", "focus", "procrastination"],
+    "suggested_books": [
+        {"title": "Atomic Habits", "author": "James Clear", "why": "Small habits compound."},
+        {"title": "Deep Work", "author": "Cal Newport", "why": "Train sustained focus."},
+    ],
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def do_POST(self):
+        srv = self.server
+        request = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with srv.lock:
+            srv.hits += 1
+            srv.connections.add(self.client_address)
+        if srv.delay:
+            time.sleep(srv.delay)
+        if srv.status >= 400 or random.random() < srv.fail_rate:
+            body, status = b'{"error": {"message": "fake failure"}}', srv.status if srv.status >= 400 else 503
+        else:
+            text = json.dumps(srv.advice(request.decode()) if srv.advice else ADVICE)
+            body = json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]}).encode()
+            status = 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start(port: int = 0, delay: float = 0.0, fail_rate: float = 0.0, status: int = 200) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    srv.daemon_threads = True
+    srv.delay, srv.fail_rate, srv.status = delay, fail_rate, status
+    srv.hits, srv.connections, srv.lock = 0, set(), threading.Lock()
+    srv.advice = None
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}"
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    srv = start(args.port, args.delay, args.fail_rate)
+    print(f"fake Gemini on {srv.url}")
+    threading.Event().wait()
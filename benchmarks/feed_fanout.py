@@ -0,0 +1,223 @@
+"""Live feed (/api/books/feed/) capacity and fan-out latency, in-process through bookx.asgi.
+
+Opens `--subscribers` SSE streams or WebSockets (a third filter on a word the
+published books carry, a third on a location they don't, the rest unfiltered),
+then saves `--events` books one at a time and times save -> delivery on every
+matching connection. Also checks that a connection past
+BOOKS_FEED_MAX_SUBSCRIBERS is refused (503 / close 1013), that a stalled reader
+is cut off with `overflow` without delaying the others, and that disconnects
+release their subscriptions.
+
+    python benchmarks/feed_fanout.py --subscribers 100 1000 --events 20 --transport sse ws
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+
+from _bootstrap import setup
+
+
+class Client:
+    """Minimal in-process ASGI client for one feed connection."""
+
+    def __init__(self, app, query="", on_event=None, paused=False):
+        self.app = app
+        self.query = query
+        self.on_event = on_event
+        self.status = None
+        self.events = []
+        self.closed = asyncio.Event()
+        self.reading = asyncio.Event()  # cleared = a reader that has stopped consuming
+        if not paused:
+            self.reading.set()
+
+    def deliver(self, event):
+        self.events.append(event)
+        if self.on_event:
+            self.on_event(self, event, time.perf_counter())
+
+    def scope(self, kind, path, headers):
+        return {
+            "type": kind, "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http" if kind == "http" else "ws",
+            "path": path, "raw_path": path.encode(), "query_string": self.query.encode(),
+            "headers": [(b"host", b"localhost")] + headers, "client": ("127.0.0.1", 5000), "server": ("localhost", 80),
+        }
+
+
+class SSEClient(Client):
+    ok = 200
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requested = False
+        self._buffer = ""
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            return
+        self._buffer += message.get("body", b"").decode()
+        while "\n\n" in self._buffer:
+            block, self._buffer = self._buffer.split("\n\n", 1)
+            data = [line[6:] for line in block.split("\n") if line.startswith("data: ")]
+            if data:
+                self.deliver(json.loads(data[0]))
+        await self.reading.wait()
+
+    async def run(self):
+        scope = self.scope("http", "/api/books/feed/", [(b"accept", b"text/event-stream")])
+        await self.app({**scope, "method": "GET"}, self.receive, self.send)
+
+
+class WSClient(Client):
+    ok = 101
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connected = False
+
+    async def receive(self):
+        if not self._connected:
+            self._connected = True
+            return {"type": "websocket.connect"}
+        await self.closed.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def send(self, message):
+        if message["type"] == "websocket.accept":
+            self.status = 101
+        elif message["type"] == "websocket.close":
+            self.status = self.status or message.get("code")
+        elif message["type"] == "websocket.send":
+            self.deliver(json.loads(message["text"]))
+            await self.reading.wait()
+
+    async def run(self):
+        await self.app(self.scope("websocket", "/api/books/feed/ws/", []), self.receive, self.send)
+
+
+def pct(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+async def wait_for(predicate, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.005)
+
+
+async def run(transport, n, events, owner):
+    from django.conf import settings
+
+    from bookx.asgi import application
+    from books.feed import get_hub
+    from books.models import Book
+
+    hub = get_hub()
+    hub.max_subscribers = n + 1  # room for the stalled reader below
+    saved_at, latencies, pending = {}, [], {}
+
+    def on_event(client, event, now):
+        title = event["book"]["title"]
+        if event.get("type") == "created" and title in saved_at:
+            latencies.append((now - saved_at[title]) * 1000)
+            pending[title] -= 1
+
+    queries = ["q=harbour", "location=Nowhere", ""]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    clients = [transport(application, queries[i % 3], on_event) for i in range(n)]
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(c.run()) for c in clients]
+    await wait_for(lambda: hub.stats()["subscribers"] == n and all(c.status == transport.ok for c in clients), timeout=300)
+    connect_s = time.perf_counter() - t0
+    per_sub_kb = (tracemalloc.get_traced_memory()[0] - before) / n / 1024
+    tracemalloc.stop()
+    expected = sum(1 for i in range(n) if i % 3 != 1)
+
+    def save(i):
+        # registered before the save: delivery can beat create() returning
+        title = f"Harbour lights {transport.__name__} {n}-{i}"
+        pending[title] = expected
+        saved_at[title] = time.perf_counter()
+        Book.objects.create(owner=owner, title=title, author="Feed Bench", location="Lisbon")
+        return title
+
+    fanout = []
+    for i in range(events):
+        title = await asyncio.to_thread(save, i)
+        await wait_for(lambda: pending[title] <= 0)
+        fanout.append((time.perf_counter() - saved_at[title]) * 1000)
+
+    # capacity: the stalled reader takes the last slot, one more is refused
+    stalled = transport(application, "", paused=True)
+    stalled_task = asyncio.create_task(stalled.run())
+    await wait_for(lambda: hub.stats()["subscribers"] == n + 1)
+    refused = transport(application)
+    await refused.run()
+
+    # backpressure: a burst bigger than the buffer cuts off the stalled reader only
+    burst = settings.BOOKS_FEED_BUFFER + 20
+    overflows_before = hub.stats()["overflows"]
+    titles = [await asyncio.to_thread(save, events + i) for i in range(burst)]
+    await wait_for(lambda: all(pending[t] <= 0 for t in titles), timeout=120)
+    stalled.reading.set()  # let it read what it has: one event in flight, then `overflow`
+    await asyncio.wait_for(stalled_task, 30)
+    cut_off = hub.stats()["overflows"] > overflows_before and stalled.events[-1]["type"] == "overflow"
+
+    for c in clients:
+        c.closed.set()
+    await asyncio.wait_for(asyncio.gather(*tasks), 60)
+    return {
+        "connect_s": connect_s,
+        "kb_per_subscriber": per_sub_kb,
+        "expected": expected,
+        "p50": pct(latencies, 0.50),
+        "p95": pct(latencies, 0.95),
+        "fanout_p50": pct(fanout, 0.50),
+        "fanout_max": max(fanout),
+        "refused": refused.status,
+        "cut_off": cut_off,
+        "left": hub.stats()["subscribers"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000])
+    ap.add_argument("--events", type=int, default=20)
+    ap.add_argument("--transport", nargs="+", choices=["sse", "ws"], default=["sse", "ws"])
+    args = ap.parse_args()
+
+    os.environ.setdefault("BOOKS_TASKS_MODE", "sync")
+    os.environ["BOOKS_FEED_BROKER"] = "books.feed.LocalBroker"
+    os.environ["BOOKS_INSTRUMENTATION"] = "0"
+    setup()
+    from django.contrib.auth import get_user_model
+
+    owner = get_user_model().objects.create_user("feed_bench")
+    print(f"{'':>4} {'subs':>6} {'match':>6} {'connect s':>9} {'KB/sub':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'all-delivered p50':>17} {'max':>7} {'full':>5} {'overflow':>8} {'left':>5}")
+    for name in args.transport:
+        for n in args.subscribers:
+            r = asyncio.run(run({"sse": SSEClient, "ws": WSClient}[name], n, args.events, owner))
+            print(f"{name:>4} {n:>6} {r['expected']:>6} {r['connect_s']:>9.2f} {r['kb_per_subscriber']:>7.1f} {r['p50']:>7.2f} "
+                  f"{r['p95']:>7.2f} {r['fanout_p50']:>17.2f} {r['fanout_max']:>7.2f} {r['refused']:>5} "
+                  f"{'yes' if r['cut_off'] else 'NO':>8} {r['left']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Loading a partner file: one POST /api/books/ per row vs POST /api/books/import/.
+
+Both go through the full middleware/auth stack (Django test client, JWT
+header). "per request" posts `--single` rows as JSON, one at a time;
+"import" sends `--rows` rows as one CSV and one NDJSON body, per batch size.
+Then the importer alone reads each file from disk under tracemalloc, to show
+that peak memory doesn't grow with the file.
+
+    python benchmarks/imports.py --rows 20000 100000 --single 500
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from _bootstrap import setup
+
+
+def write_files(n, rnd, directory):
+    from books.management.commands.seed_books import LAST_NAMES, LOCATIONS, TITLE_WORDS
+
+    paths = {fmt: os.path.join(directory, f"books_{n}.{fmt}") for fmt in ("csv", "ndjson")}
+    with open(paths["csv"], "w", newline="") as csv_file, open(paths["ndjson"], "w") as nd_file:
+        import csv
+
+        writer = csv.writer(csv_file)
+        writer.writerow(["title", "author", "description", "phone_number", "location"])
+        for i in range(n):
+            row = {
+                "title": " ".join(rnd.sample(TITLE_WORDS, 3)).title(),
+                "author": rnd.choice(LAST_NAMES),
+                "description": f"Partner listing {i}, {rnd.choice(TITLE_WORDS)} edition.",
+                "phone_number": f"+998 90 {rnd.randint(100, 999)} {rnd.randint(10, 99)} {rnd.randint(10, 99)}",
+                "location": rnd.choice(LOCATIONS),
+            }
+            writer.writerow(row.values())
+            nd_file.write(json.dumps(row) + "\n")
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[20000, 100000])
+    ap.add_argument("--single", type=int, default=500, help="rows sent one request each")
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = ap.parse_args()
+    os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from books.imports import BookImport, read_rows
+    from books.models import Book
+
+    user = get_user_model().objects.create(username="partner")
+    auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+    client = Client()
+    rnd = random.Random(7)
+    directory = tempfile.mkdtemp(prefix="bookx-import-")
+
+    print(f"{'path':>22} {'rows':>7} {'s':>7} {'rows/s':>8}")
+    t0 = time.perf_counter()
+    for i in range(args.single):
+        body = {"title": f"Single {i}", "author": "Bench", "location": "Tashkent", "phone_number": "+998 90 000 00 00"}
+        assert client.post("/api/books/", body, content_type="application/json", **auth).status_code == 201
+    elapsed = time.perf_counter() - t0
+    print(f"{'per request':>22} {args.single:>7} {elapsed:>7.2f} {args.single / elapsed:>8.0f}")
+
+    for n in args.rows:
+        paths = write_files(n, rnd, directory)
+        for batch_size in args.batch_sizes:
+            for fmt, content_type in (("csv", "text/csv"), ("ndjson", "application/x-ndjson")):
+                with open(paths[fmt], "rb") as f:
+                    body = f.read()
+                with override_settings(BOOKS_IMPORT_BATCH_SIZE=batch_size):
+                    t0 = time.perf_counter()
+                    response = client.post("/api/books/import/", body, content_type=content_type, **auth)
+                    elapsed = time.perf_counter() - t0
+                assert response.status_code == 200 and response.json()["created"] == n, response.content[:200]
+                print(f"{f'import {fmt} b={batch_size}':>22} {n:>7} {elapsed:>7.2f} {n / elapsed:>8.0f}")
+
+    print(f"\n{'file':>22} {'rows':>7} {'MiB on disk':>12} {'peak MiB':>9}")
+    for n in args.rows:
+        for fmt in ("csv", "ndjson"):
+            path = os.path.join(directory, f"books_{n}.{fmt}")
+            tracemalloc.start()
+            with open(path, "rb") as f:
+                result = BookImport(user).run(read_rows(f, fmt))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert result.created == n
+            print(f"{fmt:>22} {n:>7} {os.path.getsize(path) / 2**20:>12.1f} {peak / 2**20:>9.1f}")
+    print(f"\n{Book.objects.count()} books in the database")
+
+
+if __name__ == "__main__":
+    main()
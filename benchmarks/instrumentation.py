@@ -0,0 +1,62 @@
+"""Cost of books.instrumentation: same requests with the middleware in and out of the stack.
+
+Health (no SQL) shows the fixed per-request cost; list/detail add the SQL
+execute wrapper and serializer timers. Request logging is silenced so only
+accounting is measured.
+
+    python benchmarks/instrumentation.py --rows 5000 --repeat 300
+"""
+import argparse
+import logging
+import random
+
+from _bootstrap import setup, timed
+from search import fill, vocabulary
+
+MIDDLEWARE = "books.instrumentation.InstrumentationMiddleware"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=300)
+    args = ap.parse_args()
+    setup()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client, override_settings
+    from books.models import Book
+
+    logging.getLogger("books.requests").setLevel(logging.WARNING)
+    rnd = random.Random(5)
+    vocab = vocabulary(rnd)
+    fill(args.rows, get_user_model().objects.create(username="bench"), vocab, [1 / (i + 1) for i in range(len(vocab))])
+    book_id = Book.objects.values_list("id", flat=True).first()
+    paths = {"health": "/api/health/", "list": "/api/books/", "detail": f"/api/books/{book_id}/"}
+    without = [m for m in settings.MIDDLEWARE if m != MIDDLEWARE]
+    clients = {}
+    for label, middleware in (("off", without), ("on", settings.MIDDLEWARE)):
+        with override_settings(MIDDLEWARE=middleware):
+            clients[label] = Client()
+            clients[label].get("/api/health/")  # the handler builds its middleware chain here, once
+
+    print(f"{'endpoint':>8} | {'off p50':>8} {'on p50':>8} {'delta us':>9} | {'off p95':>8} {'on p95':>8}")
+    with override_settings(BOOKS_QUERY_CACHE_ALIAS=""):
+        for name, path in paths.items():
+            samples = {"off": [], "on": []}
+            for label in ("off", "on") * 20:  # warm up
+                clients[label].get(path)
+            for _ in range(args.repeat):  # interleave so drift hits both sides equally
+                for label in ("off", "on"):
+                    samples[label].append(timed(lambda: clients[label].get(path), 1)[0])
+            (off50, off95), (on50, on95) = (percentiles(samples[k]) for k in ("off", "on"))
+            print(f"{name:>8} | {off50:>8.3f} {on50:>8.3f} {(on50 - off50) * 1000:>9.1f} | {off95:>8.3f} {on95:>8.3f}")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""List/search latency and queries per request with and without the result cache.
+
+Replays a Zipf-skewed mix of filter combinations (and their second pages)
+through the test client, then a write to show the generation bump.
+
+    python benchmarks/query_cache.py --rows 20000 --requests 500
+"""
+import argparse
+import os
+import random
+
+from _bootstrap import setup
+from search import fill, vocabulary
+
+
+def workload(rnd, vocab, n, distinct=60):
+    shapes = []
+    for i in range(distinct):
+        kind = i % 3
+        if kind == 0:
+            shapes.append({"q": vocab[rnd.randrange(50, 500)]})
+        elif kind == 1:
+            shapes.append({"titles": f"{vocab[rnd.randrange(500)]},{vocab[rnd.randrange(500)]}"})
+        else:
+            shapes.append({})
+    weights = [1 / (i + 1) for i in range(distinct)]
+    return [rnd.choices(shapes, weights=weights)[0] for _ in range(n)]
+
+
+def replay(client, requests):
+    import time
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    samples, queries = [], 0
+    for params in requests:
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            resp = client.get("/api/books/", params)
+            samples.append((time.perf_counter() - t0) * 1000)
+        queries += len(ctx.captured_queries)
+        assert resp.status_code == 200, resp.status_code
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95)], queries / len(requests)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--requests", type=int, default=500)
+    args = ap.parse_args()
+    os.environ.setdefault("BOOKS_QUERY_CACHE_ALIAS", "default")  # one process, so locmem is exact here
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.test import Client, override_settings
+    from books.models import Book
+    from books.query_cache import get_query_cache
+
+    rnd = random.Random(3)
+    vocab = vocabulary(rnd)
+    owner = get_user_model().objects.create(username="bench")
+    fill(args.rows, owner, vocab, [1 / (i + 1) for i in range(len(vocab))])
+    requests = workload(rnd, vocab, args.requests)
+    client = Client()
+
+    print(f"rows={args.rows} requests={len(requests)}")
+    for label, alias in (("uncached", ""), ("cached", "default")):
+        with override_settings(BOOKS_QUERY_CACHE_ALIAS=alias):
+            p50, p95, qpr = replay(client, requests)
+        print(f"{label:>9}: p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  queries/request {qpr:.2f}")
+    stats = get_query_cache().stats()
+    print(f"hit ratio {stats['hit_ratio']:.2%}  ({stats['hits']} hits / {stats['misses']} misses)")
+
+    Book.objects.create(owner=owner, title="Fresh", author="Writer", location="Tashkent")
+    first = client.get("/api/books/").json()["results"][0]["title"]
+    print(f"after a write the first page starts with {first!r} (generation bumps={get_query_cache().stats()['invalidations']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Search latency vs corpus size: old icontains OR-chain vs the indexed backend.
+
+    python benchmarks/search.py --sizes 1000 10000 100000
+"""
+import argparse
+import random
+
+from _bootstrap import setup, timed
+
+SYLLABLES = "ka lo mi ra te su no vi da re po lu ha ze ti mo be gu fa ni".split()
+
+
+def vocabulary(rnd, size=20000):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def fill(n, owner, vocab, weights):
+    from books.models import Book
+
+    rnd = random.Random(n)
+    have = Book.objects.count()
+    batch = []
+    for _ in range(have, n):
+        words = rnd.choices(vocab, weights=weights, k=46)
+        batch.append(Book(
+            owner=owner,
+            title=" ".join(words[:3]).title(),
+            author=" ".join(words[3:5]).title(),
+            description=" ".join(words[5:]),
+            location="Tashkent",
+        ))
+        if len(batch) == 5000:
+            Book.objects.bulk_create(batch)
+            batch = []
+    Book.objects.bulk_create(batch)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.db.models import Q
+    from books.models import Book
+    from books.search import IContainsSearchBackend, get_search_backend
+
+    owner = get_user_model().objects.create(username="bench")
+    rnd = random.Random(42)
+    vocab = vocabulary(rnd)
+    weights = [1 / (i + 1) for i in range(len(vocab))]  # Zipf-like word frequencies
+    q, titles = vocab[300], [vocab[40], vocab[41]]
+    backend = get_search_backend()
+    legacy = IContainsSearchBackend()
+    base = Book.objects.filter(is_active=True)
+
+    def old_list():
+        cond = Q(title__icontains=q) | Q(author__icontains=q) | Q(description__icontains=q)
+        cond &= Q(title__icontains=titles[0]) | Q(title__icontains=titles[1])
+        return list(base.filter(cond).distinct()[:20])
+
+    print(f"backend: {backend.__class__.__name__}")
+    print(f"{'rows':>9} {'icontains p50':>14} {'p95':>8} {'legacy-rank p50':>16} {'indexed p50':>12} {'p95':>8}")
+    for n in args.sizes:
+        fill(n, owner, vocab, weights)
+        o50, o95 = timed(old_list, args.repeat)
+        l50, _ = timed(lambda: list(legacy.search(base, q=q, titles=titles)[:20]), args.repeat)
+        i50, i95 = timed(lambda: list(backend.search(base, q=q, titles=titles)[:20]), args.repeat)
+        print(f"{n:>9} {o50:>12.2f}ms {o95:>6.2f}ms {l50:>14.2f}ms {i50:>10.2f}ms {i95:>6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
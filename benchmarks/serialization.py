@@ -0,0 +1,71 @@
+"""Serializing a page of books: BookSerializer vs the BookReadSerializer fast path.
+
+Every row has an image and two derivative sizes, so URL generation is part of
+the cost. Times include the query; both sides produce identical JSON (checked).
+The S3 run uses unsigned URLs (AWS_QUERYSTRING_AUTH=False), generated offline.
+
+    python benchmarks/serialization.py --rows 1000
+"""
+import argparse
+import json
+import random
+
+from _bootstrap import setup, timed
+from search import fill, vocabulary
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+    from storages.backends.s3boto3 import S3Boto3Storage
+    from books.models import Book
+    from books.serializers import BookReadSerializer, BookSerializer
+
+    rnd = random.Random(11)
+    vocab = vocabulary(rnd)
+    fill(args.rows, get_user_model().objects.create(username="bench"), vocab, [1 / (i + 1) for i in range(len(vocab))])
+    for book in Book.objects.only("id"):
+        name = f"book_images/cover_{book.pk}.jpg"
+        variants = {"source": name}
+        for size in ("thumb", "detail"):
+            variants[size] = {
+                "width": 320, "height": 480,
+                "webp": f"book_images/variants/{book.pk}/cover_{size}.webp",
+                "jpeg": f"book_images/variants/{book.pk}/cover_{size}.jpg",
+            }
+        Book.objects.filter(pk=book.pk).update(image=name, image_variants=variants)
+
+    request = Request(RequestFactory().get("/api/books/", HTTP_HOST="bookx.example"))
+    qs = Book.objects.filter(is_active=True).select_related("owner").order_by("-created_at", "-id")[: args.rows]
+    field = Book._meta.get_field("image")
+    storages = {
+        "filesystem": field.storage,
+        "s3": S3Boto3Storage(bucket_name="bookx", access_key="x", secret_key="x", region_name="eu-central-1",
+                             querystring_auth=False),
+    }
+
+    def full():
+        return BookSerializer(qs.all(), many=True, context={"request": request}).data
+
+    def lean():
+        reader = BookReadSerializer(request)
+        return reader.many(reader.rows(qs))
+
+    print(f"rows={args.rows}")
+    print(f"{'storage':>10} | {'serializer p50':>14} {'rows/s':>9} | {'fast path p50':>13} {'rows/s':>9} | speedup")
+    for name, storage in storages.items():
+        field.storage = storage
+        assert json.dumps(full()) == json.dumps(lean()), "output differs"
+        (f50, _), (l50, _) = timed(full, args.repeat), timed(lean, args.repeat)
+        print(f"{name:>10} | {f50:>11.1f} ms {args.rows / f50 * 1000:>9.0f} | {l50:>10.1f} ms {args.rows / l50 * 1000:>9.0f} | {f50 / l50:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
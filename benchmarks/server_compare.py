@@ -0,0 +1,202 @@
+"""Serving setups side by side: the old Procfile boot vs gunicorn (gunicorn.conf.py).
+
+Each setup is started as a real server on a copy of the project (so the
+checked-in tree gets no staticfiles/) against one seeded SQLite database:
+
+    runserver         old `web:` line: migrate, collectstatic, createsuperuser, runserver
+    gthread           gunicorn, preloaded gthread workers (the new default)
+    gthread-nopreload same without GUNICORN_PRELOAD
+    uvicorn           gunicorn with GUNICORN_WORKER_CLASS=uvicorn (bookx.asgi)
+
+Reported: seconds from spawn to the first 200 on /api/health/, memory of the
+whole process tree (PSS, so pages shared after fork count once), and
+closed-loop throughput / latency for the book list and for AI advice with a
+slow fake upstream (the async endpoint under uvicorn).
+
+    python benchmarks/server_compare.py --rows 5000 --seconds 10 --workers 2
+"""
+import argparse
+import http.client
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import fake_gemini
+from _bootstrap import ROOT
+
+OLD_WEB = (
+    "python manage.py migrate && python manage.py collectstatic --noinput"
+    " && python manage.py createsuperuser --noinput || true && python manage.py runserver {port}"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def tree_pss_kb(pid):
+    """PSS of `pid` and all its descendants, from /proc (Linux)."""
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            for line in Path(f"/proc/{p}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Pss:"):
+                    total += int(line.split()[1])
+            for task in Path(f"/proc/{p}/task").iterdir():
+                stack.extend(int(c) for c in (task / "children").read_text().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+def wait_healthy(port, proc, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError("server did not become healthy")
+
+
+def load(port, path_for, clients, seconds):
+    """`clients` threads issuing requests back to back for `seconds`; returns (req/s, p50 ms, p95 ms, errors)."""
+    samples, errors, lock = [], [0], threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def worker(i):
+        conn, n = None, 0
+        while time.perf_counter() < stop:
+            if conn is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path_for(i, n))
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+                if resp.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                ok, conn = False, None
+            with lock:
+                if ok:
+                    samples.append((time.perf_counter() - t0) * 1000)
+                else:
+                    errors[0] += 1
+            n += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    samples.sort()
+    pick = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] if samples else 0.0
+    return len(samples) / seconds, pick(0.50), pick(0.95), errors[0]
+
+
+def stop(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(30)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+def setups(workers):
+    gunicorn = [sys.executable, "-m", "gunicorn"]
+    common = {"WEB_CONCURRENCY": str(workers), "GUNICORN_THREADS": "4"}
+    return [
+        ("runserver", lambda port: ["sh", "-c", OLD_WEB.format(port=port)], {}),
+        ("gthread", lambda port: gunicorn, common),
+        ("gthread-nopreload", lambda port: gunicorn, {**common, "GUNICORN_PRELOAD": "0"}),
+        ("uvicorn", lambda port: gunicorn, {**common, "GUNICORN_WORKER_CLASS": "uvicorn"}),
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--workers", type=int, default=2, help="WEB_CONCURRENCY for the gunicorn setups")
+    ap.add_argument("--list-clients", type=int, default=8)
+    ap.add_argument("--ai-clients", type=int, default=64)
+    ap.add_argument("--ai-delay", type=float, default=0.5, help="fake Gemini latency (s)")
+    ap.add_argument("--only", nargs="+", help="run just these setups")
+    args = ap.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="bookx-serve-"))
+    app_dir = work / "app"
+    shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns(".git", "db.sqlite3", "media", "staticfiles", "__pycache__"))
+    gemini = fake_gemini.start(delay=args.ai_delay)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{work}/serve.sqlite3",
+        "DEBUG": "0",
+        "GEMINI_BASE_URL": gemini.url,
+        "GEMINI_TIMEOUT": str(args.ai_delay * 10),
+        "AI_ASYNC_THREADS": str(args.ai_clients),
+        # raw serving capacity: no quota, no shedding (benchmarks/ai_admission.py measures those)
+        "AI_RATE_PER_MINUTE": "0",
+        "AI_MAX_CONCURRENCY": str(args.ai_clients),
+        "REQUEST_LOG_LEVEL": "WARNING",
+        "DJANGO_SUPERUSER_USERNAME": "admin",
+        "DJANGO_SUPERUSER_EMAIL": "admin@example.com",
+        "DJANGO_SUPERUSER_PASSWORD": "bench-only-password",
+    }
+    manage = [sys.executable, "manage.py"]
+    subprocess.run(manage + ["migrate", "-v0"], cwd=app_dir, env=env, check=True)
+    subprocess.run(manage + ["seed_books", "--count", str(args.rows)], cwd=app_dir, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    print(f"rows={args.rows} cpus={os.cpu_count()} gunicorn workers={args.workers} "
+          f"ai upstream delay={args.ai_delay}s ({args.ai_clients} clients), list clients={args.list_clients}")
+    print(f"{'setup':>18} {'start s':>8} {'PSS MB':>7} {'list rps':>9} {'p50':>7} {'p95':>7} "
+          f"{'ai rps':>7} {'p50':>7} {'p95':>7} {'errors':>6}")
+    for name, command, extra in setups(args.workers):
+        if args.only and name not in args.only:
+            continue
+        port = free_port()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            command(port), cwd=app_dir, env={**env, **extra, "PORT": str(port)},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        try:
+            wait_healthy(port, proc)
+            started = time.perf_counter() - t0
+            list_rps, list_p50, list_p95, list_err = load(port, lambda i, n: "/api/books/", args.list_clients, args.seconds)
+            pss = tree_pss_kb(proc.pid) / 1024
+            ai_path = "/api/ai/books/advice/async/" if name == "uvicorn" else "/api/ai/books/advice/"
+            ai_rps, ai_p50, ai_p95, ai_err = load(
+                port, lambda i, n: f"{ai_path}?prompt=server+compare+{name}+{i}+{n}", args.ai_clients, args.seconds
+            )
+        finally:
+            stop(proc)
+        print(f"{name:>18} {started:>8.2f} {pss:>7.1f} {list_rps:>9.1f} {list_p50:>7.1f} {list_p95:>7.1f} "
+              f"{ai_rps:>7.1f} {ai_p50:>7.1f} {ai_p95:>7.1f} {list_err + ai_err:>6}")
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+""""More like this" on the memory-mapped similarity index (books/similar.py).
+
+For each `--rows` size: seed books, `rebuild_similar`, then report
+
+    build       rebuild time and size of the vectors file
+    open        a fresh SimilarityIndex mapping the files (what a new worker pays)
+    top-10      one vector against every row, top 10 (the index alone)
+    endpoint    GET /api/books/{id}/similar/ through the test client
+    refresh     one Book save re-vectorized into the index (what the background job does)
+    ai match    AIAdviceView._match for a canned AI reply: search backend vs BOOKS_AI_MATCH=similar
+    batch       _payloads for `--batch` replies at once (match_many)
+
+    python benchmarks/similar.py --rows 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from _bootstrap import setup, timed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--batch", type=int, default=50)
+    args = ap.parse_args()
+    os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+    os.environ.setdefault("BOOKS_SIMILAR_DIR", tempfile.mkdtemp(prefix="bookx-similar-"))
+    os.environ["BOOKS_TASKS_MODE"] = "sync"
+    setup()
+
+    from django.core.management import call_command
+    from django.test import Client, override_settings
+    from books.management.commands.seed_books import TITLE_WORDS
+    from books.models import Book
+    from books.similar import SimilarityIndex, features, index_dir, refresh
+    from books.views import AIAdviceView
+
+    client = Client()
+    rnd = random.Random(7)
+    view = AIAdviceView()
+
+    def reply():
+        words = rnd.sample(TITLE_WORDS, 3)
+        return {"topics": words[:1], "suggested_books": [{"title": " ".join(words[1:]), "author": ""}]}
+
+    print(f"{'rows':>8} {'step':>18} {'p50 ms':>9} {'p95 ms':>9}  note")
+    for n in args.rows:
+        have = Book.objects.count()
+        if n > have:
+            call_command("seed_books", count=n - have, seed=n, verbosity=0)
+        t0 = time.perf_counter()
+        call_command("rebuild_similar", stdout=open(os.devnull, "w"))
+        build = time.perf_counter() - t0
+        index = SimilarityIndex(index_dir())
+        t0 = time.perf_counter()
+        index.load()
+        opened = (time.perf_counter() - t0) * 1000
+        size = os.path.getsize(index_dir() / index.meta["generation"] / "vectors.f32") / 2**20
+        print(f"{n:>8} {'build':>18} {build * 1000:>9.0f} {'':>9}  {size:.0f} MiB vectors")
+        print(f"{n:>8} {'open':>18} {opened:>9.2f} {'':>9}")
+
+        ids = list(Book.objects.filter(is_active=True).values_list("id", flat=True)[:args.repeat])
+        books = {b.pk: b for b in Book.objects.filter(id__in=ids)}
+        queries = iter([index.vector(features(b.title, b.author, b.description)) for b in books.values()] * 3)
+        p50, p95 = timed(lambda: index.top(next(queries)[None], 10), args.repeat)
+        print(f"{n:>8} {'top-10':>18} {p50:>9.2f} {p95:>9.2f}")
+        pks = iter(ids * 3)
+        p50, p95 = timed(lambda: client.get(f"/api/books/{next(pks)}/similar/"), args.repeat)
+        print(f"{n:>8} {'endpoint':>18} {p50:>9.2f} {p95:>9.2f}")
+        book = books[ids[0]]
+        p50, p95 = timed(lambda: refresh([book.pk]), args.repeat)
+        print(f"{n:>8} {'refresh':>18} {p50:>9.2f} {p95:>9.2f}")
+
+        for matcher in ("search", "similar"):
+            with override_settings(BOOKS_AI_MATCH=matcher):
+                p50, p95 = timed(lambda: list(view._match(reply())[0]), args.repeat)
+                print(f"{n:>8} {'ai match ' + matcher:>18} {p50:>9.2f} {p95:>9.2f}")
+                p50, p95 = timed(lambda: view._payloads([reply() for _ in range(args.batch)]), max(3, args.repeat // 10))
+                print(f"{n:>8} {'batch ' + matcher:>18} {p50:>9.2f} {p95:>9.2f}  {args.batch} replies")
+
+
+if __name__ == "__main__":
+    main()
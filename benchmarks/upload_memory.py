@@ -0,0 +1,119 @@
+"""Peak Python memory per image upload: streaming handler vs Django's default handlers.
+
+The request body is streamed from disk into the WSGI handler, so the only
+allocations measured are the server's. Derivative generation is disconnected.
+
+    python benchmarks/upload_memory.py --mb 8
+
+Against S3 (any S3-compatible stand-in, e.g. `moto_server -p 9000` or MinIO):
+
+    AWS_STORAGE_BUCKET_NAME=bench AWS_S3_ENDPOINT_URL=http://127.0.0.1:9000 \
+    AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x python benchmarks/upload_memory.py --mb 8
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from _bootstrap import setup
+
+BOUNDARY = "----bookxbench"
+
+
+def make_jpeg(path, mb):
+    from PIL import Image
+
+    side = 1000
+    while True:
+        Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(path, "JPEG", quality=95)
+        if os.path.getsize(path) >= mb * 1024 * 1024:
+            return
+        side = int(side * 1.4)
+
+
+class MultipartStream(io.RawIOBase):
+    """multipart/form-data body read lazily from an image file on disk."""
+
+    def __init__(self, path):
+        head = "".join(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'
+            for k, v in (("title", "Bench"), ("location", "Tashkent"))
+        )
+        head += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="bench.jpg"\r\n'
+                 "Content-Type: image/jpeg\r\n\r\n")
+        self.parts = [io.BytesIO(head.encode()), open(path, "rb"), io.BytesIO(f"\r\n--{BOUNDARY}--\r\n".encode())]
+        self.length = sum(len(p.getvalue()) for p in (self.parts[0], self.parts[2])) + os.path.getsize(path)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while self.parts:
+            n = self.parts[0].readinto(buf)
+            if n:
+                return n
+            self.parts.pop(0).close()
+        return 0
+
+
+def upload(path, token):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    body = MultipartStream(path)
+    environ = {
+        "REQUEST_METHOD": "POST", "PATH_INFO": "/api/books/", "SERVER_NAME": "localhost", "SERVER_PORT": "80",
+        "wsgi.url_scheme": "http", "wsgi.input": io.BufferedReader(body), "wsgi.errors": io.StringIO(),
+        "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}", "CONTENT_LENGTH": str(body.length),
+        "HTTP_AUTHORIZATION": f"Bearer {token}",
+    }
+    status = []
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    resp = WSGIHandler()(environ, lambda s, h: status.append(s))
+    b"".join(resp)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return status[0], peak / 1024 / 1024, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=8)
+    args = ap.parse_args()
+    os.environ.setdefault("BOOK_IMAGE_MAX_BYTES", str(int((args.mb + 16) * 1024 * 1024)))
+    setup()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.db.models.signals import post_save
+    from django.test import override_settings
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from books.models import Book
+
+    post_save.disconnect(sender=Book, dispatch_uid="books.queue_image_pipeline")
+    if getattr(settings, "AWS_STORAGE_BUCKET_NAME", None):
+        from django.core.files.storage import default_storage
+
+        bucket = default_storage.bucket
+        if not any(b.name == bucket.name for b in default_storage.connection.buckets.all()):
+            bucket.create()
+    media = tempfile.mkdtemp(prefix="bookx-media-")
+    token = str(RefreshToken.for_user(get_user_model().objects.create(username="bench")).access_token)
+    path = os.path.join(tempfile.mkdtemp(), "bench.jpg")
+    make_jpeg(path, args.mb)
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    print(f"storage: {settings.DEFAULT_FILE_STORAGE if hasattr(settings, 'DEFAULT_FILE_STORAGE') else 'FileSystemStorage'}"
+          f"  upload: {size_mb:.1f} MB")
+    for label, streaming in (("default handlers", False), ("streaming", True)):
+        with override_settings(MEDIA_ROOT=media, BOOK_IMAGE_STREAMING_UPLOADS=streaming):
+            status, peak, elapsed = upload(path, token)
+        print(f"{label:>17}: {status:<16} peak {peak:7.2f} MB  {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+
+"""Admission control in front of the AI model call.
+
+Two gates stand between a prompt and Gemini:
+
+    quota    a token bucket per caller (user id, else client IP): `AI_RATE_BURST`
+             requests at once, refilled at `AI_RATE_PER_MINUTE`. Over quota is a
+             429 with `Retry-After` (seconds until the next token).
+    limiter  at most `AI_MAX_CONCURRENCY` model calls per process. Up to
+             `AI_QUEUE_SIZE` more wait `AI_QUEUE_TIMEOUT` seconds for a slot;
+             past that a call is shed at once. A shed call gets the fallback
+             suggestions (`AI_SHED_RESPONSE=fallback`, the default) or a 429
+             with `Retry-After` (`AI_SHED_RESPONSE=429`). Batch items (the
+             batch endpoint) are never shed: they wait for a slot, behind
+             any queued interactive caller.
+
+Buckets live in a store: `LocalBucketStore` (per process) by default,
+`RedisBucketStore` when `REDIS_URL` is set, or `AI_RATE_STORE=<dotted.path>`.
+The limiter wraps the model call only, so cache hits and requests coalesced
+onto a call in flight never take a slot. Under gthread a waiting request holds
+a worker thread: the defaults (settings) keep `AI_MAX_CONCURRENCY +
+AI_QUEUE_SIZE` below `GUNICORN_THREADS` so the rest of the API always has one.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Throttled):
+    """No model slot within the queue bound; `wait` is the typical call time."""
+    default_detail = "The AI service is busy."
+    default_code = "overloaded"
+
+
+class ConcurrencyLimiter:
+    """`limit` holders at once; up to `queue_size` callers wait `timeout` seconds for a slot, others are shed.
+
+    `acquire(block=True)` is for work that must not be shed (batch items): it
+    waits as long as it takes, outside the queue bound, and only takes a slot
+    when no bounded caller is queued, so interactive requests keep priority.
+    """
+
+    def __init__(self, limit: int = 2, queue_size: int = 1, timeout: float = 2.0):
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.blocked = 0
+        self.hold_seconds = max(timeout, 1.0)  # moving average of slot hold time, for Retry-After
+        self._cond = threading.Condition()
+        self.counters = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_timeout": 0}
+
+    def _shed(self, reason: str) -> Overloaded:
+        self.counters[reason] += 1
+        return Overloaded(wait=math.ceil(self.hold_seconds))
+
+    def acquire(self, block: bool = False) -> None:
+        with self._cond:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self.counters["admitted"] += 1
+                return
+            if block:
+                self.blocked += 1
+                self.counters["queued"] += 1
+                try:
+                    while self.active >= self.limit or self.waiting:
+                        self._cond.wait()
+                    self.active += 1
+                    self.counters["admitted"] += 1
+                finally:
+                    self.blocked -= 1
+                return
+            if self.waiting >= self.queue_size:
+                raise self._shed("shed_queue_full")
+            self.waiting += 1
+            self.counters["queued"] += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._shed("shed_timeout")
+                    self._cond.wait(remaining)
+                self.active += 1
+                self.counters["admitted"] += 1
+            finally:
+                self.waiting -= 1
+                if not self.waiting and self.blocked:
+                    self._cond.notify_all()  # blocked callers were standing back for this queue
+
+    def release(self, held: float) -> None:
+        with self._cond:
+            self.active -= 1
+            self.hold_seconds += 0.2 * (held - self.hold_seconds)
+            self._cond.notify_all()  # queued callers first: blocked ones re-check and stand back
+
+    @contextmanager
+    def slot(self, block: bool = False):
+        self.acquire(block)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {"active": self.active, "waiting": self.waiting, "blocked": self.blocked, **self.counters}
+
+
+class LocalBucketStore:
+    """Buckets in this process's memory; with several workers each one enforces the quota on its own."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token from `key`'s bucket; 0 if there was one, else seconds until there is."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)  # least recently seen; it comes back full
+        return wait
+
+
+class RedisBucketStore:
+    """Buckets in Redis, shared by every worker; one script call per take, timed by the Redis clock."""
+
+    prefix = "bookx:ai-quota:"
+    script = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, url: str = ""):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._take = self.client.register_script(self.script)
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        return float(self._take(keys=[self.prefix + key], args=[rate, burst]))
+
+
+_limiter: Optional[ConcurrencyLimiter] = None
+_store = None
+_init_lock = threading.Lock()
+_throttled = 0
+
+
+def get_limiter() -> ConcurrencyLimiter:
+    global _limiter
+    if _limiter is None:
+        with _init_lock:
+            if _limiter is None:
+                _limiter = ConcurrencyLimiter(
+                    limit=getattr(settings, "AI_MAX_CONCURRENCY", 2),
+                    queue_size=getattr(settings, "AI_QUEUE_SIZE", 1),
+                    timeout=getattr(settings, "AI_QUEUE_TIMEOUT", 2.0),
+                )
+    return _limiter
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _init_lock:
+            if _store is None:
+                path = getattr(settings, "AI_RATE_STORE", "")
+                if not path:
+                    path = "books.admission.RedisBucketStore" if getattr(settings, "REDIS_URL", "") else "books.admission.LocalBucketStore"
+                _store = import_string(path)()
+    return _store
+
+
+def shed_with_fallback() -> bool:
+    return getattr(settings, "AI_SHED_RESPONSE", "fallback") != "429"
+
+
+def caller_key(request, user=None) -> str:
+    """Quota key: the authenticated user, else the client address (DRF's NUM_PROXIES rules)."""
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def take_quota(key: str) -> float:
+    """0 if `key` may call the model now, else seconds until its quota allows it. Store failures let the call through."""
+    global _throttled
+    per_minute = getattr(settings, "AI_RATE_PER_MINUTE", 30)
+    if per_minute <= 0:
+        return 0.0
+    try:
+        wait = get_bucket_store().take(key, per_minute / 60.0, max(1, getattr(settings, "AI_RATE_BURST", 10)))
+    except Exception:
+        logger.warning("AI quota store unavailable; admitting %s", key, exc_info=True)
+        return 0.0
+    if wait:
+        with _init_lock:
+            _throttled += 1
+    return wait
+
+
+class AIQuotaThrottle(BaseThrottle):
+    """take_quota() as a DRF throttle, for AIAdviceView; the plain async views call take_quota() themselves."""
+
+    def allow_request(self, request, view):
+        self._wait = take_quota(caller_key(request, request.user))
+        return not self._wait
+
+    def wait(self):
+        return math.ceil(self._wait)
+
+
+def admission_gauges() -> Dict[str, float]:
+    gauges = {"bookx_ai_throttled_requests": _throttled}
+    if _limiter is not None:
+        stats = _limiter.stats()
+        gauges.update({
+            "bookx_ai_in_flight": stats["active"],
+            "bookx_ai_queue_depth": stats["waiting"],
+            "bookx_ai_batch_waiting": stats["blocked"],
+            "bookx_ai_admitted_calls": stats["admitted"],
+            "bookx_ai_queued_calls": stats["queued"],
+            "bookx_ai_shed_queue_full": stats["shed_queue_full"],
+            "bookx_ai_shed_timeout": stats["shed_timeout"],
+        })
+    return gauges
@@ -0,0 +1,182 @@
+
+"""Cache in front of the AI model call.
+
+Prompts are normalized (case, whitespace, punctuation) into a key. Lookups go
+through a bounded in-process LRU with TTL, then an optional shared Django cache
+(`AI_CACHE_ALIAS`). Concurrent misses for the same key are coalesced so only
+one upstream call runs. Payloads carrying `_warning` (fallback / errors), or
+that are not an object at all, are kept only for `AI_CACHE_NEGATIVE_TTL`
+seconds. The shared cache is best effort: if it errors (Redis down) the
+error is logged and counted, and the lookup goes on as if it had missed.
+"""
+import copy
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+Payload = Dict[str, Any]
+
+_PUNCT_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    text = unicodedata.normalize("NFKC", prompt or "").casefold()
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(prompt: str) -> str:
+    digest = hashlib.sha1(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"ai-advice:v1:{digest}"
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[Payload] = None
+        self.error: Optional[BaseException] = None
+
+
+class AdviceCache:
+    def __init__(self, ttl: int = 3600, negative_ttl: int = 30, max_entries: int = 1024, shared=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, payload)
+        self._flights: Dict[str, _Flight] = {}
+        self.counters = {"hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0,
+                         "shared_errors": 0}
+
+    def ttl_for(self, payload: Payload) -> int:
+        if not isinstance(payload, dict) or payload.get("_warning"):
+            return self.negative_ttl
+        return self.ttl
+
+    def _shared_get(self, key: str) -> Optional[Payload]:
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get(key)
+        except Exception:
+            self._shared_failed("get")
+            return None
+
+    def _shared_set(self, key: str, payload: Payload) -> None:
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(key, payload, self.ttl_for(payload))
+        except Exception:
+            self._shared_failed("set")
+
+    def _shared_failed(self, op: str) -> None:
+        logger.warning("AI advice cache: shared %s failed, using the local cache only", op, exc_info=True)
+        with self._lock:
+            self.counters["shared_errors"] += 1
+
+    def _get_local(self, key: str) -> Optional[Payload]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _set_local(self, key: str, payload: Payload, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get_or_compute(self, prompt: str, compute: Callable[[str], Payload]) -> Payload:
+        key = cache_key(prompt)
+        with self._lock:
+            payload = self._get_local(key)
+            if payload is not None:
+                self.counters["hits"] += 1
+                return copy.deepcopy(payload)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            payload = self._shared_get(key)
+            if payload is not None:
+                counter = "shared_hits"
+            else:
+                counter = "misses"
+                payload = compute(prompt)
+                self._shared_set(key, payload)
+            with self._lock:
+                self.counters[counter] += 1
+                self._set_local(key, payload, self.ttl_for(payload))
+            flight.result = payload
+            return copy.deepcopy(payload)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.counters, size=len(self._entries))
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_cache: Optional[AdviceCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_advice_cache() -> AdviceCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                alias = getattr(settings, "AI_CACHE_ALIAS", "")
+                shared = None
+                if alias:
+                    from django.core.cache import caches
+
+                    shared = caches[alias]
+                _cache = AdviceCache(
+                    ttl=getattr(settings, "AI_CACHE_TTL", 3600),
+                    negative_ttl=getattr(settings, "AI_CACHE_NEGATIVE_TTL", 30),
+                    max_entries=getattr(settings, "AI_CACHE_MAX_ENTRIES", 1024),
+                    shared=shared,
+                )
+    return _cache
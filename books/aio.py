@@ -0,0 +1,86 @@
+
+"""Bounded thread pools used by the async (ASGI) views.
+
+Blocking work never runs on the event loop: model calls go to the "ai" pool,
+ORM work to the "db" pool. Both are capped so a burst cannot open more DB
+connections or upstream sockets than configured. Awaiting callers that get
+cancelled (client disconnect) drop queued jobs before they start. Jobs run in
+a copy of the caller's context, so per-request instrumentation follows them.
+
+`iterate_in_thread` is the exception: a streamed response body that reads the
+DB gets a thread of its own for as long as the stream lasts.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_POOL_SETTINGS = {"ai": ("AI_ASYNC_THREADS", 64), "db": ("ASYNC_DB_THREADS", 8)}
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def get_pool(name: str) -> ThreadPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(name)
+            if pool is None:
+                setting, default = _POOL_SETTINGS[name]
+                pool = _pools[name] = ThreadPoolExecutor(
+                    max_workers=getattr(settings, setting, default), thread_name_prefix=f"bookx-{name}"
+                )
+    return pool
+
+
+def _db_job(fn: Callable, args):
+    close_old_connections()
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_ai(fn: Callable, *args):
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_pool("ai"), ctx.run, fn, *args)
+
+
+async def run_db(fn: Callable, *args):
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_pool("db"), ctx.run, _db_job, fn, args)
+
+
+def _finish(iterator: Iterator) -> None:
+    try:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    finally:
+        connections.close_all()  # this thread's connections; it ends here
+
+
+async def iterate_in_thread(iterator: Iterator):
+    """Async iteration over a sync iterator that queries the DB, e.g. a StreamingHttpResponse body under ASGI.
+
+    Django reads a sync iterator to the end before sending any of it under
+    ASGI. Here every step runs on one dedicated thread, so a server-side
+    cursor stays on the connection that opened it. That connection is closed
+    when the stream ends or the client goes away.
+    """
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bookx-stream")
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while True:
+            item = await loop.run_in_executor(pool, next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        pool.submit(_finish, iterator)  # queued behind a step that may still be running
+        pool.shutdown(wait=False)
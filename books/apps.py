@@ -1,5 +1,26 @@
 
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def _reinstall_search_triggers(sender, using="default", **kwargs):
+    from .search import install_sqlite_triggers
+
+    conn = connections[using]
+    if conn.vendor == "sqlite":
+        install_sqlite_triggers(conn)
+
+
 class BooksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "books"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import install_sql_recorder
+
+        connection_created.connect(install_sql_recorder, dispatch_uid="books.install_sql_recorder")
+
+        post_migrate.connect(_reinstall_search_triggers, sender=self)
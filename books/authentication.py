@@ -0,0 +1,104 @@
+
+"""JWT authentication without a user query per request.
+
+simplejwt's JWTAuthentication loads the User row on every authenticated
+request. CachedJWTAuthentication keeps the few columns requests read
+(`principal_fields()`: id, username, is_active, is_staff, is_superuser) per
+user id in the `BOOKS_AUTH_CACHE_ALIAS` cache for `BOOKS_AUTH_CACHE_TTL`
+seconds. `request.user` is a User built from them with the other fields
+deferred: reading one (email, ...) queries as usual, and `save()` writes
+only the cached fields back.
+
+Saving or deleting a User drops its entry once the transaction commits
+(books.signals). A deactivation, password change or rename then applies on
+the next request in every process sharing the cache, which is why it is off
+unless the cache is shared (`REDIS_URL`). A `QuerySet.update()` of users is
+only noticed after the TTL. The same checks as
+JWTAuthentication apply: unknown or inactive users fail, and so do tokens
+from before a password change when `CHECK_REVOKE_TOKEN` is on.
+"""
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from django.db.models import DEFERRED
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# digest of the password hash, kept only when CHECK_REVOKE_TOKEN compares it
+PASSWORD_DIGEST = "_password_digest"
+
+
+def _cache():
+    alias = getattr(settings, "BOOKS_AUTH_CACHE_ALIAS", "")
+    return caches[alias] if alias else None
+
+
+def principal_key(user_id) -> str:
+    return f"bookx:principal:v1:{user_id}"
+
+
+def forget_principal(user_id) -> None:
+    cache = _cache()
+    if cache is not None:
+        cache.delete(principal_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def principal_fields(self) -> Tuple[str, ...]:
+        meta = self.user_model._meta
+        wanted = {meta.pk.attname, api_settings.USER_ID_FIELD, self.user_model.USERNAME_FIELD,
+                  "is_active", "is_staff", "is_superuser"}
+        return tuple(f.attname for f in meta.concrete_fields if f.attname in wanted)
+
+    def load_principal(self, user_id) -> Optional[dict]:
+        fields = self.principal_fields()
+        extra = ("password",) if api_settings.CHECK_REVOKE_TOKEN else ()
+        row = self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values(*fields, *extra).first()
+        if row is not None and extra:
+            row[PASSWORD_DIGEST] = get_md5_hash_password(row.pop("password"))
+        return row
+
+    def build_user(self, state: dict):
+        fields = self.user_model._meta.concrete_fields
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model),
+            [f.attname for f in fields if f.attname in state],
+            [state.get(f.attname, DEFERRED) for f in fields],
+        )
+
+    def get_user(self, validated_token):
+        cache = _cache()
+        if cache is None:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = principal_key(user_id)
+        state = cache.get(key)
+        if state is None:
+            state = self.load_principal(user_id)
+            if state is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(key, state, getattr(settings, "BOOKS_AUTH_CACHE_TTL", 60))
+
+        user = self.build_user(state)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state.get(
+            PASSWORD_DIGEST
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """Same OpenAPI security scheme as JWTAuthentication (extensions don't match subclasses)."""
+    target_class = CachedJWTAuthentication
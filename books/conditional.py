@@ -0,0 +1,50 @@
+
+"""HTTP validators and caching headers for the read endpoints.
+
+Detail validators come from the row's `updated_at`; list validators from
+`max(updated_at)` and `count()` over the filtered queryset, plus the full
+request path (filters, cursor, page size), so a matching If-None-Match or
+If-Modified-Since gets a 304 before anything is serialized.
+"""
+import hashlib
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+Validators = Tuple[str, Optional[float]]
+
+
+def _etag(request, *parts) -> str:
+    # the representation also depends on host (absolute media URLs) and the negotiated format
+    key = "|".join(str(p) for p in (*parts, request.get_host(), request.META.get("HTTP_ACCEPT", "")))
+    return quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+
+def detail_validators(request, obj) -> Validators:
+    return _etag(request, obj.pk, obj.updated_at.isoformat()), obj.updated_at.timestamp()
+
+
+def list_validators(request, queryset) -> Validators:
+    # COUNT(*), not COUNT(id): Postgres can answer it from the (is_active, updated_at) index alone
+    agg = queryset.order_by().aggregate(last=Max("updated_at"), n=Count("*"))
+    last = agg["last"]
+    etag = _etag(request, request.get_full_path(), agg["n"], last.isoformat() if last else "")
+    return etag, last.timestamp() if last else None
+
+
+def respond_conditionally(request, validators: Validators, render: Callable, max_age: Optional[int] = None):
+    """304 if the client's copy is current, else `render()`; either way with validators and Cache-Control."""
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified and int(last_modified))
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        max_age = getattr(settings, "BOOKS_HTTP_MAX_AGE", 30) if max_age is None else max_age
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
@@ -0,0 +1,184 @@
+
+"""Ads per location and per author, for browsing without fetching the catalogue.
+
+`GET /api/books/facets/?q=&titles=&authors=&location=&limit=` returns
+
+    {"locations": [{"key", "label", "count"}, ...],   # most ads first
+     "authors":   [{"key", "label", "count"}, ...]}
+
+Keys are `canonical()` forms (case, accents, punctuation folded); `?location=`
+on the list takes either a key or any spelling of it. Only active ads count.
+
+Unfiltered counts are read from `BookFacet`, one counter row per (facet, key),
+moved on every Book save/delete (books.signals) by the difference between the
+stored row and what is written. The stored row is read with SELECT ... FOR
+UPDATE in the write's transaction, never taken from the instance, so a stale
+instance or two concurrent saves of one ad can't count it twice.
+`BookQuerySet.bulk_create` counts its rows too. A
+blind `QuerySet.update()` of is_active/location/author can't be followed:
+run `rebuild()` (`manage.py rebuild_facets`) afterwards, which also repairs
+any drift. Filtered counts group just the matching rows and are cached with
+the list pages (books.query_cache).
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import FACET_FIELDS, Book, BookFacet
+from .search import canonical
+
+FacetKey = Tuple[str, str]
+State = Tuple[bool, str, str]
+
+# bound parameters per IN (...) when moving many counters at once
+_CHUNK = 500
+
+
+def entries(state: Optional[State]) -> Dict[FacetKey, str]:
+    """(facet, key) -> label that a book in `state` (is_active, location, author) is counted under."""
+    if not state or not state[0]:
+        return {}
+    out = {}
+    for facet, value in ((BookFacet.LOCATION, state[1]), (BookFacet.AUTHOR, state[2])):
+        key = canonical(value)
+        if key:
+            out[(facet, key)] = " ".join(value.split())[:300]
+    return out
+
+
+def state_of(book: Book) -> State:
+    return tuple(getattr(book, f) for f in FACET_FIELDS)
+
+
+def locked_state(pk) -> Optional[State]:
+    """State of the stored row, locked until the surrounding transaction ends; None if there is no row."""
+    return Book.objects.select_for_update().filter(pk=pk).values_list(*FACET_FIELDS).first()
+
+
+def apply(deltas: Dict[FacetKey, int], labels: Dict[FacetKey, str]) -> None:
+    """Add `deltas` to the counters, creating missing rows. Keys moving by the same amount share a query."""
+    groups: Dict[Tuple[str, int], List[str]] = {}
+    for (facet, key), n in deltas.items():
+        if n:
+            groups.setdefault((facet, n), []).append(key)
+    if not groups:
+        return
+    with transaction.atomic():  # one commit for all counters, not one per UPDATE
+        for (facet, n), keys in groups.items():
+            for start in range(0, len(keys), _CHUNK):
+                chunk = keys[start:start + _CHUNK]
+                rows = BookFacet.objects.filter(facet=facet, key__in=chunk)
+                updated = rows.update(count=F("count") + n)
+                if updated == len(chunk) or n < 0:
+                    continue
+                # first ad for some of these keys; another writer may create them at the same time
+                existing = set(rows.values_list("key", flat=True)) if updated else set()
+                missing = [k for k in chunk if k not in existing]
+                BookFacet.objects.bulk_create(
+                    [BookFacet(facet=facet, key=k, label=labels[(facet, k)], count=0) for k in missing],
+                    ignore_conflicts=True,
+                )
+                BookFacet.objects.filter(facet=facet, key__in=missing).update(count=F("count") + n)
+
+
+def record_save(book: Book, created: bool, update_fields=None) -> None:
+    """Move the counters from the locked row state books.signals took before the write to `book`."""
+    if not created and update_fields is not None and not set(update_fields) & set(FACET_FIELDS):
+        return  # e.g. the image pipeline's saves
+    old = book.__dict__.pop("_facet_state", None)
+    if created:
+        old = None
+    new = state_of(book)
+    if old is not None and update_fields is not None:
+        # fields left out of the UPDATE keep their stored value, whatever the instance holds
+        new = tuple(v if f in update_fields else o for f, v, o in zip(FACET_FIELDS, new, old))
+    if new != old:
+        before, after = entries(old), entries(new)
+        deltas = Counter({k: 1 for k in after})
+        deltas.subtract({k: 1 for k in before})
+        apply(deltas, {**before, **after})
+
+
+def record_delete(book: Book) -> None:
+    # nothing locked: another transaction deleted the row first and already uncounted it
+    before = entries(book.__dict__.pop("_facet_state", None))
+    apply({k: -1 for k in before}, before)
+
+
+def record_created(books: Iterable[Book]) -> None:
+    deltas: Counter = Counter()
+    labels: Dict[FacetKey, str] = {}
+    for book in books:
+        for k, label in entries(state_of(book)).items():
+            deltas[k] += 1
+            labels.setdefault(k, label)
+    apply(deltas, labels)
+
+
+def _tally(rows: Iterable[Tuple[str, str, int]]) -> Dict[str, list]:
+    """(key, spelling, count) rows -> {key: [most common spelling, total]}."""
+    out: Dict[str, list] = {}
+    best: Dict[str, int] = {}
+    for key, spelling, n in rows:
+        if not key:
+            continue
+        entry = out.setdefault(key, [spelling, 0])
+        entry[1] += n
+        if n > best.get(key, 0):
+            best[key] = n
+            entry[0] = " ".join(spelling.split())[:300]
+    return out
+
+
+def _location_rows(qs):
+    return qs.values_list("location_key", "location").annotate(n=Count("*"))
+
+
+def _author_rows(qs):
+    return ((canonical(author), author, n) for author, n in qs.values_list("author").annotate(n=Count("*")))
+
+
+def rebuild(book_model=Book, facet_model=BookFacet) -> int:
+    """Recount every facet from the table (and fix stale location_key values); returns the counter rows written.
+
+    Also run by migration 0008, with the historical models.
+    """
+    with transaction.atomic():
+        for location in book_model.objects.order_by().values_list("location", flat=True).distinct():
+            book_model.objects.filter(location=location).exclude(location_key=canonical(location)).update(
+                location_key=canonical(location)
+            )
+        active = book_model.objects.filter(is_active=True).order_by()
+        counters = [
+            facet_model(facet=facet, key=key, label=label, count=n)
+            for facet, rows in ((BookFacet.LOCATION, _location_rows(active)), (BookFacet.AUTHOR, _author_rows(active)))
+            for key, (label, n) in _tally(rows).items()
+        ]
+        facet_model.objects.all().delete()
+        facet_model.objects.bulk_create(counters, batch_size=1000)
+    return len(counters)
+
+
+def _entry(key: str, label: str, count: int) -> dict:
+    return {"key": key, "label": label, "count": count}
+
+
+def top_counts(limit: int) -> Dict[str, List[dict]]:
+    """Unfiltered counts, straight from the counters."""
+    out = {}
+    for facet, name in ((BookFacet.LOCATION, "locations"), (BookFacet.AUTHOR, "authors")):
+        rows = BookFacet.objects.filter(facet=facet, count__gt=0).order_by("-count", "key")[:limit]
+        out[name] = [_entry(key, label, n) for key, label, n in rows.values_list("key", "label", "count")]
+    return out
+
+
+def matching_counts(queryset, limit: int) -> Dict[str, List[dict]]:
+    """Counts over the rows of a filtered list queryset only."""
+    qs = queryset.order_by()
+    out = {}
+    for name, rows in (("locations", _location_rows(qs)), ("authors", _author_rows(qs))):
+        ranked = sorted(_tally(rows).items(), key=lambda item: (-item[1][1], item[0]))[:limit]
+        out[name] = [_entry(key, label, n) for key, (label, n) in ranked]
+    return out
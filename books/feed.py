@@ -0,0 +1,442 @@
+
+"""Push feed of Book changes for clients that would otherwise poll the list.
+
+    GET /api/books/feed/?q=&titles=&authors=&location=   Server-Sent Events
+    ws://<host>/api/books/feed/ws/?<same filters>         WebSocket (bookx.asgi)
+
+Both are served by the ASGI app only. Committed saves and deletes become
+events (`created`, `updated`, `deactivated`, `deleted`) that go to a broker;
+the broker hands each event to this process's `FeedHub`, which matches it
+against every subscriber's filters in memory (same rules as the list
+filters: prefix tokens, titles/authors OR'ed, groups AND'ed) and queues it.
+
+`LocalBroker` delivers within the process; `RedisBroker` (default when
+`REDIS_URL` is set) fans out across workers via Redis pub/sub. Another broker
+can be plugged in with `BOOKS_FEED_BROKER=<dotted.path>`. Publishing is a
+plain PUBLISH; a process only subscribes to the channel (one listener thread)
+once a client of its own opens the feed, see start_listening(). Management
+commands, task workers and WSGI processes publish without ever listening.
+
+Each subscriber has a queue of `BOOKS_FEED_BUFFER` events. A client that reads
+slower than events arrive fills it; it then gets one `overflow` event and is
+disconnected, and should catch up through /api/books/changes/ before
+reconnecting. Publishers never wait on subscribers.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.http import QueryDict
+from django.utils.module_loading import import_string
+
+from .search import canonical, tokenize
+
+logger = logging.getLogger(__name__)
+
+WS_PATH = "/api/books/feed/ws/"
+# queued as (event type, JSON text): encoded once per event, not once per subscriber
+Message = Tuple[str, str]
+OVERFLOW: Message = ("overflow", json.dumps(
+    {"type": "overflow", "detail": "Too far behind; resync via /api/books/changes/ and reconnect."}
+))
+
+
+def book_event(kind: str, instance) -> dict:
+    """Event for `instance`; `owner_username` is null unless the owner is already loaded (see with_owner())."""
+    from .serializers import BookReadSerializer
+
+    row = {name: getattr(instance, name) for name in BookReadSerializer.COLUMNS if "__" not in name}
+    row["image"] = instance.image.name if instance.image else ""
+    owner = type(instance).owner.field.get_cached_value(instance, None)  # no query per write
+    row["owner__username"] = owner.username if owner is not None else None
+    reader = BookReadSerializer()
+    return {
+        "type": kind,
+        "id": instance.pk,
+        "at": reader.datetime.to_representation(instance.updated_at),
+        "book": reader.to_representation(row),
+    }
+
+
+def with_owner(event: dict) -> dict:
+    """Fill in the owner's username if book_event() could not; one query, paid only for delivered events."""
+    from django.contrib.auth import get_user_model
+
+    book = event.get("book") or {}
+    if book.get("owner") is not None and book.get("owner_username") is None:
+        book["owner_username"] = (
+            get_user_model().objects.filter(pk=book["owner"]).values_list("username", flat=True).first()
+        )
+    return event
+
+
+class FeedFilter:
+    """In-memory equivalent of BaseSearchBackend.search() plus ?location=."""
+
+    def __init__(self, q: str = "", titles: Sequence[str] = (), authors: Sequence[str] = (), location: str = ""):
+        self.groups: List[List[tuple]] = []
+        if tokenize(q):
+            self.groups.append([(None, tokenize(q))])
+        for field, values in (("title", titles), ("author", authors)):
+            terms = [(field, tokenize(v)) for v in values if tokenize(v)]
+            if terms:
+                self.groups.append(terms)
+        self.location = canonical(location)
+
+    @classmethod
+    def from_params(cls, params) -> "FeedFilter":
+        from .views import _split_params
+
+        return cls(
+            q=params.get("q", "").strip(),
+            titles=_split_params(params.getlist("titles")),
+            authors=_split_params(params.getlist("authors")),
+            location=params.get("location", ""),
+        )
+
+    @staticmethod
+    def _hit(tokens: List[str], haystack: List[str]) -> bool:
+        return all(any(word.startswith(t) for word in haystack) for t in tokens)
+
+    @staticmethod
+    def document(book: dict) -> dict:
+        """Tokens of `book` for matches(); built once per event, shared by all subscribers."""
+        doc = {f: tokenize(book.get(f) or "") for f in ("title", "author", "description")}
+        doc[None] = doc["title"] + doc["author"] + doc["description"]
+        doc["location"] = canonical(book.get("location") or "")
+        return doc
+
+    def matches(self, doc: dict) -> bool:
+        if self.location and doc["location"] != self.location:
+            return False
+        return all(any(self._hit(tokens, doc[field]) for field, tokens in group) for group in self.groups)
+
+
+class Subscriber:
+    """Bounded event buffer for one connection; filled from any thread, read on one event loop.
+
+    The loop is taken on the first read, not at subscribe time: under ASGI the
+    view may run on a different loop than the one streaming the response.
+    """
+
+    def __init__(self, feed_filter: FeedFilter, size: int):
+        self.filter = feed_filter
+        self.size = size
+        self.pending: deque = deque()
+        self.overflowed = False
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def push(self, message: Message):
+        """Queue `message`; returns (loop, wakeup event) for the caller to set, or None."""
+        with self._lock:
+            if self.overflowed:
+                return None
+            if len(self.pending) >= self.size:
+                # reader too slow: drop the backlog, tell it to resync, then end the stream
+                self.overflowed = True
+                self.pending.clear()
+                self.pending.append(OVERFLOW)
+            else:
+                self.pending.append(message)
+            return (self._loop, self._wakeup) if self._loop is not None else None
+
+    async def get(self, timeout: float) -> Optional[Message]:
+        """Next message, or None after `timeout` seconds without one."""
+        with self._lock:
+            if self._loop is None:
+                self._loop, self._wakeup = asyncio.get_running_loop(), asyncio.Event()
+        while True:
+            with self._lock:
+                if self.pending:
+                    return self.pending.popleft()
+                self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+
+def _set_all(events) -> None:
+    for event in events:
+        event.set()
+
+
+class FeedFull(Exception):
+    pass
+
+
+class FeedHub:
+    def __init__(self, max_subscribers: int = 1000, buffer: int = 100):
+        self.max_subscribers = max_subscribers
+        self.buffer = buffer
+        self._subscribers: set = set()
+        self._lock = threading.Lock()
+        self.counters = {"delivered": 0, "overflows": 0, "rejected": 0}
+
+    def subscribe(self, feed_filter: FeedFilter) -> Subscriber:
+        sub = Subscriber(feed_filter, self.buffer)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.counters["rejected"] += 1
+                raise FeedFull()
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+            if sub.overflowed:
+                self.counters["overflows"] += 1
+
+    def dispatch(self, event: dict) -> None:
+        """Match `event` against every subscriber and queue it; callable from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        doc = FeedFilter.document(event.get("book") or {})
+        message: Optional[Message] = None
+        delivered = 0
+        wake: Dict[asyncio.AbstractEventLoop, list] = {}
+        for sub in subscribers:
+            if sub.filter.matches(doc):
+                if message is None:
+                    message = (event["type"], json.dumps(with_owner(event)))
+                delivered += 1
+                target = sub.push(message)
+                if target is not None:
+                    wake.setdefault(target[0], []).append(target[1])
+        # one thread-safe callback per loop rather than one per subscriber
+        for loop, events in wake.items():
+            try:
+                loop.call_soon_threadsafe(_set_all, events)
+            except RuntimeError:  # loop already closed
+                pass
+        with self._lock:
+            self.counters["delivered"] += delivered
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), **self.counters}
+
+    def idle(self) -> bool:
+        with self._lock:
+            return not self._subscribers
+
+
+class LocalBroker:
+    """Single-process delivery."""
+
+    def __init__(self, hub: FeedHub):
+        self.hub = hub
+
+    def wanted(self) -> bool:
+        """False when no one here could receive an event, so publishers can skip building it."""
+        return not self.hub.idle()
+
+    def publish(self, event: dict) -> None:
+        self.hub.dispatch(event)
+
+
+class RedisBroker:
+    """Publishes to a Redis channel; one listener thread per process feeds the local hub.
+
+    The listener outlives Redis outages: a dropped connection is re-subscribed
+    after a backoff (`retry_min` doubling up to `retry_max` seconds). Events
+    published while it is down are lost; clients catch up via /api/books/changes/.
+    """
+
+    channel = "bookx:feed"
+    retry_min = 0.5
+    retry_max = 30.0
+
+    def __init__(self, hub: FeedHub, url: str = ""):
+        import redis
+
+        self.hub = hub
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.reconnects = 0
+        self._listener: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def wanted(self) -> bool:
+        return True  # subscribers may sit in any worker
+
+    def _listen(self) -> None:
+        delay = self.retry_min
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                if self.reconnects:
+                    logger.info("feed: resubscribed to %s", self.channel)
+                delay = self.retry_min
+                for message in pubsub.listen():
+                    try:
+                        self.hub.dispatch(json.loads(message["data"]))
+                    except Exception:
+                        logger.exception("feed: bad message on %s", self.channel)
+                    finally:
+                        close_old_connections()  # with_owner() may have used this thread's connection
+            except Exception:
+                logger.warning("feed: lost %s, reconnecting in %.1fs", self.channel, delay, exc_info=True)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            self.reconnects += 1
+            time.sleep(delay)
+            delay = min(delay * 2, self.retry_max)
+
+    def start(self) -> None:
+        """Start the listener thread (once); publish() works without it."""
+        with self._start_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="bookx-feed-redis", daemon=True)
+                self._listener.start()
+
+    def publish(self, event: dict) -> None:
+        self.client.publish(self.channel, json.dumps(event))
+
+
+_hub: Optional[FeedHub] = None
+_broker = None
+_init_lock = threading.Lock()
+
+
+def get_hub() -> FeedHub:
+    global _hub
+    if _hub is None:
+        with _init_lock:
+            if _hub is None:
+                _hub = FeedHub(
+                    max_subscribers=getattr(settings, "BOOKS_FEED_MAX_SUBSCRIBERS", 1000),
+                    buffer=getattr(settings, "BOOKS_FEED_BUFFER", 100),
+                )
+    return _hub
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        hub = get_hub()
+        with _init_lock:
+            if _broker is None:
+                path = getattr(settings, "BOOKS_FEED_BROKER", "")
+                if not path:
+                    path = "books.feed.RedisBroker" if getattr(settings, "REDIS_URL", "") else "books.feed.LocalBroker"
+                _broker = import_string(path)(hub)
+    return _broker
+
+
+def start_listening():
+    """get_broker(), with its listener running (brokers with a start() method); called by subscribers only."""
+    broker = get_broker()
+    start = getattr(broker, "start", None)
+    if start is not None:
+        start()
+    return broker
+
+
+def feed_gauges() -> Dict[str, float]:
+    if _hub is None:
+        return {}
+    stats = _hub.stats()
+    gauges = {
+        "bookx_feed_subscribers": stats["subscribers"],
+        "bookx_feed_events_delivered": stats["delivered"],
+        "bookx_feed_overflow_disconnects": stats["overflows"],
+        "bookx_feed_rejected_connections": stats["rejected"],
+    }
+    if hasattr(_broker, "reconnects"):
+        gauges["bookx_feed_broker_reconnects"] = _broker.reconnects
+    return gauges
+
+
+def publish(event: dict) -> None:
+    try:
+        get_broker().publish(event)
+    except Exception:
+        # a feed outage must not fail the write that triggered it
+        logger.exception("feed: publish failed for book %s", event.get("id"))
+
+
+def publish_on_commit(kind: str, instance) -> None:
+    """Snapshot `instance` now, publish once the surrounding transaction commits."""
+    try:
+        wanted = getattr(get_broker(), "wanted", None)
+        if wanted is not None and not wanted():
+            return
+        event = book_event(kind, instance)
+    except Exception:
+        logger.exception("feed: could not build %s event for book %s", kind, instance.pk)
+        return
+    transaction.on_commit(lambda: publish(event))
+
+
+async def stream(sub: Subscriber, heartbeat: float):
+    """Yield messages for `sub` (None on every idle `heartbeat`); stops after an overflow."""
+    while True:
+        message = await sub.get(heartbeat)
+        yield message
+        if message is OVERFLOW:
+            return
+
+
+def heartbeat() -> float:
+    return float(getattr(settings, "BOOKS_FEED_HEARTBEAT", 15))
+
+
+async def sse_body(hub: FeedHub, sub: Subscriber):
+    """text/event-stream body; a comment line keeps idle proxies from closing the stream."""
+    try:
+        yield "retry: 5000\n\n"
+        async for message in stream(sub, heartbeat()):
+            if message is None:
+                yield ": ping\n\n"
+            else:
+                yield f"event: {message[0]}\ndata: {message[1]}\n\n"
+    finally:
+        hub.unsubscribe(sub)
+
+
+async def websocket_app(scope, receive, send):
+    """Raw ASGI WebSocket endpoint at WS_PATH (routed by bookx.asgi); server -> client only."""
+    if (await receive())["type"] != "websocket.connect":
+        return
+    hub = get_hub()
+    try:
+        sub = hub.subscribe(FeedFilter.from_params(QueryDict(scope.get("query_string", b"").decode("latin-1"))))
+    except FeedFull:
+        await send({"type": "websocket.close", "code": 1013})  # try again later
+        return
+    try:
+        start_listening()
+        await send({"type": "websocket.accept"})
+
+        async def pump():
+            async for message in stream(sub, heartbeat()):
+                if message is not None:
+                    await send({"type": "websocket.send", "text": message[1]})
+            await send({"type": "websocket.close", "code": 1000})  # after an overflow
+
+        async def drain():
+            while (await receive())["type"] != "websocket.disconnect":
+                pass
+
+        tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        hub.unsubscribe(sub)
@@ -0,0 +1,138 @@
+
+"""Derivatives for Book.image.
+
+For every size in `BOOK_IMAGE_SIZES` (name -> longest edge in px) a WebP and a
+JPEG copy is written next to the upload under `book_images/variants/<id>/`,
+EXIF-rotated and with metadata dropped. When `BOOK_IMAGE_STRIP_EXIF` is on the
+original is rewritten without EXIF too (JPEG keeps its quantization tables).
+
+The result is stored in `Book.image_variants`:
+
+    {"source": "<image name>", "thumb": {"webp": name, "jpeg": name, "width": w, "height": h}, ...}
+
+`source` records which upload the variants belong to, so re-saving the row
+does not re-run the pipeline.
+"""
+import io
+import logging
+import posixpath
+from typing import Dict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION = 0x0112
+DEFAULT_SIZES = {"thumb": 320, "detail": 1280}
+FORMATS = (("webp", "WEBP", {"quality": 80, "method": 4}), ("jpeg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}))
+
+
+def image_sizes() -> Dict[str, int]:
+    return getattr(settings, "BOOK_IMAGE_SIZES", DEFAULT_SIZES)
+
+
+def _variant_dir(book) -> str:
+    return posixpath.join(posixpath.dirname(book.image.name), "variants", str(book.pk))
+
+
+def variant_files(variants: dict) -> set:
+    return {
+        entry[fmt]
+        for entry in (variants or {}).values() if isinstance(entry, dict)
+        for fmt, _pil, _opts in FORMATS if entry.get(fmt)
+    }
+
+
+def delete_files(names) -> None:
+    from .models import Book
+
+    storage = Book._meta.get_field("image").storage
+    for name in names:
+        storage.delete(name)
+
+
+def _strip_original_exif(book, img: Image.Image) -> None:
+    if not img.info.get("exif") or img.format not in ("JPEG", "WEBP", "PNG"):
+        return
+    out = io.BytesIO()
+    if img.getexif().get(ORIENTATION, 1) != 1:
+        # the orientation tag goes away with the rest, so bake the rotation in
+        opts = {"quality": 90} if img.format == "JPEG" else {}
+        ImageOps.exif_transpose(img).save(out, format=img.format, **opts)
+    else:
+        opts = {"quality": "keep"} if img.format == "JPEG" else {}
+        img.save(out, format=img.format, **opts)
+    # saved under a fresh name; the original is deleted only once the row points at the copy
+    book.image.name = book.image.storage.save(book.image.name, ContentFile(out.getvalue()))
+
+
+def build_variants(book) -> dict:
+    storage = book.image.storage
+    with book.image.open("rb") as fh:
+        original = Image.open(fh)
+        original.load()
+    if getattr(settings, "BOOK_IMAGE_STRIP_EXIF", True):
+        _strip_original_exif(book, original)
+
+    img = ImageOps.exif_transpose(original)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, "white")
+        flat.paste(img, mask=img.getchannel("A"))
+        img = flat
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    stem = posixpath.splitext(posixpath.basename(book.image.name))[0]
+    variants = {"source": book.image.name}
+    for size_name, edge in image_sizes().items():
+        resized = img.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        entry = {"width": resized.width, "height": resized.height}
+        for fmt, pil_format, opts in FORMATS:
+            out = io.BytesIO()
+            resized.save(out, format=pil_format, **opts)  # no exif= kwarg: metadata is dropped
+            name = posixpath.join(_variant_dir(book), f"{stem}_{size_name}.{fmt if fmt != 'jpeg' else 'jpg'}")
+            if storage.exists(name):
+                storage.delete(name)
+            entry[fmt] = storage.save(name, ContentFile(out.getvalue()))
+        variants[size_name] = entry
+    return variants
+
+
+def process_book_image(book_id: int) -> None:
+    """Idempotent pipeline job; safe to re-run for the same book."""
+    from .models import Book
+
+    book = Book.objects.filter(pk=book_id).first()
+    if book is None:
+        return
+    old = book.image_variants or {}
+    if not book.image:
+        if old:  # image was cleared
+            delete_files(variant_files(old))
+            book.image_variants = {}
+            book.save(update_fields=["image_variants", "updated_at"])
+        return
+    if old.get("source") == book.image.name and all(k in old for k in image_sizes()):
+        return
+    uploaded = book.image.name
+    try:
+        variants = build_variants(book)
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning("book %s: cannot process image %s (%s)", book_id, uploaded, e)
+        if book.image.name != uploaded:
+            delete_files([book.image.name])  # the stripped copy; the row still points at the upload
+        return
+    if not Book.objects.filter(pk=book_id, image=uploaded).exists():
+        # replaced while we were working; the newer upload has its own job
+        if book.image.name != uploaded:
+            delete_files([book.image.name])
+        return
+    delete_files(variant_files(old) - variant_files(variants))
+    book.image_variants = variants
+    book.save(update_fields=["image", "image_variants", "updated_at"])
+    if book.image.name != uploaded:
+        delete_files([uploaded])
@@ -0,0 +1,200 @@
+
+"""Bulk import of ads from partner files (CSV or NDJSON).
+
+`POST /api/books/import/` with the file as the raw body (`Content-Type:
+text/csv` or `application/x-ndjson`), or `manage.py import_books FILE
+--owner USER`. Every row becomes an ad owned by the caller:
+
+    CSV     a header row, then one ad per record; title and location columns required
+    NDJSON  one JSON object per line
+
+Columns/keys are BookImportSerializer's (title, author, description,
+phone_number, location, is_active); others are ignored, and empty CSV cells
+take the field's default. The file is read a line at a time; rows are
+validated and inserted `BOOKS_IMPORT_BATCH_SIZE` at a time, one `bulk_create`
+and one transaction per batch, so memory stays flat whatever the file size
+and a bad row only costs itself:
+
+    {"created": 9998, "failed": 2,
+     "errors": [{"line": 17, "errors": {"location": ["This field is required."]}}, ...],
+     "errors_truncated": false}
+
+`line` is the file's line number (CSV header = 1, a multi-line record reports
+its first line). Only the first `BOOKS_IMPORT_MAX_ERRORS` errors are listed.
+A file that breaks off unparseably (e.g. an unclosed CSV quote) keeps the
+batches before it and adds `detail`. Imported ads are searchable and counted
+in the facets right away but skip the live feed, which a partner file would
+overflow; clients pick them up from the list and delta sync.
+"""
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .models import Book
+from .query_cache import invalidate
+from .serializers import BookImportSerializer
+
+# request Content-Type / file extension -> format
+CONTENT_TYPES = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/jsonl": "ndjson"}
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+REQUIRED_COLUMNS = ("title", "location")
+MAX_LINE = 1024 * 1024  # bytes; longer lines are row errors, not buffered
+
+Row = Tuple[int, Optional[dict], Optional[dict]]  # (line, data, errors): one of data/errors is None
+
+
+class ImportRejected(ValueError):
+    """The file can't be read as the given format (no header, missing columns, broken quoting)."""
+
+
+def _row_error(message: str) -> dict:
+    return {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+
+
+def _lines(stream: BinaryIO) -> Iterator[Tuple[int, Optional[bytes]]]:
+    """(line number, line) for each line of a binary stream; None in place of a line over MAX_LINE."""
+    number = 0
+    while True:
+        line = stream.readline(MAX_LINE + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > MAX_LINE:
+            while line and not line.endswith(b"\n"):  # skip the rest of it
+                line = stream.readline(MAX_LINE + 1)
+            line = None
+        yield number, line
+
+
+def _ndjson_rows(stream: BinaryIO) -> Iterator[Row]:
+    for number, line in _lines(stream):
+        if line is None:
+            yield number, None, _row_error(f"Line longer than {MAX_LINE} bytes.")
+            continue
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:  # bad JSON or bad UTF-8
+            data = None
+        if isinstance(data, dict):
+            yield number, data, None
+        else:
+            yield number, None, _row_error("Expected a JSON object.")
+
+
+def _csv_rows(stream: BinaryIO) -> Iterator[Row]:
+    unreadable: Set[int] = set()
+
+    def text():
+        for number, line in _lines(stream):
+            if line is None:
+                unreadable.add(number)
+                line = b"\n"
+            try:
+                yield line.decode("utf-8-sig" if number == 1 else "utf-8")
+            except UnicodeDecodeError:
+                unreadable.add(number)
+                yield line.decode("utf-8", "replace")  # keeps the quoting intact for the rows after it
+
+    reader = csv.reader(text())
+    try:
+        header = next(reader, None)
+    except csv.Error as exc:
+        raise ImportRejected(f"line 1: {exc}") from exc
+    if not header or unreadable:
+        raise ImportRejected("Expected a UTF-8 header row naming the columns.")
+    columns = [c.strip().lower() for c in header]
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ImportRejected(f"Missing column(s): {', '.join(missing)}.")
+
+    def rows():
+        start = reader.line_num + 1
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:  # e.g. an unclosed quote running into the field size limit
+                raise ImportRejected(f"line {start}: {exc}") from exc
+            if unreadable:  # only ever lines of this record: the reader stops at its end
+                unreadable.clear()
+                yield start, None, _row_error(f"Not UTF-8, or a line longer than {MAX_LINE} bytes.")
+            elif len(record) != len(columns):
+                if record:  # blank lines are skipped
+                    yield start, None, _row_error(f"Expected {len(columns)} cells, got {len(record)}.")
+            else:
+                yield start, {c: v for c, v in zip(columns, record) if v != ""}, None
+            start = reader.line_num + 1
+
+    return rows()
+
+
+def read_rows(stream: Optional[BinaryIO], fmt: str) -> Iterator[Row]:
+    """Rows of `stream` in `fmt` ("csv"/"ndjson"); a CSV header is checked here, before anything is imported."""
+    stream = stream if stream is not None else io.BytesIO()
+    return _csv_rows(stream) if fmt == "csv" else _ndjson_rows(stream)
+
+
+class BookImport:
+    """Validates and inserts rows for `owner` in batches; holds the running summary."""
+
+    def __init__(self, owner, batch_size: Optional[int] = None, max_errors: Optional[int] = None):
+        self.owner_id = owner.pk
+        self.batch_size = batch_size or getattr(settings, "BOOKS_IMPORT_BATCH_SIZE", 1000)
+        self.max_errors = getattr(settings, "BOOKS_IMPORT_MAX_ERRORS", 1000) if max_errors is None else max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.detail: Optional[str] = None
+
+    def run(self, rows: Iterator[Row]) -> "BookImport":
+        serializer = BookImportSerializer()  # one instance: fields are built once, not per row
+        batch: List[Book] = []
+        try:
+            for line, data, errors in rows:
+                if errors is None:
+                    try:
+                        batch.append(Book(owner_id=self.owner_id, **serializer.run_validation(data)))
+                    except serializers.ValidationError as exc:
+                        errors = serializers.as_serializer_error(exc)
+                if errors is not None:
+                    self.fail(line, errors)
+                elif len(batch) >= self.batch_size:
+                    self.flush(batch)
+                    batch = []
+        except ImportRejected as exc:
+            self.detail = str(exc)
+        self.flush(batch)
+        return self
+
+    def fail(self, line: int, errors: dict) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+    def flush(self, batch: List[Book]) -> None:
+        if not batch:
+            return
+        with transaction.atomic():
+            Book.objects.bulk_create(batch)  # BookQuerySet: location_key and facet counts in the same transaction
+            transaction.on_commit(invalidate)  # bulk_create skips the signals that version the list cache
+        self.created += len(batch)
+
+    def summary(self) -> dict:
+        out = {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+        if self.detail:
+            out["detail"] = self.detail
+        return out
@@ -0,0 +1,315 @@
+
+"""Per-request performance accounting.
+
+`InstrumentationMiddleware` opens a `RequestStats` in a context variable for
+each request. While it is open:
+
+- every SQL statement on any connection is counted and timed (an execute
+  wrapper installed on `connection_created`), and its shape (the SQL with
+  IN-lists collapsed) is tallied; a shape repeated `BOOKS_N_PLUS_ONE_THRESHOLD`
+  times in one request is reported as a likely N+1;
+- `timed("serialize")` / `timed("ai")` blocks add to the phase timers
+  (serializers, the JSON renderer and the Gemini call use them).
+
+On the way out the request is folded into the process-wide `REGISTRY`
+(exposed in Prometheus text format by `MetricsView`) and logged as one JSON
+line on the `books.requests` logger. Counters are per process: with several
+workers each one reports its own.
+
+The async views push work onto thread pools; books.aio copies the context so
+those queries land on the right request.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger("books.requests")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+_VALUES_RE = re.compile(r"VALUES (?:\((?:%s, )*%s\)(?:, )?)+")
+
+
+def query_shape(sql: str) -> str:
+    """SQL with variable-length parameter lists collapsed, so repeats compare equal."""
+    return _VALUES_RE.sub("VALUES (...)", _IN_LIST_RE.sub("IN (...)", sql))
+
+
+class RequestStats:
+    __slots__ = ("started", "sql_count", "sql_seconds", "shapes", "phases", "_depth")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.shapes: Counter = Counter()
+        self.phases: Dict[str, float] = {}
+        self._depth: Dict[str, int] = {}
+
+    def repeated_shapes(self, threshold: int) -> List[Tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("books_request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@contextmanager
+def timed(phase: str):
+    """Add the block's wall time to `phase` of the current request; nested blocks count once."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    depth = stats._depth.get(phase, 0)
+    stats._depth[phase] = depth + 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats._depth[phase] = depth
+        if depth == 0:
+            stats.phases[phase] = stats.phases.get(phase, 0.0) + time.perf_counter() - t0
+
+
+def sql_recorder(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_seconds += time.perf_counter() - t0
+        stats.sql_count += 1
+        stats.shapes[query_shape(sql)] += 1
+
+
+def install_sql_recorder(sender, connection, **kwargs):
+    if sql_recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_recorder)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Minimal in-process counters/histograms rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple], _Histogram] = {}
+        self.help: Dict[str, Tuple[str, str]] = {}
+
+    def describe(self, name: str, kind: str, text: str) -> None:
+        self.help[name] = (kind, text)
+
+    def inc(self, name: str, labels: Tuple, value: float = 1.0) -> None:
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0.0) + value
+
+    def observe(self, name: str, labels: Tuple, value: float, buckets=DURATION_BUCKETS) -> None:
+        with self._lock:
+            hist = self.histograms.get((name, labels))
+            if hist is None:
+                hist = self.histograms[(name, labels)] = _Histogram(buckets)
+            hist.observe(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self, gauges: Dict[str, float] = None) -> str:
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda kv: kv[0])
+            histograms = [(key, (h.buckets, list(h.counts), h.sum, h.count)) for key, h in histograms]
+        lines: List[str] = []
+        seen = set()
+
+        def header(name):
+            if name not in seen and name in self.help:
+                kind, text = self.help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+            seen.add(name)
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {_num(value)}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            header(name)
+            for bound, n in zip(buckets, counts):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _num(bound)),))} {n}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, value in sorted((gauges or {}).items()):
+            header(name)
+            lines.append(f"{name} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+REGISTRY = Registry()
+REGISTRY.describe("bookx_http_requests_total", "counter", "Requests by view, method and status.")
+REGISTRY.describe("bookx_http_request_duration_seconds", "histogram", "Wall time per request.")
+REGISTRY.describe("bookx_db_queries_per_request", "histogram", "SQL statements per request.")
+REGISTRY.describe("bookx_db_query_seconds_total", "counter", "Time spent in SQL.")
+REGISTRY.describe("bookx_serialization_seconds", "histogram", "Serializer + renderer time per request.")
+REGISTRY.describe("bookx_ai_upstream_seconds", "histogram", "Gemini call time per request that reached upstream.")
+REGISTRY.describe("bookx_n_plus_one_total", "counter", "Requests that repeated one query shape past the threshold.")
+
+
+def cache_gauges() -> Dict[str, float]:
+    from .ai_cache import get_advice_cache
+    from .query_cache import get_query_cache
+
+    gauges = {}
+    qc = get_query_cache()
+    if qc is not None:
+        stats = qc.stats()
+        gauges.update({
+            "bookx_query_cache_hits": stats["hits"],
+            "bookx_query_cache_misses": stats["misses"],
+            "bookx_query_cache_hit_ratio": stats["hit_ratio"],
+        })
+    stats = get_advice_cache().stats()
+    gauges.update({
+        "bookx_ai_cache_hits": stats["hits"] + stats["shared_hits"],
+        "bookx_ai_cache_misses": stats["misses"],
+        "bookx_ai_cache_hit_ratio": stats["hit_ratio"],
+        "bookx_ai_cache_shared_errors": stats["shared_errors"],
+    })
+    return gauges
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return (match.view_name or match._func_path) if match else "unmatched"
+
+
+def record(request, response, stats: RequestStats) -> None:
+    elapsed = time.perf_counter() - stats.started
+    view = _view_name(request)
+    status = getattr(response, "status_code", 500)
+    labels = (("view", view), ("method", request.method))
+
+    REGISTRY.inc("bookx_http_requests_total", labels + (("status", str(status)),))
+    REGISTRY.observe("bookx_http_request_duration_seconds", labels, elapsed)
+    REGISTRY.observe("bookx_db_queries_per_request", labels, stats.sql_count, QUERY_BUCKETS)
+    REGISTRY.inc("bookx_db_query_seconds_total", labels, stats.sql_seconds)
+    if "serialize" in stats.phases:
+        REGISTRY.observe("bookx_serialization_seconds", labels, stats.phases["serialize"])
+    if "ai" in stats.phases:
+        REGISTRY.observe("bookx_ai_upstream_seconds", labels, stats.phases["ai"])
+
+    repeated = stats.repeated_shapes(getattr(settings, "BOOKS_N_PLUS_ONE_THRESHOLD", 5))
+    if repeated:
+        REGISTRY.inc("bookx_n_plus_one_total", labels)
+
+    if logger.isEnabledFor(logging.INFO):
+        line = {
+            "event": "request",
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "db_queries": stats.sql_count,
+            "db_ms": round(stats.sql_seconds * 1000, 2),
+            **{f"{phase}_ms": round(seconds * 1000, 2) for phase, seconds in stats.phases.items()},
+        }
+        if repeated:
+            line["n_plus_one"] = [
+                {"count": n, "shape": hashlib.sha1(shape.encode()).hexdigest()[:12], "sql": shape[:200]}
+                for shape, n in repeated[:3]
+            ]
+        logger.log(logging.WARNING if repeated else logging.INFO, json.dumps(line))
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "BOOKS_INSTRUMENTATION", True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            _current.reset(token)
+            record(request, response, stats)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            _current.reset(token)
+            record(request, response, stats)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("serialize"):
+            return super().render(data, accepted_media_type, renderer_context)
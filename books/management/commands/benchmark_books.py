@@ -0,0 +1,161 @@
+import json
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from books.models import Book
+
+from .seed_books import FIRST_NAMES, LAST_NAMES, TITLE_WORDS
+
+SCENARIOS = ("list", "search", "detail", "ai_match")
+
+
+class QueryCounter:
+    """connection.execute_wrapper that only counts; cheaper than CaptureQueriesContext."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+def canned_advice(rnd):
+    """Stands in for the model reply so ai_match times matching + serialization only."""
+    return {
+        "topics": rnd.sample(TITLE_WORDS, 3),
+        "suggested_books": [
+            {"title": " ".join(rnd.sample(TITLE_WORDS, 2)).title(), "author": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"}
+            for _ in range(5)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay list/search/detail/AI-match requests through the test client against the current "
+        "database (see seed_books) and report p50/p95 latency, queries and memory per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per scenario")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per scenario first")
+        parser.add_argument("--memory-samples", type=int, default=20, help="Requests per scenario traced for peak memory")
+        parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--cache", action="store_true", help="Keep the list/search result cache on")
+        parser.add_argument("--output", help="Write JSON results to this file ('-' for stdout)")
+
+    def make_requests(self, scenario, rnd, ids):
+        """Yield (path, params) forever for one scenario."""
+        while True:
+            if scenario == "list":
+                # mostly keep following the cursor, sometimes start over at page one
+                yield (self.next_url, None) if self.next_url and rnd.random() < 0.9 else ("/api/books/", None)
+            elif scenario == "search":
+                yield "/api/books/", {"q": rnd.choice(TITLE_WORDS)}
+            elif scenario == "detail":
+                yield f"/api/books/{rnd.choice(ids)}/", None
+            else:
+                yield "/api/ai/books/advice/", {"prompt": f"books about {rnd.choice(TITLE_WORDS)}"}
+
+    def after(self, scenario, resp):
+        if scenario == "list":
+            self.next_url = resp.json().get("next") if resp.status_code == 200 else None
+        return resp.status_code
+
+    def run_scenario(self, scenario, client, rnd, ids, n, warmup, memory_samples):
+        self.next_url = None
+        gen = self.make_requests(scenario, rnd, ids)
+        patch = mock.patch("books.views.get_ai_advice", side_effect=lambda prompt: canned_advice(rnd))
+        with patch, override_settings(AI_RATE_PER_MINUTE=0):  # one client replaying AI requests is not abuse
+            for _ in range(warmup):
+                self.after(scenario, client.get(*next(gen)))
+
+            counter = QueryCounter()
+            samples, errors = [], 0
+            with connection.execute_wrapper(counter):
+                for _ in range(n):
+                    path, params = next(gen)
+                    t0 = time.perf_counter()
+                    resp = client.get(path, params)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                    errors += self.after(scenario, resp) != 200
+
+            peaks = []
+            for _ in range(memory_samples):
+                path, params = next(gen)
+                tracemalloc.start()
+                resp = client.get(path, params)
+                peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+                tracemalloc.stop()
+                self.after(scenario, resp)
+
+        return {
+            "requests": n,
+            "errors": errors,
+            "p50_ms": round(percentile(samples, 0.50), 3),
+            "p95_ms": round(percentile(samples, 0.95), 3),
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "queries_per_request": round(counter.count / n, 2),
+            "peak_kb_per_request": round(percentile(peaks, 0.50), 1) if peaks else None,
+        }
+
+    def handle(self, *args, requests, warmup, memory_samples, scenarios, seed, cache, output, **options):
+        if requests < 1:
+            raise CommandError("--requests must be >= 1.")
+        ids = list(Book.objects.filter(is_active=True).order_by("?").values_list("id", flat=True)[:5000])
+        if not ids:
+            raise CommandError("No active books; run `manage.py seed_books` first.")
+
+        results = {
+            "meta": {
+                "timestamp": timezone.now().isoformat(),
+                "rows": Book.objects.count(),
+                "vendor": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "seed": seed,
+                "result_cache": cache,
+            },
+            "scenarios": {},
+        }
+        rnd = random.Random(seed)
+        client = Client()
+        with override_settings(BOOKS_QUERY_CACHE_ALIAS="default" if cache else "", DEBUG=False):
+            for scenario in scenarios:
+                results["scenarios"][scenario] = self.run_scenario(
+                    scenario, client, rnd, ids, requests, warmup, memory_samples
+                )
+        results["meta"]["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        self.stdout.write(f"rows={results['meta']['rows']} vendor={connection.vendor} cache={'on' if cache else 'off'}")
+        self.stdout.write(f"{'scenario':>9} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'peak KB':>8} {'errors':>6}")
+        for name, r in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:>9} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['queries_per_request']:>8.2f} "
+                f"{r['peak_kb_per_request'] or 0:>8.1f} {r['errors']:>6}"
+            )
+        if output == "-":
+            json.dump(results, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        elif output:
+            with open(output, "w") as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
@@ -0,0 +1,136 @@
+import json
+import re
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from books.instrumentation import query_shape
+from books.models import Book
+
+SKIP_TABLES = {"sqlite_master", "sqlite_schema", "django_migrations"}
+_ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)\b')
+
+
+class Recorder:
+    """execute_wrapper keeping (label, sql, params) of every SELECT."""
+
+    def __init__(self):
+        self.label = ""
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            self.queries.append((self.label, sql, params))
+        return execute(sql, params, many, context)
+
+
+def sqlite_seq_scans(sql, params):
+    """Tables read by a plain SCAN (no index) in SQLite's query plan."""
+    with connection.cursor() as cur:
+        cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = [row[3] for row in cur.fetchall()]
+    aliases = dict((alias, table) for table, alias in _ALIAS_RE.findall(sql))  # subqueries plan as U0, T3...
+    scans = []
+    for line in plan:
+        words = line.split()
+        if words[:1] == ["SCAN"] and "INDEX" not in words and "VIRTUAL" not in words:
+            scans.append(aliases.get(words[1], words[1]))
+    return scans, plan
+
+
+def postgres_seq_scans(sql, params):
+    with connection.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+    scans, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") == "Seq Scan":
+            scans.append(node["Relation Name"])
+        stack.extend(node.get("Plans", []))
+    return scans, json.dumps(plan, indent=1).splitlines()
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the queries behind the book list/search/detail endpoints and AIAdviceView._match; "
+        "exit non-zero if any sequentially scans a table with at least --min-rows rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-rows", type=int, default=1000, help="Tolerate seq scans on smaller tables")
+        parser.add_argument("--show-plans", action="store_true")
+
+    def capture(self):
+        book = Book.objects.filter(is_active=True).order_by("-created_at", "-id").first()
+        if book is None:
+            raise CommandError("No active books to plan against; run `manage.py seed_books` first.")
+        word = (book.title.split() or ["book"])[-1]
+        recorder = Recorder()
+        client = Client()
+        requests = [
+            ("list", "/api/books/", None),
+            ("list next page", None, None),
+            ("search q", "/api/books/", {"q": word}),
+            ("titles filter", "/api/books/", {"titles": book.title}),
+            ("authors filter", "/api/books/", {"authors": book.author or word}),
+            ("location filter", "/api/books/", {"location": book.location}),
+            ("facets", "/api/books/facets/", None),
+            ("facets filtered", "/api/books/facets/", {"q": word, "location": book.location}),
+            ("detail", f"/api/books/{book.pk}/", None),
+            ("ai match", "/api/ai/books/advice/", {"prompt": f"books like {book.title}"}),
+            ("delta sync", "/api/books/changes/", {"updated_since": book.updated_at.isoformat()}),
+        ]
+        next_url = None
+        # the model reply is fixed; only the queries _match builds from it matter here
+        advice = mock.patch("books.views.get_ai_advice", return_value={
+            "topics": [word], "suggested_books": [{"title": book.title, "author": book.author}],
+        })
+        with override_settings(BOOKS_QUERY_CACHE_ALIAS=""), advice, connection.execute_wrapper(recorder):
+            for label, path, params in requests:
+                recorder.label = label
+                resp = client.get(path or next_url, params)
+                if resp.status_code != 200:
+                    raise CommandError(f"{label}: HTTP {resp.status_code}")
+                if label == "list":
+                    next_url = resp.json().get("next")
+        return recorder.queries
+
+    def handle(self, *args, min_rows, show_plans, **options):
+        vendor = connection.vendor
+        explain = {"sqlite": sqlite_seq_scans, "postgresql": postgres_seq_scans}.get(vendor)
+        if explain is None:
+            raise CommandError(f"EXPLAIN checks are not implemented for {vendor}.")
+
+        row_counts = {}
+
+        def rows(table):
+            if table not in row_counts:
+                with connection.cursor() as cur:
+                    cur.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+                    row_counts[table] = cur.fetchone()[0]
+            return row_counts[table]
+
+        seen, failures = set(), []
+        for label, sql, params in self.capture():
+            shape = query_shape(sql)
+            if shape in seen:
+                continue
+            seen.add(shape)
+            scans, plan = explain(sql, params)
+            bad = [t for t in scans if t not in SKIP_TABLES and rows(t) >= min_rows]
+            status = self.style.ERROR("SEQ SCAN " + ", ".join(bad)) if bad else self.style.SUCCESS("ok")
+            self.stdout.write(f"[{label}] {status}  {sql[:110]}...")
+            if show_plans or bad:
+                for line in plan:
+                    self.stdout.write(f"    {line}")
+            if bad:
+                failures.append(label)
+
+        if failures:
+            raise CommandError(f"Sequential scans above {min_rows} rows in: {', '.join(sorted(set(failures)))}")
+        self.stdout.write(self.style.SUCCESS(f"{len(seen)} query shape(s) checked, no sequential scans."))
@@ -0,0 +1,47 @@
+import json
+import os
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from books.imports import EXTENSIONS, BookImport, ImportRejected, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import book ads from a CSV or NDJSON file (books.imports), owned by --owner."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument("--owner", required=True, help="Username the ads are created for")
+        parser.add_argument("--format", choices=sorted(set(EXTENSIONS.values())), help="Default: from the extension")
+        parser.add_argument("--batch-size", type=int, help="Rows per bulk_create/transaction (BOOKS_IMPORT_BATCH_SIZE)")
+        parser.add_argument("--max-errors", type=int, default=100, help="Row errors to print (default 100)")
+
+    def handle(self, *args, path, owner, format, batch_size, max_errors, **options):
+        fmt = format or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError("Can't tell the format from the file name; pass --format.")
+        if batch_size is not None and batch_size < 1:
+            raise CommandError("--batch-size must be >= 1.")
+        try:
+            user = get_user_model().objects.get(username=owner)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {owner!r}.")
+
+        stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            result = BookImport(user, batch_size, max_errors).run(read_rows(stream, fmt))
+        except ImportRejected as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more")
+        if result.detail:
+            self.stderr.write(self.style.ERROR(f"Stopped: {result.detail}"))
+        self.stdout.write(self.style.SUCCESS(f"Created {result.created} book(s); {result.failed} row(s) failed."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from books.images import image_sizes, process_book_image
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Generate missing/stale image derivatives (backfill, or redo jobs lost on restart)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="Book ids (default: every book with an image)")
+
+    def handle(self, *args, ids=None, **options):
+        qs = Book.objects.exclude(image="").exclude(image__isnull=True)
+        if ids:
+            qs = qs.filter(pk__in=ids)
+        done = 0
+        for book in qs.only("id", "image", "image_variants").iterator(chunk_size=500):
+            variants = book.image_variants or {}
+            if variants.get("source") == book.image.name and all(k in variants for k in image_sizes()):
+                continue
+            process_book_image(book.pk)
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} image(s)."))
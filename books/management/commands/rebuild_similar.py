@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.similar import index_dir, rebuild
+
+
+class Command(BaseCommand):
+    help = "Vectorize every book into a new similarity index generation (books.similar) and switch to it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dim", type=int, help="Columns per book (default BOOKS_SIMILAR_DIM)")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched per query")
+
+    def handle(self, *args, dim, chunk_size, **options):
+        t0 = time.perf_counter()
+        meta = rebuild(dim=dim, chunk_size=chunk_size)
+        size = meta["capacity"] * meta["dim"] * 4 / 2**20
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {meta['rows']} book(s) ({meta['documents']} active) x {meta['dim']} in "
+            f"{time.perf_counter() - t0:.1f}s: {index_dir() / meta['generation']} ({size:.0f} MiB of vectors)"
+        ))
@@ -0,0 +1,127 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from books.models import Book
+from books.query_cache import invalidate
+
+LOCATIONS = [
+    "Tashkent", "Samarkand", "Bukhara", "Namangan", "Andijan", "Fergana", "Nukus", "Qarshi",
+    "Termez", "Jizzakh", "Navoiy", "Urgench", "Gulistan", "Kokand", "Chirchiq", "Margilan",
+]
+FIRST_NAMES = [
+    "Anna", "Boris", "Chingiz", "Dilnoza", "Elena", "Farrukh", "George", "Hamid", "Irina", "Jamshid",
+    "Karim", "Leo", "Madina", "Nodira", "Oleg", "Pavel", "Rustam", "Sevara", "Timur", "Umida",
+    "Victor", "Yulia", "Zafar", "Agatha", "Ernest", "Fyodor", "Jane", "Mark", "Virginia", "Isaac",
+]
+LAST_NAMES = [
+    "Abdullaev", "Bulgakov", "Christie", "Dostoevsky", "Eco", "Faulkner", "Gogol", "Hemingway",
+    "Ishiguro", "Joyce", "Karimov", "Lermontov", "Murakami", "Nabokov", "Orwell", "Pushkin",
+    "Qodiriy", "Rowling", "Salinger", "Tolstoy", "Umarov", "Vonnegut", "Woolf", "Yusupov", "Zweig",
+]
+TITLE_WORDS = [
+    "night", "garden", "river", "city", "war", "peace", "silence", "shadow", "road", "winter",
+    "summer", "house", "sea", "mountain", "letters", "dream", "stranger", "island", "fire", "stone",
+    "memory", "journey", "secret", "kingdom", "moon", "glass", "bridge", "forest", "storm", "archive",
+    "algorithms", "python", "physics", "history", "economics", "chemistry", "design", "language",
+    "grammar", "mathematics", "philosophy", "poetry", "silk", "desert", "caravan", "market", "clock",
+]
+TITLE_PATTERNS = ["The {a}", "{a} and {b}", "The {a} of the {b}", "A {a} in the {b}", "{a}", "Introduction to {a}"]
+CONDITIONS = ["like new", "good", "slightly worn", "with notes in the margins", "hardcover", "paperback"]
+SENTENCES = [
+    "Condition: {condition}.",
+    "Selling because I finished reading it.",
+    "Pickup in {location} city centre, or delivery for a small fee.",
+    "Great read about {a} and {b}.",
+    "Exchange possible for another book by {author}.",
+    "Some pages have pencil marks.",
+    "Edition from {year}.",
+    "Price is negotiable.",
+    "Perfect for students of {a}.",
+]
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let bulk_create keep the generated created_at/updated_at instead of stamping 'now'."""
+    fields = [Book._meta.get_field("created_at"), Book._meta.get_field("updated_at")]
+    saved = [(f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, (auto_now, auto_now_add) in zip(fields, saved):
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate synthetic Book rows (with owners) for local load and benchmark runs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000, help="Books to create (default 10000)")
+        parser.add_argument("--owners", type=int, default=100, help="Distinct seed users to spread books over")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk_create/transaction")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed, same data")
+        parser.add_argument("--days", type=int, default=365, help="Spread created_at over this many past days")
+        parser.add_argument("--inactive-ratio", type=float, default=0.05, help="Share of rows with is_active=False")
+
+    def owners(self, n):
+        User = get_user_model()
+        names = [f"seed_user_{i:05d}" for i in range(n)]
+        existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+        password = make_password(None)  # unusable; seed accounts cannot log in
+        User.objects.bulk_create(
+            [User(username=name, password=password, email=f"{name}@example.com") for name in names if name not in existing],
+            batch_size=1000,
+        )
+        return list(User.objects.filter(username__in=names).order_by("id").values_list("id", flat=True))
+
+    def book(self, rnd, owner_ids, now, days, inactive_ratio):
+        a, b = rnd.sample(TITLE_WORDS, 2)
+        author = f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+        location = rnd.choice(LOCATIONS)
+        context = {
+            "a": a, "b": b, "author": author, "location": location,
+            "condition": rnd.choice(CONDITIONS), "year": rnd.randint(1950, 2024),
+        }
+        description = " ".join(s.format(**context) for s in rnd.sample(SENTENCES, rnd.randint(2, 5)))
+        created = now - timedelta(seconds=rnd.randint(0, days * 86400))
+        return Book(
+            owner_id=rnd.choice(owner_ids),
+            title=rnd.choice(TITLE_PATTERNS).format(a=a.title(), b=b.title()),
+            author=author,
+            description=description,
+            phone_number=f"+998 9{rnd.randint(0, 9)} {rnd.randint(100, 999)} {rnd.randint(10, 99)} {rnd.randint(10, 99)}",
+            location=location,
+            is_active=rnd.random() >= inactive_ratio,
+            created_at=created,
+            updated_at=min(now, created + timedelta(seconds=rnd.randint(0, 7 * 86400))),
+        )
+
+    def handle(self, *args, count, owners, batch_size, seed, days, inactive_ratio, **options):
+        if count < 0 or owners < 1 or batch_size < 1:
+            raise CommandError("--count must be >= 0, --owners and --batch-size >= 1.")
+        rnd = random.Random(seed)
+        owner_ids = self.owners(owners)
+        now = timezone.now()
+        created = 0
+        with explicit_timestamps():
+            while created < count:
+                batch = [
+                    self.book(rnd, owner_ids, now, days, inactive_ratio)
+                    for _ in range(min(batch_size, count - created))
+                ]
+                with transaction.atomic():
+                    Book.objects.bulk_create(batch, batch_size=batch_size)
+                created += len(batch)
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"  {created}/{count}")
+        invalidate()  # bulk_create skips the signals that version the list cache
+        self.stdout.write(self.style.SUCCESS(f"Created {created} book(s) for {len(owner_ids)} owner(s)."))
@@ -0,0 +1,33 @@
+import books.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    books.search.create_search_index(schema_editor, apps.get_model("books", "Book"))
+
+
+def backwards(apps, schema_editor):
+    books.search.drop_search_index(schema_editor, apps.get_model("books", "Book"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_book_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchDocument',
+            fields=[
+                ('book', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='books.book')),
+                ('document', books.search.FTSDocumentField(db_column='books_book_fts')),
+            ],
+            options={
+                'db_table': 'books_book_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
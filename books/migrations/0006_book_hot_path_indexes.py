@@ -0,0 +1,49 @@
+# Generated by Django 5.0.7 on 2026-10-17 07:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Postgres only: trigram indexes serve icontains on title/author (admin search, the
+# icontains search backend). Matched as UPPER(col) LIKE UPPER(%s), hence the expression.
+TRGM_INDEXES = (("book_title_trgm_idx", "title"), ("book_author_trgm_idx", "author"))
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return  # SQLite answers these lookups from the FTS5 table (0003)
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON books_book USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _column in TRGM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='book_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_active', 'updated_at'], name='book_active_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['location'], name='book_location_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
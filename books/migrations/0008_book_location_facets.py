@@ -0,0 +1,55 @@
+# Generated by Django 5.0.7 on 2026-10-17 08:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # location_key for existing rows and the first facet counts; later writes keep both current
+    from books.facets import rebuild
+
+    rebuild(apps.get_model("books", "Book"), apps.get_model("books", "BookFacet"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_delta_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('location', 'Location'), ('author', 'Author')], max_length=16)),
+                ('key', models.CharField(max_length=300)),
+                ('label', models.CharField(help_text='One spelling of the key, for display', max_length=300)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='location_key',
+            field=models.CharField(blank=True, editable=False, help_text='canonical(location), see books.facets', max_length=300),
+        ),
+        migrations.AddIndex(
+            model_name='bookfacet',
+            index=models.Index(fields=['facet', '-count', 'key'], name='book_facet_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookfacet',
+            constraint=models.UniqueConstraint(fields=('facet', 'key'), name='book_facet_key_uniq'),
+        ),
+        # while book_location_idx still serves the per-location backfill
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_location_idx',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['location_key', '-created_at', '-id'], name='book_location_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-17 10:24
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_book_location_facets'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_active_created_idx',
+        ),
+    ]
@@ -1,6 +1,37 @@
 
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
+from django.utils import timezone
+
+from .search import FTS_TABLE, FTSDocumentField, canonical
+
+# what books.facets counts a Book under
+FACET_FIELDS = ("is_active", "location", "author")
+
+
+class BookQuerySet(models.QuerySet):
+    """Bulk writes skip save() and its signals; these two keep location_key, the facets and the similarity index right."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .facets import record_created
+        from .similar import schedule_refresh
+
+        objs = list(objs)
+        for book in objs:
+            book.location_key = canonical(book.location)
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            record_created(created)
+            schedule_refresh([book.pk for book in created if book.pk is not None])
+        return created
+
+    def update(self, **kwargs):
+        # facet counts can't follow a blind UPDATE: run books.facets.rebuild() after changing FACET_FIELDS
+        # (and rebuild_similar after changing title/author/description/is_active)
+        if isinstance(kwargs.get("location"), str):
+            kwargs["location_key"] = canonical(kwargs["location"])
+        return super().update(**kwargs)
+
 
 class Book(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="books")
@@ -8,14 +39,86 @@ class Book(models.Model):
     author = models.CharField(max_length=255, blank=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to="book_images/", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies, see books.images")
     phone_number = models.CharField(max_length=32, blank=True, help_text="OLX-style contact phone")
     is_active = models.BooleanField(default=True)
     location = models.CharField(max_length=300)
+    location_key = models.CharField(max_length=300, blank=True, editable=False, help_text="canonical(location), see books.facets")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # keyset pagination seeks on (created_at, id), see books.pagination; also the public list
+            # (is_active is ~all rows, checked per row; an (is_active, ...) prefix is useless to SQLite)
+            models.Index(fields=["-created_at", "-id"], name="book_created_id_idx"),
+            # list validators (max(updated_at), count) as an index-only scan
+            models.Index(fields=["is_active", "updated_at"], name="book_active_updated_idx"),
+            # ?location= on the list: one city's ads already in list order (is_active is ~all rows, checked per row;
+            # SQLite can't seek on the bare boolean Django emits, so it isn't a leading column here)
+            models.Index(fields=["location_key", "-created_at", "-id"], name="book_location_created_idx"),
+            # delta sync reads every row changed after (updated_at, id), see books.sync
+            models.Index(fields=["updated_at", "id"], name="book_updated_id_idx"),
+            # title/author lookups: FTS5 on SQLite, trigram GIN on Postgres (migration 0006)
+        ]
+
+    objects = BookQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.title} ({self.owner})"
+
+    def save(self, *args, **kwargs):
+        if "location" not in self.get_deferred_fields():
+            self.location_key = canonical(self.location)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "location" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "location_key"}
+        # one transaction from the facet snapshot (pre_save locks the row) to the counter update (post_save)
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class BookSearchDocument(models.Model):
+    """Row of the SQLite FTS5 index maintained by triggers (see books.search). Read-only."""
+    book = models.OneToOneField(
+        Book, primary_key=True, db_column="rowid", db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name="search_document",
+    )
+    document = FTSDocumentField(db_column=FTS_TABLE)
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+
+
+class BookFacet(models.Model):
+    """Active-book count per canonical location or author, kept current by books.facets."""
+    LOCATION = "location"
+    AUTHOR = "author"
+
+    facet = models.CharField(max_length=16, choices=[(LOCATION, "Location"), (AUTHOR, "Author")])
+    key = models.CharField(max_length=300)
+    label = models.CharField(max_length=300, help_text="One spelling of the key, for display")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["facet", "key"], name="book_facet_key_uniq")]
+        # top values per facet
+        indexes = [models.Index(fields=["facet", "-count", "key"], name="book_facet_top_idx")]
+
+    def __str__(self):
+        return f"{self.facet}={self.label}: {self.count}"
+
+
+class BookTombstone(models.Model):
+    """A deleted Book, kept for the delta sync feed (books.sync) until retention runs out."""
+    book_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["deleted_at", "id"], name="tombstone_deleted_id_idx")]
+
+    def __str__(self):
+        return f"Book {self.book_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
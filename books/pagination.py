@@ -0,0 +1,145 @@
+
+"""Keyset (seek) pagination.
+
+The cursor carries the ordering values of the boundary row, so page N is a
+`WHERE (created_at, id) < (...)` range read on the composite index instead of
+an OFFSET scan. Works with any ordering that ends in a unique column, which
+covers both `Book.Meta.ordering` and the relevance ordering of books.search.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, List, Optional
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request) -> int:
+        raw = request.query_params.get(self.page_size_query_param)
+        try:
+            size = int(raw) if raw else self.page_size
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def get_ordering(queryset) -> List[str]:
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not ordering or ordering[-1].lstrip("-") not in ("id", "pk"):
+            ordering.append("-id")
+        return ordering
+
+    def decode_cursor(self, request) -> Optional[dict]:
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(raw.encode("ascii")))
+        except (binascii.Error, ValueError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(data, dict) or len(data.get("v") or []) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return data
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        # rows are model instances, or dicts when the view paginates a .values() queryset
+        get = row.get if isinstance(row, dict) else lambda name: getattr(row, name)
+        values = [_encode_value(get(f.lstrip("-"))) for f in self.ordering]
+        payload = {"v": values, "r": 1} if reverse else {"v": values}
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return replace_query_param(self.base_url, self.cursor_query_param, base64.urlsafe_b64encode(raw).decode("ascii"))
+
+    def seek(self, queryset, values, reverse: bool):
+        """Rows strictly after `values` in (possibly reversed) ordering order."""
+        cond = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != reverse
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for prev, value in zip(self.ordering[:i], values[:i]):
+                step &= Q(**{prev.lstrip("-"): value})
+            cond |= step
+        # redundant bound on the leading column lets the planner seek instead of scanning
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") != reverse else "gte"
+        return queryset.filter(Q(**{f"{first.lstrip('-')}__{bound}": values[0]}), cond)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor.get("r"))
+
+        if reverse:
+            flipped = [f[1:] if f.startswith("-") else f"-{f}" for f in self.ordering]
+            queryset = queryset.order_by(*flipped)
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = self.seek(queryset, cursor["v"], reverse)
+
+        rows = list(queryset[: size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+
+        self.next_url = self.previous_url = None
+        if rows:
+            if has_more or reverse:
+                self.next_url = self.encode_cursor(rows[-1], reverse=False)
+            if cursor and (has_more or not reverse):
+                self.previous_url = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.next_url),
+            ("previous", self.previous_url),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param, "required": False, "in": "query",
+                "description": "Opaque cursor from `next`/`previous`.", "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param, "required": False, "in": "query",
+                "description": f"Results per page (max {self.max_page_size}).", "schema": {"type": "integer"},
+            },
+        ]
@@ -0,0 +1,125 @@
+
+"""Result cache for the public book list/search pages.
+
+Entries hold a serialized page plus its HTTP validators, keyed on the
+normalized filter set, cursor and page size. Every key embeds a generation
+number; any Book write, and any owner rename, bumps it (after commit, see
+books.signals), so old pages stop being looked up and expire.
+
+That holds only where every worker reads the same generation, i.e. a shared
+backend. The backend is a Django cache alias (`BOOKS_QUERY_CACHE_ALIAS`):
+the Redis default cache when `REDIS_URL` is set, otherwise none (the cache is
+off). Pointing it at a per-process cache (locmem) is allowed, but a write seen
+by one worker does not reach the others, which keep serving their pages for
+up to `BOOKS_QUERY_CACHE_TTL` seconds.
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .search import canonical
+
+GENERATION_KEY = "books:qc:generation"
+# params whose values are order- and case-insensitive filters
+LIST_PARAMS = ("titles", "authors")
+TEXT_PARAMS = ("q",)
+# params matched on their canonical() form
+KEY_PARAMS = ("location",)
+
+
+def normalize_params(query_params) -> Dict[str, list]:
+    out = {}
+    for key in sorted(query_params.keys()):
+        values = [v.strip() for v in query_params.getlist(key) if v and v.strip()]
+        if key in LIST_PARAMS:
+            values = sorted({p.strip().casefold() for v in values for p in v.split(",") if p.strip()})
+        elif key in TEXT_PARAMS:
+            values = [" ".join(v.casefold().split()) for v in values]
+        elif key in KEY_PARAMS:
+            values = sorted({canonical(v) for v in values} - {""})
+        if values:
+            out[key] = values
+    return out
+
+
+class QueryCache:
+    def __init__(self, alias: str = "default", ttl: int = 300):
+        self.alias = alias
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def generation(self) -> int:
+        gen = self.cache.get(GENERATION_KEY)
+        if gen is None:
+            # never restart from a number older entries may still use
+            self.cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+            gen = self.cache.get(GENERATION_KEY)
+        return gen
+
+    def bump(self) -> None:
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            self.cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        self._count("invalidations")
+
+    def key_for(self, request) -> str:
+        ident = {
+            "path": request.path,
+            "params": normalize_params(request.query_params),
+            "host": request.get_host(),
+            "accept": request.META.get("HTTP_ACCEPT", ""),
+        }
+        digest = hashlib.sha1(json.dumps(ident, sort_keys=True).encode()).hexdigest()
+        return f"books:qc:{self.generation()}:{digest}"
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self.cache.get(key)
+        self._count("hits" if entry is not None else "misses")
+        return entry
+
+    def set(self, key: str, entry: dict) -> None:
+        self.cache.set(key, entry, self.ttl)
+        self._count("stores")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_query_cache: Optional[QueryCache] = None
+
+
+def get_query_cache() -> Optional[QueryCache]:
+    """Process-wide cache, or None when `BOOKS_QUERY_CACHE_ALIAS` is empty."""
+    global _query_cache
+    alias = getattr(settings, "BOOKS_QUERY_CACHE_ALIAS", "default")
+    if not alias:
+        return None
+    if _query_cache is None or _query_cache.alias != alias:
+        _query_cache = QueryCache(alias=alias, ttl=getattr(settings, "BOOKS_QUERY_CACHE_TTL", 300))
+    return _query_cache
+
+
+def invalidate() -> None:
+    """Drop every cached page. Call after writes that skip model signals (bulk_create, update())."""
+    cache = get_query_cache()
+    if cache is not None:
+        cache.bump()
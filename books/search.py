@@ -0,0 +1,394 @@
+
+"""Full-text search backends for Book.
+
+`get_search_backend()` picks an implementation from `BOOKS_SEARCH_BACKEND`
+(dotted path) or, when unset, from the database vendor:
+
+- SQLite: FTS5 external-content table `books_book_fts`, kept in sync by triggers.
+- Postgres: GIN index over a weighted `tsvector` expression (no extra column).
+- Anything else: the old `icontains` filters.
+
+A query is a list of *groups*; a group is a list of `(field, term)` pairs where
+`field` is "title", "author" or None (any column). Pairs inside a group are
+OR-ed, groups are AND-ed. Matching rows get a `search_rank` annotation (higher
+is better) and are ordered by it. `match_many` ranks several term lists in one
+query (batch AI advice).
+"""
+import re
+import unicodedata
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Lookup, Q, QuerySet, TextField, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+Term = Tuple[Optional[str], str]
+Group = Sequence[Term]
+
+FTS_TABLE = "books_book_fts"
+SEARCH_FIELDS = ("title", "author", "description")
+RANK_ORDERING = ("-search_rank", "-created_at", "-id")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# apostrophe look-alikes inside words (Uzbek o‘/gʻ, O'zbekiston): dropped, not word breaks
+_APOSTROPHE_RE = re.compile("['`\u2018\u2019\u02bb\u02bc]")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(text or "")]
+
+
+def canonical(text: str) -> str:
+    """Exact-match key: case, accents, punctuation and spacing folded, as the FTS5 tokenizer does.
+
+    "  São Paulo,  BR" and "sao paulo br" both give "sao paulo br"; "Farg‘ona" and "Fargʻona", "fargona".
+    """
+    text = text or ""
+    if not text.isascii():  # a no-op on ASCII, and most of the time spent here
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(tokenize(_APOSTROPHE_RE.sub("", text)))
+
+
+def bounded_terms(terms: Iterable[Term], limit: int, max_tokens: int = 6) -> List[Term]:
+    """Drop empty and duplicate terms (same field and tokens), cap tokens per term and terms overall."""
+    out: List[Term] = []
+    seen = set()
+    for field, text in terms:
+        tokens = tokenize(text)
+        key = (field, tuple(tokens[:max_tokens]))
+        if not tokens or key in seen:
+            continue
+        seen.add(key)
+        out.append((field, text.strip() if len(tokens) <= max_tokens else " ".join(key[1])))
+        if len(out) >= limit:
+            break
+    return out
+
+
+def _own_columns_where(qs: QuerySet) -> Optional[Tuple[str, list]]:
+    """WHERE clause of `qs` for hand-written SQL over its own table; None if it needs joins."""
+    query = qs.query
+    if len(query.alias_map) > 1 or query.is_sliced or query.distinct:
+        return None
+    compiler = query.get_compiler(connection=connection)
+    sql, params = compiler.compile(query.where)
+    return sql or "1 = 1", list(params)
+
+
+class FTSDocumentField(TextField):
+    """The hidden FTS5 column named after its table; only supports `__match`."""
+
+
+@FTSDocumentField.register_lookup
+class FTS5Match(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class BaseSearchBackend:
+    def search(self, qs: QuerySet, q: str = "", titles: Sequence[str] = (), authors: Sequence[str] = ()) -> QuerySet:
+        """List/search filters: `q` over all columns AND any title AND any author."""
+        groups: List[List[Term]] = []
+        if q:
+            groups.append([(None, q)])
+        if titles:
+            groups.append([("title", t) for t in titles])
+        if authors:
+            groups.append([("author", a) for a in authors])
+        return self.filter(qs, groups)
+
+    def match_any(self, qs: QuerySet, terms: Sequence[Term]) -> QuerySet:
+        """Rows hitting at least one term, best matches first."""
+        return self.filter(qs, [terms] if terms else [])
+
+    def match_many(self, qs: QuerySet, term_lists: Sequence[Sequence[Term]], limit: int) -> List[List[int]]:
+        """Ids of the best `limit` rows of `qs` per term list, as match_any would order them.
+
+        This is one query per list; backends override it with a single query for all of them.
+        Empty term lists get no ids.
+        """
+        return [
+            list(self.match_any(qs, terms).values_list("id", flat=True)[:limit]) if terms else []
+            for terms in term_lists
+        ]
+
+    def filter(self, qs: QuerySet, groups: Sequence[Group]) -> QuerySet:
+        raise NotImplementedError
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """Portable fallback: substring match, ranked by the number of terms hit."""
+
+    def _term_q(self, field: Optional[str], term: str) -> Q:
+        fields = [field] if field else SEARCH_FIELDS
+        cond = Q()
+        for f in fields:
+            cond |= Q(**{f"{f}__icontains": term})
+        return cond
+
+    def filter(self, qs, groups):
+        if not groups:
+            return qs
+        cond = Q()
+        hits = []
+        for group in groups:
+            g_q = Q()
+            for field, term in group:
+                term = term.strip()
+                if term:
+                    t_q = self._term_q(field, term)
+                    g_q |= t_q
+                    hits.append(Case(When(t_q, then=Value(1)), default=Value(0), output_field=IntegerField()))
+            if not g_q:
+                return qs.none()
+            cond &= g_q
+        rank = sum(hits[1:], hits[0])
+        return qs.filter(cond).annotate(search_rank=Cast(rank, FloatField())).order_by(*RANK_ORDERING)
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    # bm25 column weights for title, author, description
+    WEIGHTS = (10.0, 5.0, 1.0)
+    # SQLite's default SQLITE_MAX_COMPOUND_SELECT
+    MAX_COMPOUND = 500
+
+    @staticmethod
+    def _term_expr(field: Optional[str], term: str) -> str:
+        tokens = tokenize(term)
+        if not tokens:
+            return ""
+        expr = " AND ".join('"%s"*' % t.replace('"', '""') for t in tokens)
+        return f"{field} : ({expr})" if field else f"({expr})"
+
+    def to_match(self, groups: Sequence[Group]) -> str:
+        parts = []
+        for group in groups:
+            terms = [e for e in (self._term_expr(f, t) for f, t in group) if e]
+            if not terms:
+                return ""
+            parts.append("(" + " OR ".join(terms) + ")")
+        return " AND ".join(parts)
+
+    def filter(self, qs, groups):
+        if not groups:
+            return qs
+        match = self.to_match(groups)
+        if not match:
+            return qs.none()
+        weights = ", ".join(str(w) for w in self.WEIGHTS)
+        # joined through BookSearchDocument, so bm25() sees the matching FTS row
+        rank = RawSQL(f'-bm25("{FTS_TABLE}", {weights})', [], output_field=FloatField())
+        return (
+            qs.filter(search_document__document__match=match)
+            .annotate(search_rank=rank)
+            .order_by(*RANK_ORDERING)
+        )
+
+    def match_many(self, qs, term_lists, limit):
+        try:
+            where = _own_columns_where(qs)
+        except EmptyResultSet:
+            return [[] for _ in term_lists]
+        if where is None:
+            return super().match_many(qs, term_lists, limit)
+        items = [(i, m) for i, m in enumerate(self.to_match([terms]) if terms else "" for terms in term_lists) if m]
+        out: List[List[int]] = [[] for _ in term_lists]
+        if not items:
+            return out
+        table = connection.ops.quote_name(qs.model._meta.db_table)
+        weights = ", ".join(str(w) for w in self.WEIGHTS)
+        where_sql, where_params = where
+        # SQLite has no LATERAL: one top-`limit` branch per list, glued with UNION ALL. A window
+        # function over all hits would have to sort every match instead of keeping the best few.
+        branch = (
+            f"SELECT * FROM (SELECT %s AS item, {table}.id AS id, bm25({FTS_TABLE}, {weights}) AS rank, "
+            f"{table}.created_at AS created_at FROM {FTS_TABLE} JOIN {table} ON {table}.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND {where_sql} "
+            f"ORDER BY rank, {table}.created_at DESC, {table}.id DESC LIMIT %s)"
+        )
+        with connection.cursor() as cur:
+            for start in range(0, len(items), self.MAX_COMPOUND):
+                chunk = items[start:start + self.MAX_COMPOUND]
+                sql = " UNION ALL ".join([branch] * len(chunk)) + " ORDER BY item, rank, created_at DESC, id DESC"
+                cur.execute(sql, [p for item, match in chunk for p in (item, match, *where_params, limit)])
+                for item, pk, _, _ in cur.fetchall():
+                    out[item].append(pk)
+        return out
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    # tsvector weight labels per column; None (any column) matches every label
+    LABELS = {"title": "A", "author": "B", "description": "C"}
+
+    @staticmethod
+    def vector():
+        from django.contrib.postgres.search import SearchVector
+
+        return (
+            SearchVector("title", weight="A", config="simple")
+            + SearchVector("author", weight="B", config="simple")
+            + SearchVector("description", weight="C", config="simple")
+        )
+
+    def _term_expr(self, field: Optional[str], term: str) -> str:
+        label = self.LABELS.get(field, "") if field else ""
+        tokens = tokenize(term)
+        if not tokens:
+            return ""
+        return "(" + " & ".join(f"'{t}':*{label}" for t in tokens) + ")"
+
+    def to_tsquery(self, groups: Sequence[Group]) -> str:
+        parts = []
+        for group in groups:
+            terms = [e for e in (self._term_expr(f, t) for f, t in group) if e]
+            if not terms:
+                return ""
+            parts.append("(" + " | ".join(terms) + ")")
+        return " & ".join(parts)
+
+    def filter(self, qs, groups):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        if not groups:
+            return qs
+        raw = self.to_tsquery(groups)
+        if not raw:
+            return qs.none()
+        query = SearchQuery(raw, search_type="raw", config="simple")
+        vector = self.vector()
+        return (
+            qs.alias(search_vector=vector)
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(vector, query))
+            .order_by(*RANK_ORDERING)
+        )
+
+    def match_many(self, qs, term_lists, limit):
+        from django.db.models.sql import Query
+
+        try:
+            where = _own_columns_where(qs)
+        except EmptyResultSet:
+            return [[] for _ in term_lists]
+        if where is None:
+            return super().match_many(qs, term_lists, limit)
+        items = [(i, t) for i, t in enumerate(self.to_tsquery([terms]) if terms else "" for terms in term_lists) if t]
+        out: List[List[int]] = [[] for _ in term_lists]
+        if not items:
+            return out
+        table = connection.ops.quote_name(qs.model._meta.db_table)
+        # the same expression as the GIN index, or the planner can't use it
+        query = Query(qs.model)
+        vector_sql, vector_params = self.vector().resolve_expression(query).as_sql(
+            query.get_compiler(connection=connection), connection
+        )
+        where_sql, where_params = where
+        tsquery = "to_tsquery('simple'::regconfig, q.expr)"
+        # one LATERAL top-`limit` index probe per list
+        sql = (
+            f"SELECT q.item, m.id FROM (VALUES {', '.join(['(%s, %s)'] * len(items))}) AS q(item, expr) "
+            "CROSS JOIN LATERAL ("
+            f"SELECT {table}.id, ts_rank({vector_sql}, {tsquery}) AS rank, {table}.created_at FROM {table} "
+            f"WHERE {where_sql} AND {vector_sql} @@ {tsquery} "
+            f"ORDER BY 2 DESC, {table}.created_at DESC, {table}.id DESC LIMIT %s"
+            ") AS m ORDER BY q.item, m.rank DESC, m.created_at DESC, m.id DESC"
+        )
+        params = [p for item in items for p in item] + vector_params + where_params + vector_params + [limit]
+        with connection.cursor() as cur:
+            cur.execute(sql, params)
+            for item, pk in cur.fetchall():
+                out[item].append(pk)
+        return out
+
+
+def fts5_table_exists(conn=connection) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cur.fetchone() is not None
+
+
+_backend: Optional[BaseSearchBackend] = None
+
+
+def get_search_backend() -> BaseSearchBackend:
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "BOOKS_SEARCH_BACKEND", "")
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == "postgresql":
+            _backend = PostgresSearchBackend()
+        elif connection.vendor == "sqlite" and fts5_table_exists():
+            _backend = SQLiteFTS5SearchBackend()
+        else:
+            _backend = IContainsSearchBackend()
+    return _backend
+
+
+# ---- index maintenance (called from migrations and post_migrate) ----
+
+_SQLITE_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS books_book_fts_ai AFTER INSERT ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_book_fts_ad AFTER DELETE ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_book_fts_au AFTER UPDATE OF title, author, description ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+)
+
+
+def install_sqlite_triggers(conn) -> None:
+    """Idempotent. SQLite drops triggers whenever a migration rebuilds books_book."""
+    if not fts5_table_exists(conn):
+        return
+    with conn.cursor() as cur:
+        for sql in _SQLITE_TRIGGERS:
+            cur.execute(sql)
+
+
+def create_search_index(schema_editor, book_model) -> None:
+    conn = schema_editor.connection
+    if conn.vendor == "sqlite":
+        from django.db import OperationalError
+
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "title, author, description, content='books_book', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+        except OperationalError:
+            return  # SQLite built without FTS5: IContainsSearchBackend is used
+        install_sqlite_triggers(conn)
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif conn.vendor == "postgresql":
+        from django.contrib.postgres.indexes import GinIndex
+
+        schema_editor.add_index(book_model, GinIndex(PostgresSearchBackend.vector(), name="book_search_gin"))
+
+
+def drop_search_index(schema_editor, book_model) -> None:
+    conn = schema_editor.connection
+    if conn.vendor == "sqlite":
+        for name in ("books_book_fts_ai", "books_book_fts_ad", "books_book_fts_au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif conn.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS book_search_gin")
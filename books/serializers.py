@@ -1,20 +1,40 @@
 
+from typing import Iterable, List, Optional
+
+from django.db import models
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
+from .instrumentation import timed
 from .models import Book
+from .uploads import StoredUpload
+
+
+class StreamedImageField(serializers.ImageField):
+    """ImageField that takes a StoredUpload (validated and stored while streaming) as its file name."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, StoredUpload):
+            return data.stored_name
+        return super().to_internal_value(data)
+
 
 class BookSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {**serializers.ModelSerializer.serializer_field_mapping, models.ImageField: StreamedImageField}
     owner_username = serializers.ReadOnlyField(source="owner.username")
     image_url = serializers.SerializerMethodField(help_text="Absolute URL to the uploaded image")
+    image_variants = serializers.SerializerMethodField(
+        help_text="Resized copies per size: {size: {webp, jpeg, width, height}}; empty until processed"
+    )
     
 
     class Meta:
         model = Book
         fields = [
-            "id","title","author","description","image","image_url",
+            "id","title","author","description","image","image_url","image_variants",
             "phone_number","location","is_active","created_at","updated_at",
             "owner","owner_username"
         ]
-        read_only_fields = ["id","created_at","updated_at","owner","owner_username","image_url"]
+        read_only_fields = ["id","created_at","updated_at","owner","owner_username","image_url","image_variants"]
         extra_kwargs = {
             "location": {"help_text": "City/area for the ad.", "required": True},  # <- client must send it
         }
@@ -29,12 +49,122 @@ class BookSerializer(serializers.ModelSerializer):
 }
 
 
+    def to_representation(self, instance):
+        with timed("serialize"):
+            return super().to_representation(instance)
+
     def get_image_url(self, obj):
         request = self.context.get("request")
         if obj.image and request:
             return request.build_absolute_uri(obj.image.url)
         return None
 
+    def get_image_variants(self, obj):
+        request = self.context.get("request")
+        storage = obj.image.storage
+        out = {}
+        for size, entry in (obj.image_variants or {}).items():
+            if not isinstance(entry, dict):
+                continue
+            item = {"width": entry.get("width"), "height": entry.get("height")}
+            for fmt in ("webp", "jpeg"):
+                url = storage.url(entry[fmt]) if entry.get(fmt) else None
+                item[fmt] = request.build_absolute_uri(url) if url and request else url
+            out[size] = item
+        return out
+
+class BookImportSerializer(serializers.ModelSerializer):
+    """One row of a bulk import (books.imports): BookSerializer's writable fields, minus the image."""
+
+    class Meta:
+        model = Book
+        fields = ["title", "author", "description", "phone_number", "location", "is_active"]
+
+
+class MediaURLs:
+    """`storage.url(name)` (made absolute for `request`) for many names at the cost of one call.
+
+    Works when the storage's URLs are a fixed base plus the quoted name
+    (FileSystemStorage, S3 without signed URLs); otherwise falls back to
+    asking the storage for every name.
+    """
+    PROBE = "bookx-probe.jpg"
+
+    def __init__(self, storage, request=None):
+        self.storage = storage
+        self.request = request
+        url = storage.url(self.PROBE)
+        self.base = url[: -len(self.PROBE)] if url.endswith(self.PROBE) and "?" not in url else None
+        if self.base is not None and request is not None:
+            self.base = request.build_absolute_uri(self.base)
+
+    def url(self, name: str) -> Optional[str]:
+        if not name:
+            return None
+        if self.base is not None:
+            return self.base + filepath_to_uri(name).lstrip("/")
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+
+class BookReadSerializer:
+    """Read-only fast path with BookSerializer's exact output, for list/search/AI results.
+
+    Selects only the serialized columns with `.values()` (owner username via
+    the join, no model instances) and builds each dict directly; media URLs
+    come from one `MediaURLs` per response. Writes and detail keep using
+    BookSerializer.
+    """
+    COLUMNS = (
+        "id", "title", "author", "description", "image", "image_variants", "phone_number",
+        "location", "is_active", "created_at", "updated_at", "owner_id", "owner__username",
+    )
+
+    def __init__(self, request=None):
+        self.request = request
+        self.media = MediaURLs(Book._meta.get_field("image").storage, request)
+        self.datetime = serializers.DateTimeField()
+
+    def rows(self, queryset):
+        """`queryset` as dict rows; selected annotations (e.g. search_rank) stay available to the paginator."""
+        return queryset.values(*self.COLUMNS, *queryset.query.annotation_select)
+
+    def variants(self, variants: dict) -> dict:
+        out = {}
+        for size, entry in (variants or {}).items():
+            if not isinstance(entry, dict):
+                continue
+            item = {"width": entry.get("width"), "height": entry.get("height")}
+            for fmt in ("webp", "jpeg"):
+                item[fmt] = self.media.url(entry.get(fmt))
+            out[size] = item
+        return out
+
+    def to_representation(self, row: dict) -> dict:
+        image = self.media.url(row["image"])
+        to_datetime = self.datetime.to_representation
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "author": row["author"],
+            "description": row["description"],
+            "image": image,
+            "image_url": image if self.request is not None else None,
+            "image_variants": self.variants(row["image_variants"]),
+            "phone_number": row["phone_number"],
+            "location": row["location"],
+            "is_active": row["is_active"],
+            "created_at": to_datetime(row["created_at"]),
+            "updated_at": to_datetime(row["updated_at"]),
+            "owner": row["owner_id"],
+            "owner_username": row["owner__username"],
+        }
+
+    def many(self, rows: Iterable[dict]) -> List[dict]:
+        with timed("serialize"):
+            return [self.to_representation(row) for row in rows]
+
+
 # ---- AI schemas for Swagger ----
 class SuggestedBookSerializer(serializers.Serializer):
     title = serializers.CharField()
@@ -0,0 +1,116 @@
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import forget_principal
+from .facets import locked_state, record_delete, record_save
+from .feed import publish_on_commit
+from .images import delete_files, process_book_image, variant_files
+from .models import FACET_FIELDS, Book, BookTombstone
+from .query_cache import invalidate
+from .similar import schedule_refresh
+from .sync import schedule_prune
+from .tasks import enqueue
+
+
+@receiver(post_save, sender=Book, dispatch_uid="books.queue_image_pipeline")
+def queue_image_pipeline(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    variants = instance.image_variants or {}
+    if (instance.image and variants.get("source") != instance.image.name) or (not instance.image and variants):
+        enqueue(process_book_image, instance.pk)
+
+
+@receiver(post_delete, sender=Book, dispatch_uid="books.delete_image_variants")
+def delete_image_variants(sender, instance, **kwargs):
+    names = variant_files(instance.image_variants)
+    if names:
+        enqueue(delete_files, names)
+
+
+@receiver(post_save, sender=Book, dispatch_uid="books.invalidate_query_cache_save")
+@receiver(post_delete, sender=Book, dispatch_uid="books.invalidate_query_cache_delete")
+def invalidate_query_cache(sender, **kwargs):
+    # after commit: bumping earlier would let a reader re-cache the pre-write rows under the new generation
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=Book, dispatch_uid="books.record_tombstone")
+def record_tombstone(sender, instance, **kwargs):
+    # same transaction as the delete, so the delta feed never misses or invents one
+    BookTombstone.objects.create(book_id=instance.pk)
+    schedule_prune()
+
+
+@receiver(post_save, sender=Book, dispatch_uid="books.feed_publish_save")
+def feed_publish_save(sender, instance, created, raw=False, **kwargs):
+    if raw or (created and not instance.is_active):
+        return
+    kind = "created" if created else ("updated" if instance.is_active else "deactivated")
+    publish_on_commit(kind, instance)
+
+
+@receiver(post_delete, sender=Book, dispatch_uid="books.feed_publish_delete")
+def feed_publish_delete(sender, instance, **kwargs):
+    publish_on_commit("deleted", instance)
+
+
+@receiver(pre_save, sender=Book, dispatch_uid="books.facets_snapshot")
+def facets_snapshot(sender, instance, raw=False, update_fields=None, **kwargs):
+    # the counted state is the stored row, locked until Book.save() commits, not what the instance was loaded with
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not update_fields & set(FACET_FIELDS):
+        return
+    instance._facet_state = locked_state(instance.pk)
+
+
+@receiver(pre_delete, sender=Book, dispatch_uid="books.facets_delete_snapshot")
+def facets_delete_snapshot(sender, instance, **kwargs):
+    instance._facet_state = locked_state(instance.pk)  # inside the deletion's transaction
+
+
+@receiver(post_save, sender=Book, dispatch_uid="books.facets_save")
+def facets_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return  # loaddata: run books.facets.rebuild() afterwards
+    record_save(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Book, dispatch_uid="books.facets_delete")
+def facets_delete(sender, instance, **kwargs):
+    record_delete(instance)
+
+
+@receiver(post_save, sender=Book, dispatch_uid="books.similar_save")
+def similar_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return  # loaddata: run rebuild_similar afterwards
+    if update_fields is not None and not update_fields & {"title", "author", "description", "is_active"}:
+        return  # e.g. the image pipeline writing image_variants
+    schedule_refresh([instance.pk])
+
+
+@receiver(post_delete, sender=Book, dispatch_uid="books.similar_delete")
+def similar_delete(sender, instance, **kwargs):
+    schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="books.invalidate_query_cache_user")
+def invalidate_query_cache_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # cached list pages carry owner_username; a new user owns no books yet, a login only touches last_login
+    if raw or created or (update_fields is not None and "username" not in update_fields):
+        return
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="books.forget_principal_save")
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid="books.forget_principal_delete")
+def forget_cached_principal(sender, instance, **kwargs):
+    # deactivation, password change, rename: the next request reloads the row (after commit, as for the list cache)
+    user_id = getattr(instance, jwt_settings.USER_ID_FIELD)
+    transaction.on_commit(lambda: forget_principal(user_id))
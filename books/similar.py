@@ -0,0 +1,489 @@
+
+""""More like this": Books ranked by cosine similarity of hashed TF-IDF vectors.
+
+Each Book is a vector of `BOOKS_SIMILAR_DIM` (128) float32s, L2-normalized,
+so cosine similarity is one dot product:
+
+    tokens   books.search.canonical() words of the title (x3), author (x2) and
+             description (x1), plus the whole author name as one token
+    weight   field weight x (1 + log tf) x idf; document frequencies are counted
+             per hashed token when the index is rebuilt
+    column   blake2b(token) picks one of the columns and a sign (feature hashing)
+
+The index lives on local disk in `BOOKS_SIMILAR_DIR` (by default
+~/.cache/bookx/similar, outside the source tree): a generation directory
+holding `vectors.f32` (rows x dim), `ids.i64` (book id per row, ascending) and
+`idf.f32`, plus `meta.json` naming the generation and its row count. Every
+process memory-maps the same files, so the page cache holds one copy and a new
+worker is ready as soon as it maps them. Inactive and deleted books keep a zero
+row, which never scores.
+
+The index is per host: nothing ships it between machines. It is built once
+by `python manage.py rebuild_similar`, which writes a new generation and
+switches meta.json to it. Until then /api/books/{id}/similar/ answers 503
+with `Retry-After` and AI matching stays on the search backend. With
+`BOOKS_SIMILAR_AUTO_BUILD=1` (off by default) a web worker that starts
+without an index, or a request that needs one, builds it in a background
+thread instead, one builder per host under a file lock.
+
+Once an index exists, Book saves, deletes and bulk_create() rewrite their rows
+off the request path (books.tasks, under a file lock); readers pick up a new
+meta.json on their next query. IDF only moves on a rebuild.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .search import RANK_ORDERING, Term, canonical, get_search_backend
+
+logger = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "description": 1.0}
+MAX_TEXT = 4000  # characters of a field that are vectorized
+IDF_SLOTS = 1 << 20  # document-frequency counters, one per hashed token
+BLOCK_ROWS = 1 << 16  # rows scored per matrix product
+GROW_ROWS = 4096
+
+Hit = Tuple[int, float]
+
+
+class IndexUnavailable(APIException):
+    """No similarity index on this host yet; `wait` becomes Retry-After."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Similar books are not available yet: this server has no similarity index."
+    default_code = "similar_index_unavailable"
+    wait = 30
+
+
+@lru_cache(maxsize=1 << 16)
+def _slots(token: str, dim: int) -> Tuple[int, float, int]:
+    """(column, sign, idf slot) of `token`: stable across processes, unlike hash()."""
+    h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, 1.0 if h >> 63 else -1.0, (h >> 32) % IDF_SLOTS
+
+
+def features(title: str = "", author: str = "", description: str = "") -> Dict[str, float]:
+    """Token -> field weight x (1 + log tf), summed over the fields."""
+    out: Dict[str, float] = {}
+    name = canonical((author or "")[:MAX_TEXT])
+    for field, text in (("title", canonical((title or "")[:MAX_TEXT])), ("author", name),
+                        ("description", canonical((description or "")[:MAX_TEXT]))):
+        for token, n in Counter(text.split()).items():
+            out[token] = out.get(token, 0.0) + FIELD_WEIGHTS[field] * (1.0 + math.log(n))
+    if name:
+        out["author:" + name] = out.get("author:" + name, 0.0) + FIELD_WEIGHTS["author"]
+    return out
+
+
+def vectorize(feats: Dict[str, float], idf: np.ndarray, dim: int) -> np.ndarray:
+    if not feats:
+        return np.zeros(dim, np.float32)
+    columns, signs, slots = zip(*(_slots(token, dim) for token in feats))
+    weights = np.fromiter(feats.values(), np.float64, len(feats)) * signs * idf[list(slots)]
+    vec = np.bincount(columns, weights=weights, minlength=dim)
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm else vec).astype(np.float32)
+
+
+def index_dir() -> Path:
+    default = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "bookx" / "similar"
+    return Path(getattr(settings, "BOOKS_SIMILAR_DIR", "") or default)
+
+
+@contextmanager
+def _building(base: Path, wait: bool = True):
+    """Lock held for a whole rebuild, one per host; yields False if `wait` is off and someone else holds it."""
+    base.mkdir(parents=True, exist_ok=True)
+    with open(base / ".build", "a") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _locked(base: Path):
+    """Exclusive lock on the index directory across processes (rebuild and refresh write under it)."""
+    base.mkdir(parents=True, exist_ok=True)
+    with open(base / ".lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _read_meta(base: Path) -> Optional[dict]:
+    try:
+        return json.loads((base / "meta.json").read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(base: Path, meta: dict) -> None:
+    tmp = base / f"meta.json.{os.getpid()}"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, base / "meta.json")  # readers see the old file or the new one, never half of one
+
+
+def _map(base: Path, meta: dict, mode: str = "r"):
+    gen = base / meta["generation"]
+    vectors = np.memmap(gen / "vectors.f32", np.float32, mode, shape=(meta["capacity"], meta["dim"]))
+    ids = np.memmap(gen / "ids.i64", np.int64, mode, shape=(meta["capacity"],))
+    idf = np.memmap(gen / "idf.f32", np.float32, "r", shape=(IDF_SLOTS,))
+    return vectors, ids, idf
+
+
+class SimilarityIndex:
+    """Read side of the on-disk index, one per process; load() remaps when meta.json changes."""
+
+    def __init__(self, base: Path):
+        self.base = Path(base)
+        self._stamp = None
+        self._state = None  # (meta, vectors, ids, idf), swapped as a whole
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """True if an index is mapped; costs one stat() unless meta.json was replaced."""
+        try:
+            st = os.stat(self.base / "meta.json")
+        except FileNotFoundError:
+            self._state = self._stamp = None
+            return False
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    try:
+                        meta = _read_meta(self.base)
+                        old = self._state
+                        if old and (old[0]["generation"], old[0]["capacity"]) == (meta["generation"], meta["capacity"]):
+                            self._state = (meta, *old[1:])  # rows appended in place: same mappings
+                        else:
+                            self._state = (meta, *_map(self.base, meta))
+                        self._stamp = stamp
+                    except (FileNotFoundError, ValueError, KeyError, TypeError):
+                        # replaced mid-read by a rebuild: keep what is mapped, retry next time
+                        logger.warning("similarity index at %s not readable yet", self.base, exc_info=True)
+        return self._state is not None
+
+    @property
+    def meta(self) -> dict:
+        return self._state[0]
+
+    def vector(self, feats: Dict[str, float]) -> np.ndarray:
+        meta, _, _, idf = self._state
+        return vectorize(feats, idf, meta["dim"])
+
+    def top(self, queries: np.ndarray, k: int, min_score: Optional[float] = None) -> List[List[Hit]]:
+        """Best `k` (book id, score) per row of `queries` (m x dim), best first; scores at or under `min_score` dropped."""
+        if min_score is None:
+            min_score = getattr(settings, "BOOKS_SIMILAR_MIN_SCORE", 0.05)
+        meta, vectors, ids, _ = self._state
+        rows, m = meta["rows"], len(queries)
+        queries = np.ascontiguousarray(queries, np.float32).T
+        best_rows = np.zeros((0, m), np.int64)
+        best_scores = np.zeros((0, m), np.float32)
+        for start in range(0, rows, BLOCK_ROWS):
+            scores = np.asarray(vectors[start:min(start + BLOCK_ROWS, rows)]) @ queries  # (block, m)
+            if len(scores) > k:
+                picked = np.argpartition(scores, -k, axis=0)[-k:]
+                scores = np.take_along_axis(scores, picked, axis=0)
+            else:
+                picked = np.broadcast_to(np.arange(len(scores))[:, None], scores.shape)
+            best_rows = np.concatenate([best_rows, picked + start])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > k:
+                keep = np.argpartition(best_scores, -k, axis=0)[-k:]
+                best_rows = np.take_along_axis(best_rows, keep, axis=0)
+                best_scores = np.take_along_axis(best_scores, keep, axis=0)
+        out = []
+        for j in range(m):
+            order = np.argsort(-best_scores[:, j], kind="stable")
+            out.append([
+                (int(ids[best_rows[i, j]]), float(best_scores[i, j]))
+                for i in order if best_scores[i, j] > min_score
+            ])
+        return out
+
+
+_index: Optional[SimilarityIndex] = None
+_init_lock = threading.Lock()
+
+
+def get_index() -> SimilarityIndex:
+    global _index
+    if _index is None:
+        with _init_lock:
+            if _index is None:
+                _index = SimilarityIndex(index_dir())
+    return _index
+
+
+# ---- writing ----
+
+def _book_rows(queryset, chunk_size: int):
+    return queryset.order_by("id").values_list("id", "title", "author", "description", "is_active").iterator(chunk_size=chunk_size)
+
+
+def rebuild(dim: Optional[int] = None, chunk_size: int = 2000) -> dict:
+    """Vectorize every Book into a new generation and switch to it; returns the new meta.json."""
+    base = index_dir()
+    with _building(base):
+        return _rebuild(base, dim, chunk_size)
+
+
+def build_if_missing() -> Optional[dict]:
+    """rebuild() unless this host has an index or is building one; returns the new meta.json, if built."""
+    base = index_dir()
+    with _building(base, wait=False) as mine:
+        if not mine or (base / "meta.json").exists():
+            return None
+        t0 = time.perf_counter()
+        meta = _rebuild(base, None, 2000)
+        logger.info("similarity index: built %d row(s) in %.1fs", meta["rows"], time.perf_counter() - t0)
+        return meta
+
+
+_build_started = False
+
+
+def _build_in_background() -> None:
+    try:
+        build_if_missing()
+    except Exception:
+        logger.exception("similarity index: background build failed")
+    finally:
+        close_old_connections()
+
+
+def start_build() -> None:
+    """Build the index on a daemon thread if this host has none (once per process, `BOOKS_SIMILAR_AUTO_BUILD`)."""
+    global _build_started
+    if not getattr(settings, "BOOKS_SIMILAR_AUTO_BUILD", False) or (index_dir() / "meta.json").exists():
+        return
+    with _init_lock:
+        if _build_started:
+            return
+        _build_started = True
+    if getattr(settings, "BOOKS_TASKS_MODE", "thread") == "sync":
+        build_if_missing()
+    else:
+        threading.Thread(target=_build_in_background, name="bookx-similar-build", daemon=True).start()
+
+
+def _rebuild(base: Path, dim: Optional[int], chunk_size: int) -> dict:
+    from .models import Book
+
+    dim = dim or getattr(settings, "BOOKS_SIMILAR_DIM", 128)
+    started = time.time()
+    # pass 1: document frequency per hashed token, active books only
+    df = np.zeros(IDF_SLOTS, np.int32)
+    documents = total = 0
+    for _, title, author, description, active in _book_rows(Book.objects.all(), chunk_size):
+        total += 1
+        if active:
+            documents += 1
+            df[sorted({_slots(t, dim)[2] for t in features(title, author, description)})] += 1
+    idf = (np.log((1.0 + documents) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    # pass 2: vectors, in id order, into a generation nobody reads yet
+    generation = f"g{time.time_ns()}"
+    gen = base / generation
+    gen.mkdir(parents=True)
+    idf.tofile(gen / "idf.f32")
+    meta = {"version": 1, "generation": generation, "dim": dim, "rows": 0,
+            "capacity": total + GROW_ROWS, "documents": documents, "built_at": started}
+    for name, dtype, shape in (("vectors.f32", np.float32, (meta["capacity"], dim)), ("ids.i64", np.int64, (meta["capacity"],))):
+        np.memmap(gen / name, dtype, "w+", shape=shape).flush()
+    vectors, ids, idf = _map(base, meta, "r+")
+    rows = 0
+    for pk, title, author, description, active in _book_rows(Book.objects.all(), chunk_size):
+        if rows == meta["capacity"]:
+            break  # inserted since pass 1: the catch-up below appends them
+        ids[rows] = pk
+        if active:
+            vectors[rows] = vectorize(features(title, author, description), idf, dim)
+        rows += 1
+    vectors.flush()
+    ids.flush()
+    meta["rows"] = rows
+    last = int(ids[rows - 1]) if rows else 0
+    del vectors, ids
+
+    with _locked(base):
+        _write_meta(base, meta)
+        for old in base.glob("g*"):
+            if old.name != generation:
+                shutil.rmtree(old, ignore_errors=True)  # processes still mapping it keep the pages until they remap
+    # writes that went to the old generation while this one was built
+    since = datetime.fromtimestamp(started - 1, tz=dt_timezone.utc)
+    refresh(Book.objects.filter(Q(updated_at__gte=since) | Q(id__gt=last)).values_list("id", flat=True))
+    return _read_meta(base)
+
+
+def refresh(pks: Sequence[int]) -> int:
+    """Re-vectorize these books in place (zero rows for inactive or deleted ones), appending new ids.
+
+    Returns the rows written; 0 without an index. A new id lower than the last indexed one
+    (explicit pks, loaddata) can't keep the rows sorted: it waits for the next rebuild.
+    """
+    from .models import Book
+
+    base = index_dir()
+    pks = sorted({int(pk) for pk in pks if pk is not None})
+    if not pks or not (base / "meta.json").exists():
+        return 0
+    texts = {}
+    for start in range(0, len(pks), 1000):  # under every backend's bound-parameter limit
+        qs = Book.objects.filter(id__in=pks[start:start + 1000], is_active=True)
+        texts.update((pk, rest) for pk, *rest in qs.values_list("id", "title", "author", "description"))
+
+    written = skipped = 0
+    with _locked(base):
+        meta = _read_meta(base)
+        if meta is None:
+            return 0
+        dim, rows = meta["dim"], meta["rows"]
+        vectors, ids, idf = _map(base, meta, "r+")
+        for pk in pks:
+            fields = texts.get(pk)
+            pos = int(np.searchsorted(ids[:rows], pk))
+            if pos < rows and ids[pos] == pk:
+                vectors[pos] = vectorize(features(*fields), idf, dim) if fields else 0.0
+            elif fields is None:
+                continue  # not indexed and nothing to index
+            elif rows and pk < ids[rows - 1]:
+                skipped += 1
+                continue
+            else:
+                if rows == meta["capacity"]:
+                    vectors.flush()
+                    ids.flush()
+                    del vectors, ids
+                    meta["capacity"] += max(GROW_ROWS, meta["capacity"] // 4)
+                    gen = base / meta["generation"]
+                    os.truncate(gen / "vectors.f32", meta["capacity"] * dim * 4)
+                    os.truncate(gen / "ids.i64", meta["capacity"] * 8)
+                    vectors, ids, idf = _map(base, meta, "r+")
+                ids[rows] = pk
+                vectors[rows] = vectorize(features(*fields), idf, dim)
+                rows += 1
+            written += 1
+        vectors.flush()
+        ids.flush()
+        if rows != meta["rows"]:
+            meta["rows"] = rows
+            _write_meta(base, meta)
+    if skipped:
+        logger.info("similarity index: %d out-of-order new book(s) left for rebuild_similar", skipped)
+    return written
+
+
+def schedule_refresh(pks: Sequence[int]) -> None:
+    """refresh(pks) on the background queue once the current transaction commits."""
+    from .tasks import enqueue
+
+    if pks:
+        enqueue(refresh, list(pks))
+
+
+# ---- reading ----
+
+def similar_books(book, limit: int, request=None) -> List[dict]:
+    """Active books most like `book` (list item shape plus `score`), best first; IndexUnavailable until built."""
+    from .models import Book
+    from .serializers import BookReadSerializer
+
+    index = get_index()
+    if not index.load():
+        start_build()
+        if not index.load():  # BOOKS_TASKS_MODE=sync builds inline
+            if getattr(settings, "BOOKS_SIMILAR_AUTO_BUILD", False):
+                raise IndexUnavailable("Similar books are not available yet: the similarity index is being built on this server.")
+            raise IndexUnavailable("Similar books are not available: run `manage.py rebuild_similar` on this server.")
+    hits = index.top(index.vector(features(book.title, book.author, book.description))[None], limit + 1)[0]
+    scores = {pk: score for pk, score in hits if pk != book.pk}
+    reader = BookReadSerializer(request)
+    found = {row["id"]: row for row in reader.many(reader.rows(Book.objects.filter(is_active=True, id__in=list(scores)).order_by()))}
+    return [{**found[pk], "score": round(score, 4)} for pk, score in scores.items() if pk in found][:limit]
+
+
+def term_features(terms: Sequence[Term]) -> Dict[str, float]:
+    """Search terms as one document: title terms count as titles, author terms as authors, the rest as description."""
+    out: Dict[str, float] = {}
+    for field, text in terms:
+        for token, weight in features(**{field or "description": text}).items():
+            out[token] = out.get(token, 0.0) + weight
+    return out
+
+
+class SimilarityMatcher:
+    """The match_any / match_many half of a books.search backend, ranked by similarity instead of text hits."""
+
+    CANDIDATES = 200  # nearest rows fetched for match_any, before `qs` filters them
+
+    def __init__(self, index: SimilarityIndex):
+        self.index = index
+
+    def match_any(self, qs: QuerySet, terms: Sequence[Term]) -> QuerySet:
+        if not terms:
+            return qs
+        hits = self.index.top(self.index.vector(term_features(terms))[None], self.CANDIDATES)[0]
+        if not hits:
+            return qs.none()
+        # one raw CASE: compiling a When() per candidate costs more than the query itself
+        table = connection.ops.quote_name(qs.model._meta.db_table)
+        rank = RawSQL(f"CASE {table}.id {'WHEN %s THEN %s ' * len(hits)}END", [v for hit in hits for v in hit],
+                      output_field=FloatField())
+        return qs.filter(id__in=[pk for pk, _ in hits]).annotate(search_rank=rank).order_by(*RANK_ORDERING)
+
+    def match_many(self, qs: QuerySet, term_lists: Sequence[Sequence[Term]], limit: int) -> List[List[int]]:
+        out: List[List[int]] = [[] for _ in term_lists]
+        items = [i for i, terms in enumerate(term_lists) if terms]
+        if not items:
+            return out
+        queries = np.stack([self.index.vector(term_features(term_lists[i])) for i in items])
+        hits = self.index.top(queries, 2 * limit)  # some rows are filtered out by `qs`
+        wanted = sorted({pk for row in hits for pk, _ in row})
+        allowed = set()
+        for start in range(0, len(wanted), 1000):
+            allowed.update(qs.filter(id__in=wanted[start:start + 1000]).values_list("id", flat=True))
+        for i, row in zip(items, hits):
+            out[i] = [pk for pk, _ in row if pk in allowed][:limit]
+        return out
+
+
+def get_ai_matcher():
+    """What AI advice is matched with: the index with `BOOKS_AI_MATCH=similar` (once built), else the search backend."""
+    if getattr(settings, "BOOKS_AI_MATCH", "search") == "similar":
+        index = get_index()
+        if index.load():
+            return SimilarityMatcher(index)
+        start_build()
+    return get_search_backend()
@@ -0,0 +1,167 @@
+
+"""Delta feed for clients that keep a local copy of the catalogue.
+
+`GET /api/books/changes/?updated_since=<ISO 8601>` (first sync) or
+`?cursor=<token>` (every later one) returns what changed after that point:
+
+    {"results": [<book>, ...],            # created/updated active ads, BookSerializer shape
+     "deleted": [{"id", "reason", "at"}],  # reason: "deleted" | "deactivated"
+     "next": <url or null>,                # more changes right now, follow it
+     "cursor": <token>}                    # resume point; store it once next is null
+
+Updated rows come from `Book.updated_at`, deletes from `BookTombstone` (written
+by a post_delete signal). Both are read as keyset ranges on (timestamp, id)
+and merged, so a sync costs two index range reads sized by the churn, not by
+the catalogue. A row saved just before a sync may commit after it, so the
+final cursor is held back `BOOKS_SYNC_LAG_SECONDS`: the newest changes can
+arrive twice, never zero times. Clients upsert/delete by id.
+
+Writes that skip `save()` (`QuerySet.update()`) must set `updated_at` to show up.
+"""
+import base64
+import binascii
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import Book, BookTombstone
+from .serializers import BookReadSerializer
+from .tasks import enqueue
+
+Position = Tuple[datetime, int]
+
+INVALID_CURSOR = "Invalid cursor"
+
+
+class SyncExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Changes are no longer available this far back; re-download /api/books/."
+    default_code = "sync_expired"
+
+
+def encode_cursor(books: Position, tombstones: Position) -> str:
+    payload = {"b": [books[0].isoformat(), books[1]], "t": [tombstones[0].isoformat(), tombstones[1]]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode("ascii")
+
+
+def decode_cursor(raw: str) -> Tuple[Position, Position]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(raw.encode("ascii")))
+        positions = tuple((parse_datetime(data[k][0]), int(data[k][1])) for k in ("b", "t"))
+    except (binascii.Error, ValueError, UnicodeEncodeError, KeyError, TypeError, IndexError):
+        raise NotFound(INVALID_CURSOR)
+    if any(ts is None or timezone.is_naive(ts) for ts, _pk in positions):
+        raise NotFound(INVALID_CURSOR)
+    return positions
+
+
+def parse_since(raw: str) -> datetime:
+    try:
+        since = parse_datetime(raw)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ValidationError({"updated_since": "Expected an ISO 8601 datetime."})
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def prune_tombstones() -> None:
+    cutoff = timezone.now() - timedelta(days=getattr(settings, "BOOKS_TOMBSTONE_RETENTION_DAYS", 90))
+    BookTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+
+
+_last_prune = 0.0
+
+
+def schedule_prune(interval: float = 3600) -> None:
+    """Queue prune_tombstones at most once per `interval` seconds per process."""
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune >= interval:
+        _last_prune = now
+        enqueue(prune_tombstones)
+
+
+def after(queryset, field: str, position: Position):
+    ts, pk = position
+    # leading bound first so the (field, id) index is range-scanned
+    return queryset.filter(Q(**{f"{field}__gte": ts}), Q(**{f"{field}__gt": ts}) | Q(**{field: ts, "id__gt": pk}))
+
+
+class DeltaFeed:
+    def __init__(self, request, page_size: int):
+        self.request = request
+        self.page_size = page_size
+
+    def start(self) -> Tuple[Position, Position]:
+        params = self.request.query_params
+        if params.get("cursor"):
+            books, tombstones = decode_cursor(params["cursor"])
+            since = min(books[0], tombstones[0])
+        elif params.get("updated_since"):
+            since = parse_since(params["updated_since"])
+            books = tombstones = (since, 0)
+        else:
+            raise ValidationError({"updated_since": "Pass updated_since (first sync) or cursor."})
+        retention = getattr(settings, "BOOKS_TOMBSTONE_RETENTION_DAYS", 90)
+        if since < timezone.now() - timedelta(days=retention):
+            # deletes older than the retention window are pruned; only a full reload is correct
+            raise SyncExpired()
+        return books, tombstones
+
+    def page(self) -> dict:
+        size = self.page_size
+        book_pos, tomb_pos = self.start()
+        reader = BookReadSerializer(self.request)
+
+        books = list(after(reader.rows(Book.objects.all()), "updated_at", book_pos).order_by("updated_at", "id")[: size + 1])
+        tombs = list(
+            after(BookTombstone.objects.all(), "deleted_at", tomb_pos)
+            .order_by("deleted_at", "id").values("id", "book_id", "deleted_at")[: size + 1]
+        )
+        events = sorted(
+            [(row["updated_at"], 0, row["id"], row) for row in books]
+            + [(row["deleted_at"], 1, row["id"], row) for row in tombs],
+            key=lambda e: e[:3],
+        )
+        taken, more = events[:size], len(events) > size
+
+        results, deleted = [], []
+        for ts, kind, pk, row in taken:
+            if kind == 1:
+                tomb_pos = (ts, pk)
+                deleted.append({"id": row["book_id"], "reason": "deleted", "at": ts})
+            else:
+                book_pos = (ts, pk)
+                if row["is_active"]:
+                    results.append(row)
+                else:
+                    deleted.append({"id": pk, "reason": "deactivated", "at": ts})
+
+        at = reader.datetime.to_representation
+        for item in deleted:
+            item["at"] = at(item["at"])
+        if not more:
+            # caught up: resume from a little before now, so rows committed late
+            # (with an older timestamp) are re-read rather than skipped
+            horizon = timezone.now() - timedelta(seconds=getattr(settings, "BOOKS_SYNC_LAG_SECONDS", 5))
+            book_pos = tomb_pos = (horizon, 0)
+        cursor = encode_cursor(book_pos, tomb_pos)
+        url = remove_query_param(self.request.build_absolute_uri(), "updated_since")
+        return {
+            "results": reader.many(results),
+            "deleted": deleted,
+            "next": replace_query_param(url, "cursor", cursor) if more else None,
+            "cursor": cursor,
+        }
@@ -0,0 +1,92 @@
+
+"""Minimal in-process background queue.
+
+Jobs run on daemon worker threads after the enqueuing transaction commits. It
+is deliberately simple: jobs are lost if the process dies, so every job must
+be idempotent and have a management command that can redo it (e.g.
+`process_book_images`). `BOOKS_TASKS_MODE=sync` runs jobs inline.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTaskQueue:
+    def __init__(self, workers: int = 1, maxsize: int = 1000):
+        self.workers = workers
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    t = threading.Thread(target=self._run, name=f"bookx-tasks-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+
+    def _run(self) -> None:
+        while True:
+            fn, args = self._queue.get()
+            close_old_connections()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("background task %s failed", getattr(fn, "__name__", fn))
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+    def put(self, fn: Callable, *args) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((fn, args))
+        except queue.Full:
+            logger.warning("task queue full, dropping %s%r", getattr(fn, "__name__", fn), args)
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for queued jobs; True if none are left."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_queue = None
+
+
+def get_queue() -> LocalTaskQueue:
+    global _queue
+    if _queue is None:
+        _queue = LocalTaskQueue(workers=getattr(settings, "BOOKS_TASKS_WORKERS", 1))
+    return _queue
+
+
+def drain(timeout: float) -> bool:
+    """On shutdown: give this process's queued jobs `timeout` seconds to finish."""
+    return _queue is None or _queue.drain(timeout)
+
+
+def enqueue(fn: Callable, *args) -> None:
+    """Run `fn(*args)` off the request path once the current transaction commits."""
+    if getattr(settings, "BOOKS_TASKS_MODE", "thread") == "sync":
+        transaction.on_commit(lambda: fn(*args))
+    else:
+        transaction.on_commit(lambda: get_queue().put(fn, *args))
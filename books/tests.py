@@ -0,0 +1,766 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books import admission, feed, similar
+from books.admission import ConcurrencyLimiter, Overloaded
+from books.ai import CircuitBreaker, CircuitOpen, GeminiClient, UpstreamError, _generate_advice
+from books.ai_cache import AdviceCache
+from books.authentication import principal_key
+from books.models import Book, BookFacet, BookQuerySet, BookTombstone
+from books.query_cache import get_query_cache
+from books.search import FTS_TABLE, SQLiteFTS5SearchBackend, canonical, fts5_table_exists, get_search_backend
+from books.sync import encode_cursor
+from books.uploads import FileSystemSink, ImageUploadRejected, S3MultipartSink, StreamingImageUploadHandler
+
+
+_similar_dir = override_settings(BOOKS_SIMILAR_DIR=tempfile.mkdtemp(prefix="bookx-test-similar-"))
+
+
+def setUpModule():
+    # never read or write the real similarity index (~/.cache/bookx/similar)
+    _similar_dir.enable()
+    similar._index = None
+
+
+def tearDownModule():
+    shutil.rmtree(settings.BOOKS_SIMILAR_DIR, ignore_errors=True)
+    _similar_dir.disable()
+    similar._index = None
+
+
+def reply(status=200, body=None, json_error=False):
+    resp = mock.Mock(status_code=status)
+    if json_error:
+        resp.json.side_effect = ValueError("Expecting value")
+    else:
+        resp.json.return_value = body if body is not None else {
+            "candidates": [{"content": {"parts": [{"text": '{"topics": []}'}]}}]
+        }
+    return resp
+
+
+class GeminiClientTests(SimpleTestCase):
+    def make_client(self, responses, **kwargs):
+        kwargs = {"timeout": 2.0, "backoff": 0.001, "max_retries": 2,
+                  "breaker": CircuitBreaker(threshold=2, cooldown=30.0), **kwargs}
+        client = GeminiClient(api_key="test", base_url="http://gemini.invalid", **kwargs)
+        client.session.post = mock.Mock(side_effect=responses)
+        return client
+
+    @staticmethod
+    def cool_down(breaker):
+        breaker.opened_at -= breaker.cooldown
+
+    def test_retries_transient_failures(self):
+        client = self.make_client([reply(503), requests.ConnectionError(), reply()])
+        self.assertEqual(client.generate("m", "hi"), '{"topics": []}')
+        self.assertEqual(client.session.post.call_count, 3)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_client_error_is_not_retried(self):
+        client = self.make_client([reply(400), reply()])
+        with self.assertRaises(UpstreamError):
+            client.generate("m", "hi")
+        self.assertEqual(client.session.post.call_count, 1)
+
+    def test_missing_candidates_is_an_empty_reply(self):
+        client = self.make_client([reply(body={"promptFeedback": {"blockReason": "SAFETY"}})])
+        self.assertEqual(client.generate("m", "hi"), "")
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_breaker_opens_rejects_and_closes_after_a_probe(self):
+        client = self.make_client([reply(500)] * 6 + [reply()], max_retries=0)
+        for _ in range(2):
+            with self.assertRaises(UpstreamError):
+                client.generate("m", "hi")
+        self.assertEqual(client.breaker.state, "open")
+        with self.assertRaises(CircuitOpen):
+            client.generate("m", "hi")
+        self.assertEqual(client.session.post.call_count, 2)
+
+        self.cool_down(client.breaker)
+        self.assertEqual(client.breaker.state, "half-open")
+        with self.assertRaises(UpstreamError):
+            client.generate("m", "hi")  # failed probe: open again for a full cooldown
+        self.assertEqual(client.breaker.state, "open")
+
+        self.cool_down(client.breaker)
+        client.session.post.side_effect = [reply()]
+        client.generate("m", "hi")
+        self.assertEqual(client.breaker.state, "closed")
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_half_open_admits_a_single_probe(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=30.0)
+        breaker.record_failure()
+        self.cool_down(breaker)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_malformed_reply_during_half_open_releases_the_probe(self):
+        malformed = {
+            "not json": reply(json_error=True),
+            "candidates not a list": reply(body={"candidates": "oops"}),
+            "body not an object": reply(body=["not", "a", "dict"]),
+        }
+        for label, bad in malformed.items():
+            with self.subTest(label):
+                client = self.make_client([reply(500), reply(500), bad, reply()], max_retries=0)
+                for _ in range(2):
+                    with self.assertRaises(UpstreamError):
+                        client.generate("m", "hi")
+                self.cool_down(client.breaker)
+                with self.assertRaises(UpstreamError):
+                    client.generate("m", "hi")
+                self.assertFalse(client.breaker._probing)
+                self.assertEqual(client.breaker.state, "open")
+                self.cool_down(client.breaker)
+                self.assertEqual(client.generate("m", "hi"), '{"topics": []}')
+                self.assertEqual(client.breaker.state, "closed")
+
+    def test_unexpected_error_during_half_open_releases_the_probe(self):
+        client = self.make_client([reply(500), reply(500), RuntimeError("bug"), reply()], max_retries=0)
+        for _ in range(2):
+            with self.assertRaises(UpstreamError):
+                client.generate("m", "hi")
+        self.cool_down(client.breaker)
+        with self.assertRaises(RuntimeError):
+            client.generate("m", "hi")
+        self.assertFalse(client.breaker._probing)
+        self.cool_down(client.breaker)
+        client.generate("m", "hi")
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_deadline_bounds_retries(self):
+        timeouts = []
+
+        def slow(*args, timeout, **kwargs):
+            timeouts.append(timeout[1])
+            time.sleep(0.05)
+            raise requests.Timeout()
+
+        client = self.make_client(None, timeout=0.3, max_retries=100, backoff=0.01)
+        client.session.post.side_effect = slow
+        started = time.monotonic()
+        with self.assertRaises(UpstreamError):
+            client.generate("m", "hi")
+        self.assertLess(time.monotonic() - started, 0.3 + 0.1)
+        self.assertLess(len(timeouts), 100)
+        self.assertLessEqual(timeouts[0], 0.3)
+        self.assertLess(timeouts[-1], timeouts[0])  # each attempt only gets what is left of the deadline
+        self.assertEqual(client.breaker.failures, 1)  # one failed call, however many attempts
+
+    @override_settings(GOOGLE_API_KEY="")
+    def test_missing_key_falls_back_without_calling_gemini(self):
+        with mock.patch("books.ai.get_gemini_client") as get_client:
+            advice = _generate_advice("books about sleep")
+        get_client.assert_not_called()
+        self.assertIn("not configured", advice["_warning"])
+
+    @override_settings(GOOGLE_API_KEY="from-settings")
+    def test_key_comes_from_settings(self):
+        with mock.patch("books.ai.get_gemini_client") as get_client:
+            get_client.return_value.generate.return_value = '{"topics": ["sleep"]}'
+            self.assertEqual(_generate_advice("books about sleep"), {"topics": ["sleep"]})
+        get_client.assert_called_once_with("from-settings")
+
+
+class AdviceCacheTests(SimpleTestCase):
+    def test_shared_cache_errors_fall_back_to_local_and_compute(self):
+        shared = mock.Mock()
+        shared.get.side_effect = ConnectionError("redis down")
+        shared.set.side_effect = ConnectionError("redis down")
+        cache = AdviceCache(shared=shared)
+        compute = mock.Mock(return_value={"topics": ["sleep"]})
+        with self.assertLogs("books.ai_cache", "WARNING"):
+            self.assertEqual(cache.get_or_compute("Sleep?", compute), {"topics": ["sleep"]})
+        self.assertEqual(cache.get_or_compute("sleep", compute), {"topics": ["sleep"]})  # local LRU
+        compute.assert_called_once()
+        self.assertEqual(cache.stats()["shared_errors"], 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_non_object_payload_gets_the_negative_ttl(self):
+        cache = AdviceCache(ttl=3600, negative_ttl=30, shared=mock.Mock(get=mock.Mock(return_value=None)))
+        self.assertEqual(cache.ttl_for(["not", "an", "object"]), 30)
+        self.assertEqual(cache.ttl_for({"_warning": "fallback"}), 30)
+        self.assertEqual(cache.ttl_for({"topics": []}), 3600)
+        self.assertEqual(cache.get_or_compute("list please", lambda prompt: ["x"]), ["x"])
+        self.assertEqual(cache.shared.set.call_args.args[2], 30)
+
+
+def noisy_jpeg(edge: int) -> bytes:
+    """About edge * edge * 1.5 bytes of JPEG: random pixels don't compress."""
+    out = io.BytesIO()
+    Image.frombytes("RGB", (edge, edge), os.urandom(edge * edge * 3)).save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+class StreamingUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp(prefix="bookx-test-media-")
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media, BOOK_IMAGE_MAX_BYTES=100_000, BOOKS_TASKS_MODE="sync")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = Path(media)
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user("uploader"))
+
+    def stored_files(self):
+        return sorted(str(p.relative_to(self.media)) for p in self.media.rglob("*") if p.is_file())
+
+    def post(self, image: bytes, name: str = "cover.jpg", **fields):
+        data = {"title": "Dune", "author": "Frank Herbert", "location": "Tashkent", **fields}
+        data["image"] = SimpleUploadedFile(name, image, content_type="image/jpeg")
+        return self.api.post("/api/books/", data, format="multipart")
+
+    def test_upload_is_stored_once(self):
+        image = noisy_jpeg(120)
+        self.assertLess(len(image), 100_000)
+        resp = self.post(image)
+        self.assertEqual(resp.status_code, 201, resp.content)
+        book = Book.objects.get(pk=resp.json()["id"])
+        self.assertEqual(self.stored_files(), [book.image.name])
+        self.assertEqual((self.media / book.image.name).read_bytes(), image)
+
+    def test_oversized_upload_is_rejected_and_the_partial_file_removed(self):
+        image = noisy_jpeg(400)
+        self.assertGreater(len(image), 2 * 65536)  # past the first chunk, so something was written
+        with mock.patch.object(FileSystemSink, "abort", autospec=True, side_effect=FileSystemSink.abort) as abort:
+            resp = self.post(image)
+        self.assertEqual(resp.status_code, 400, resp.content)
+        self.assertIn("exceeds 100000 bytes", resp.content.decode())
+        abort.assert_called_once()  # a partial file had been written, and was removed
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(Book.objects.exists())
+
+    def test_declared_length_over_the_limit_is_refused_before_reading(self):
+        resp = self.api.generic("POST", "/api/books/", b"x", content_type="multipart/form-data; boundary=x",
+                                CONTENT_LENGTH=str(100_000 + 10 * 1024 * 1024))
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_not_an_image_is_rejected_before_anything_is_stored(self):
+        resp = self.post(b"%PDF-1.4 " + os.urandom(20_000), name="cover.jpg")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_stored_upload_is_removed_when_validation_fails(self):
+        resp = self.post(noisy_jpeg(60), location="")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("location", resp.json())
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(Book.objects.exists())
+
+
+class S3MultipartSinkTests(SimpleTestCase):
+    def sink(self):
+        client = mock.Mock()
+        client.create_multipart_upload.return_value = {"UploadId": "u1"}
+        client.upload_part.side_effect = lambda **kw: {"ETag": f"e{kw['PartNumber']}"}
+        storage = mock.Mock(bucket_name="b", default_acl=None)
+        storage.get_available_name.side_effect = lambda name, max_length=None: name
+        storage._normalize_name.side_effect = lambda name: name
+        storage.get_object_parameters.return_value = {}
+        storage.connection.meta.client = client
+        with override_settings(BOOK_IMAGE_S3_PART_SIZE=5 * 1024 * 1024):
+            return S3MultipartSink(storage, "book_images/a.jpg", "image/jpeg"), client
+
+    def test_oversized_upload_aborts_the_multipart_upload(self):
+        sink, client = self.sink()
+        handler = StreamingImageUploadHandler()
+        handler.max_bytes = 6 * 1024 * 1024
+        handler.new_file("image", "a.jpg", "image/jpeg", None)
+        handler.sink = sink
+        chunk = b"\0" * (1024 * 1024)
+        with self.assertRaises(ImageUploadRejected):
+            for i in range(7):
+                handler.receive_data_chunk(chunk, i * len(chunk))
+        self.assertEqual(client.upload_part.call_count, 1)  # the first 5 MiB part went out
+        client.abort_multipart_upload.assert_called_once_with(Bucket="b", Key="book_images/a.jpg", UploadId="u1")
+        client.complete_multipart_upload.assert_not_called()
+        self.assertIsNone(handler.sink)
+
+
+class ConcurrencyLimiterTests(SimpleTestCase):
+    def test_blocking_callers_wait_instead_of_being_shed(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=0, timeout=0.05)
+        limiter.acquire()
+        with self.assertRaises(Overloaded):
+            limiter.acquire()
+        got = threading.Event()
+        waiter = threading.Thread(target=lambda: (limiter.acquire(block=True), got.set()))
+        waiter.start()
+        self.assertFalse(got.wait(0.2))
+        self.assertEqual(limiter.stats()["blocked"], 1)
+        limiter.release(0.1)
+        self.assertTrue(got.wait(2))
+        waiter.join()
+        self.assertEqual(limiter.stats()["active"], 1)
+
+    def test_queued_callers_go_before_blocking_ones(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=5)
+        limiter.acquire()
+        order = []
+
+        def take(name, block):
+            limiter.acquire(block)
+            order.append(name)
+            time.sleep(0.05)
+            limiter.release(0.05)
+
+        batch = threading.Thread(target=take, args=("batch", True))
+        batch.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=take, args=("interactive", False))
+        interactive.start()
+        time.sleep(0.05)
+        limiter.release(0.1)
+        batch.join(5)
+        interactive.join(5)
+        self.assertEqual(order, ["interactive", "batch"])
+
+
+@override_settings(AI_MAX_CONCURRENCY=2, AI_QUEUE_SIZE=1, AI_QUEUE_TIMEOUT=0.2, AI_BATCH_CONCURRENCY=8,
+                   AI_RATE_PER_MINUTE=0, AI_SHED_RESPONSE="fallback")
+class BatchAdmissionTests(TransactionTestCase):
+    def setUp(self):
+        admission._limiter = None  # rebuilt from the settings above
+        self.addCleanup(setattr, admission, "_limiter", None)
+        self.user = get_user_model().objects.create_user("batcher")
+
+    async def test_batch_larger_than_the_limiter_is_not_shed(self):
+        lock, calls, in_flight, peak = threading.Lock(), [], [0], [0]
+
+        def model(prompt):
+            with lock:
+                calls.append(prompt)
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.1)
+            with lock:
+                in_flight[0] -= 1
+            return {"query_intent": prompt, "topics": [], "suggested_books": []}
+
+        run = uuid.uuid4().hex  # fresh prompts: nothing from the advice cache
+        prompts = [f"batch {run} prompt {i}" for i in range(12)]
+        with mock.patch("books.ai._generate_advice", side_effect=model):
+            resp = await AsyncClient().post(
+                "/api/ai/books/advice/batch/", {"prompts": prompts}, content_type="application/json",
+                headers={"Authorization": f"Bearer {AccessToken.for_user(self.user)}"},
+            )
+            self.assertEqual(resp.status_code, 200)
+            body = b"".join([chunk async for chunk in resp.streaming_content])
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(sorted(line["index"] for line in lines), list(range(12)))
+        self.assertEqual([line["index"] for line in lines if line["ai"].get("_warning")], [])  # none shed
+        self.assertEqual(len(calls), 12)
+        self.assertLessEqual(peak[0], 2)
+        self.assertEqual(admission.get_limiter().stats()["shed_queue_full"], 0)
+        self.assertEqual(admission.get_limiter().stats()["shed_timeout"], 0)
+
+
+class SimilarBooksTests(TestCase):
+    def test_503_until_rebuild_similar_then_ranked_matches(self):
+        owner = get_user_model().objects.create_user("seller")
+        book = Book.objects.create(owner=owner, title="Dune", author="Frank Herbert", location="Kyiv")
+        sequel = Book.objects.create(owner=owner, title="Dune Messiah", author="Frank Herbert", location="Kyiv")
+        Book.objects.create(owner=owner, title="Cooking for one", author="Ann Smith", location="Lviv")
+
+        resp = APIClient().get(f"/api/books/{book.pk}/similar/")
+        self.assertEqual(resp.status_code, 503)  # auto-build is off: nothing builds it behind our back
+        self.assertIn("Retry-After", resp)
+        self.assertFalse((similar.index_dir() / "meta.json").exists())
+
+        similar.rebuild()
+        self.assertTrue(str(similar.index_dir()).startswith(tempfile.gettempdir()))
+        resp = APIClient().get(f"/api/books/{book.pk}/similar/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([row["id"] for row in resp.json()["results"]], [sequel.pk])
+
+
+@override_settings(REDIS_URL="redis://127.0.0.1:1/0", BOOKS_FEED_BROKER="")
+class FeedBrokerTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, feed, "_broker", feed._broker)
+        feed._broker = None
+
+    def test_writes_publish_without_starting_the_listener(self):
+        owner = get_user_model().objects.create_user("writer")
+        with mock.patch.object(feed.RedisBroker, "start") as start, \
+                mock.patch.object(feed.RedisBroker, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                Book.objects.create(owner=owner, title="Dune", location="Kyiv")
+            self.assertEqual(publish.call_args.args[0]["type"], "created")
+            start.assert_not_called()
+
+            self.assertIs(feed.start_listening(), feed.get_broker())  # what the SSE view and WebSocket call
+            start.assert_called_once()
+
+
+@override_settings(BOOKS_AUTH_CACHE_ALIAS="default")  # locmem: one process, so exact here
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("reader", password="old-password")
+
+    def call(self, token):
+        # 415 (wrong Content-Type) once authenticated; the import view needs a user
+        return APIClient().post("/api/books/import/", b"x", content_type="text/plain",
+                                HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_principal_is_cached(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self.call(token).status_code, 415)
+        self.assertIsNotNone(cache.get(principal_key(self.user.pk)))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.call(token).status_code, 415)
+
+    def test_deactivated_user_is_rejected_on_the_next_request(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self.call(token).status_code, 415)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.call(token).status_code, 401)
+
+    def test_password_change_drops_the_cached_principal(self):
+        with mock.patch.object(jwt_settings, "CHECK_REVOKE_TOKEN", True):
+            token = AccessToken.for_user(self.user)
+            self.assertEqual(self.call(token).status_code, 415)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.set_password("new-password")
+                self.user.save()
+            self.assertIsNone(cache.get(principal_key(self.user.pk)))
+            resp = self.call(token)
+            self.assertEqual(resp.status_code, 401)
+            self.assertEqual(resp.json()["code"], "password_changed")
+            self.assertEqual(self.call(AccessToken.for_user(self.user)).status_code, 415)
+
+
+class FacetCountTests(TestCase):
+    def assertCountsMatchTable(self):
+        active = Book.objects.filter(is_active=True).order_by()
+        authors = {}
+        for author, n in active.values_list("author").annotate(n=Count("*")):
+            if canonical(author):
+                authors[canonical(author)] = authors.get(canonical(author), 0) + n
+        expected = {
+            BookFacet.LOCATION: dict(active.values_list("location_key").annotate(n=Count("*"))),
+            BookFacet.AUTHOR: authors,
+        }
+        counters = {BookFacet.LOCATION: {}, BookFacet.AUTHOR: {}}
+        for facet, key, n in BookFacet.objects.filter(count__gt=0).values_list("facet", "key", "count"):
+            counters[facet][key] = n
+        self.assertEqual(counters, expected)
+
+    def test_counters_follow_saves_location_changes_deactivation_and_deletes(self):
+        owner = get_user_model().objects.create_user("counter")
+        dune = Book.objects.create(owner=owner, title="Dune", author="Frank Herbert", location="Kyiv")
+        Book.objects.create(owner=owner, title="Emma", author="Jane Austen", location="kyiv ")
+        Book.objects.create(owner=owner, title="Persuasion", author="Jane Austen", location="Lviv")
+        self.assertCountsMatchTable()
+
+        dune.title = "Dune (1965)"
+        dune.save()
+        self.assertCountsMatchTable()
+
+        dune.location = "Odesa"
+        dune.save()
+        self.assertCountsMatchTable()
+
+        dune.is_active = False
+        dune.save(update_fields=["is_active"])
+        self.assertCountsMatchTable()
+        dune.is_active = True
+        dune.save()
+        self.assertCountsMatchTable()
+
+        Book.objects.get(title="Emma").delete()
+        self.assertCountsMatchTable()
+        Book.objects.filter(author="Jane Austen").delete()
+        self.assertCountsMatchTable()
+
+    def test_stale_instances_do_not_count_twice(self):
+        # what two requests racing on one ad look like: each holds the row as it was before the other's save
+        owner = get_user_model().objects.create_user("racer")
+        pk = Book.objects.create(owner=owner, title="Dune", author="Frank Herbert", location="Kyiv").pk
+        first, second, third = (Book.objects.get(pk=pk) for _ in range(3))
+
+        first.location = "Lviv"
+        first.save()
+        second.author = "F. Herbert"  # still says Kyiv
+        second.save()
+        self.assertCountsMatchTable()
+
+        third.is_active = False  # still says Kyiv / Frank Herbert
+        third.save()
+        self.assertCountsMatchTable()
+
+        stale = Book.objects.get(pk=pk)
+        Book.objects.get(pk=pk).delete()
+        stale.delete()  # already gone: nothing left to uncount
+        self.assertCountsMatchTable()
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "FTS5 triggers are SQLite only")
+class FTS5SyncTests(TestCase):
+    def setUp(self):
+        if not fts5_table_exists():
+            self.skipTest("SQLite built without FTS5")
+        self.backend = SQLiteFTS5SearchBackend()
+        self.book = Book.objects.create(owner=get_user_model().objects.create_user("indexer"), title="Dune",
+                                        author="Frank Herbert", description="Desert planet", location="Kyiv")
+
+    def found(self, **query):
+        return list(self.backend.search(Book.objects.all(), **query).values_list("id", flat=True))
+
+    def assertIndexConsistent(self):
+        with connection.cursor() as cur:  # raises if the index disagrees with books_book
+            cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+
+    def test_update_replaces_the_indexed_text(self):
+        self.assertEqual(self.found(q="dune"), [self.book.pk])
+        self.book.title = "Children of Dune"
+        self.book.author = "F. Herbert"
+        self.book.save()
+        self.assertEqual(self.found(titles=["children"]), [self.book.pk])
+        self.assertEqual(self.found(authors=["frank"]), [])
+
+        Book.objects.filter(pk=self.book.pk).update(description="Sandworms")  # no signals: the trigger alone
+        self.assertEqual(self.found(q="sandworms"), [self.book.pk])
+        self.assertEqual(self.found(q="desert"), [])
+        self.assertIndexConsistent()
+
+    def test_delete_removes_the_row_from_the_index(self):
+        other = Book.objects.create(owner=self.book.owner, title="Dune Messiah", location="Kyiv")
+        self.book.delete()
+        self.assertEqual(self.found(q="dune"), [other.pk])
+        Book.objects.filter(pk=other.pk).delete()
+        self.assertEqual(self.found(q="dune"), [])
+        with connection.cursor() as cur:
+            cur.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'dune'")
+            self.assertEqual(cur.fetchone()[0], 0)
+        self.assertIndexConsistent()
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user("pager")
+        books = Book.objects.bulk_create([
+            Book(owner=owner, title=f"Dune {'dune ' * (i % 3)}volume {i}", author="Frank Herbert", location="Kyiv")
+            for i in range(11)
+        ])
+        # ties on created_at: the id tiebreaker has to carry the cursor
+        Book.objects.filter(pk__in=[b.pk for b in books[3:8]]).update(created_at=books[3].created_at)
+
+    def walk(self, url):
+        """ids of every page following `next`, then of every page back along `previous` from the last one."""
+        api, forward, pages = APIClient(), [], []
+        while url:
+            body = api.get(url).json()
+            pages.append(body)
+            forward += [row["id"] for row in body["results"]]
+            url = body["next"]
+        backward, url = [row["id"] for row in pages[-1]["results"]], pages[-1]["previous"]
+        while url:
+            body = api.get(url).json()
+            backward = [row["id"] for row in body["results"]] + backward
+            url = body["previous"]
+        return forward, backward
+
+    def test_cursor_round_trip_in_list_order(self):
+        expected = list(Book.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        forward, backward = self.walk("/api/books/?page_size=3")
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_cursor_round_trip_in_search_rank_order(self):
+        ranked = get_search_backend().search(Book.objects.all(), q="dune")
+        expected = list(ranked.values_list("id", flat=True))
+        self.assertEqual(len(expected), 11)
+        self.assertGreater(len(set(ranked.values_list("search_rank", flat=True))), 1)  # really ordered by rank
+        forward, backward = self.walk("/api/books/?q=dune&page_size=4")
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_tampered_cursor_is_a_404(self):
+        self.assertEqual(APIClient().get("/api/books/?cursor=not-base64!").status_code, 404)
+
+
+# locmem: one process, so exact here; background jobs queued by the writes run inline, not on another connection
+@override_settings(BOOKS_QUERY_CACHE_ALIAS="default", BOOKS_TASKS_MODE="sync")
+class QueryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = get_user_model().objects.create_user("lister")
+        self.book = Book.objects.create(owner=self.owner, title="Dune", location="Kyiv")
+
+    def titles(self, url="/api/books/"):
+        return [row["title"] for row in APIClient().get(url).json()["results"]]
+
+    def test_repeat_is_a_hit_and_equivalent_filters_share_an_entry(self):
+        self.assertEqual(self.titles("/api/books/?titles=Dune,emma"), ["Dune"])
+        hits = get_query_cache().stats()["hits"]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles("/api/books/?titles=EMMA&titles=dune"), ["Dune"])
+        self.assertEqual(get_query_cache().stats()["hits"], hits + 1)
+
+    def test_book_writes_invalidate_after_commit(self):
+        self.assertEqual(self.titles(), ["Dune"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(owner=self.owner, title="Emma", location="Kyiv")
+        self.assertEqual(self.titles(), ["Emma", "Dune"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = "Dune Messiah"
+            self.book.save()
+        self.assertEqual(self.titles(), ["Emma", "Dune Messiah"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+        self.assertEqual(self.titles(), ["Emma"])
+
+    def test_owner_rename_invalidates_but_a_login_does_not(self):
+        usernames = lambda: [row["owner_username"] for row in APIClient().get("/api/books/").json()["results"]]
+        self.assertEqual(usernames(), ["lister"])
+        generation = get_query_cache().generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.save(update_fields=["last_login"])
+        self.assertEqual(get_query_cache().generation(), generation)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.username = "renamed"
+            self.owner.save()
+        self.assertEqual(usernames(), ["renamed"])
+
+
+@override_settings(BOOKS_SYNC_LAG_SECONDS=0, BOOKS_TOMBSTONE_RETENTION_DAYS=90, BOOKS_TASKS_MODE="sync")
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.started = (timezone.now() - timedelta(seconds=1)).isoformat()
+        self.owner = get_user_model().objects.create_user("syncer")
+        self.kept, self.hidden, self.gone = (
+            Book.objects.create(owner=self.owner, title=title, location="Kyiv") for title in ("Kept", "Hidden", "Gone")
+        )
+
+    def sync(self, **params):
+        resp = APIClient().get("/api/books/changes/", params)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.json()
+
+    def test_updates_deactivations_and_tombstones_then_resume_from_the_cursor(self):
+        self.hidden.is_active = False
+        self.hidden.save()
+        gone_id = self.gone.pk
+        self.gone.delete()
+        self.assertTrue(BookTombstone.objects.filter(book_id=gone_id).exists())
+
+        body = self.sync(updated_since=self.started)
+        self.assertIsNone(body["next"])
+        self.assertEqual([row["id"] for row in body["results"]], [self.kept.pk])
+        self.assertEqual(sorted((d["id"], d["reason"]) for d in body["deleted"]),
+                         sorted([(self.hidden.pk, "deactivated"), (gone_id, "deleted")]))
+
+        kept_id = self.kept.pk
+        self.kept.delete()
+        again = self.sync(cursor=body["cursor"])
+        self.assertEqual(again["results"], [])
+        self.assertEqual([(d["id"], d["reason"]) for d in again["deleted"]], [(kept_id, "deleted")])
+
+    def test_pages_follow_next_until_caught_up(self):
+        ids = {self.kept.pk, self.hidden.pk, self.gone.pk}
+        for book in (self.kept, self.hidden):
+            book.delete()
+        seen, pages = set(), 0
+        body = self.sync(updated_since=self.started, page_size=2)
+        while True:
+            pages += 1
+            seen |= {row["id"] for row in body["results"]} | {d["id"] for d in body["deleted"]}
+            if body["next"] is None:
+                break
+            body = APIClient().get(body["next"]).json()
+        self.assertEqual(seen, ids)
+        self.assertGreater(pages, 1)
+
+    def test_start_past_retention_is_410(self):
+        old = timezone.now() - timedelta(days=91)
+        resp = APIClient().get("/api/books/changes/", {"updated_since": old.isoformat()})
+        self.assertEqual(resp.status_code, 410)
+        self.assertIn("re-download", resp.json()["detail"])
+        resp = APIClient().get("/api/books/changes/", {"cursor": encode_cursor((old, 0), (old, 0))})
+        self.assertEqual(resp.status_code, 410)
+        with override_settings(BOOKS_TOMBSTONE_RETENTION_DAYS=100):
+            self.assertEqual(APIClient().get("/api/books/changes/", {"updated_since": old.isoformat()}).status_code, 200)
+
+
+@override_settings(BOOKS_IMPORT_BATCH_SIZE=2, BOOKS_TASKS_MODE="sync")
+class BookImportTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user("partner"))
+
+    def post(self, body: str, content_type="text/csv"):
+        return self.api.post("/api/books/import/", body.encode(), content_type=content_type)
+
+    def test_rows_go_in_batches_of_the_configured_size(self):
+        body = "title,author,location\n" + "".join(f"Book {i},Author {i % 2},Kyiv\n" for i in range(5))
+        with mock.patch.object(BookQuerySet, "bulk_create", autospec=True,
+                               side_effect=BookQuerySet.bulk_create) as bulk_create:
+            resp = self.post(body)
+        self.assertEqual(resp.json(), {"created": 5, "failed": 0, "errors": [], "errors_truncated": False})
+        self.assertEqual([len(call.args[1]) for call in bulk_create.call_args_list], [2, 2, 1])
+        self.assertEqual(BookFacet.objects.get(facet=BookFacet.LOCATION, key="kyiv").count, 5)
+
+    def test_csv_errors_carry_file_line_numbers(self):
+        body = (
+            "title,location,description\n"          # 1
+            "Dune,Kyiv,ok\n"                         # 2
+            "Emma,,no location\n"                    # 3
+            'Persuasion,Lviv,"two\nline note"\n'    # 4-5: one record
+            "Too,many,cells,here\n"                  # 6
+            "\n"                                     # 7: blank, skipped
+            ",Odesa,no title\n"                      # 8
+        )
+        body = self.post(body).json()
+        self.assertEqual((body["created"], body["failed"]), (2, 3))
+        self.assertEqual([(e["line"], sorted(e["errors"])) for e in body["errors"]],
+                         [(3, ["location"]), (6, ["non_field_errors"]), (8, ["title"])])
+        self.assertEqual(Book.objects.get(title="Persuasion").description, "two\nline note")
+
+    def test_ndjson_errors_carry_file_line_numbers(self):
+        body = '{"title": "Dune", "location": "Kyiv"}\n{not json\n\n["an", "array"]\n{"title": "Emma"}\n'
+        body = self.post(body, "application/x-ndjson").json()
+        self.assertEqual(body["created"], 1)
+        self.assertEqual([e["line"] for e in body["errors"]], [2, 4, 5])
+
+    def test_bad_header_is_rejected_before_any_row_is_written(self):
+        for body in ("title,author\nDune,Frank Herbert\n", "", '"title,location\nDune,Kyiv\n'):
+            with self.subTest(body=body):
+                resp = self.post(body)
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn("detail", resp.json())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(BookFacet.objects.exists())
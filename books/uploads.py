@@ -0,0 +1,236 @@
+
+"""Streaming upload path for Book.image.
+
+`StreamingImageUploadHandler` sits first in `request.upload_handlers` and takes
+over the `image` part of a multipart body:
+
+- the first bytes must parse as an image header (Pillow reads headers lazily),
+  otherwise the upload is rejected before anything is stored;
+- chunks go straight into the storage backend: an exclusive file under
+  MEDIA_ROOT, or an S3 multipart upload with one part buffered at a time;
+- more than `BOOK_IMAGE_MAX_BYTES` aborts the write mid-stream.
+
+The handler returns a `StoredUpload` (already in storage), which the serializer
+turns into a plain file name, so the model does not copy it a second time.
+"""
+import io
+import os
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+ALLOWED_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+HEADER_LIMIT = 512 * 1024  # give up identifying the format after this many bytes
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Request body too large."
+    default_code = "request_too_large"
+
+
+class ImageUploadRejected(MultiPartParserError):
+    """Raised mid-stream; DRF's MultiPartParser turns it into a 400."""
+
+
+def max_image_bytes() -> int:
+    return getattr(settings, "BOOK_IMAGE_MAX_BYTES", 10 * 1024 * 1024)
+
+
+class FileSystemSink:
+    def __init__(self, storage: FileSystemStorage, name: str, max_length: Optional[int] = None):
+        self.storage = storage
+        while True:
+            name = storage.get_available_name(name, max_length=max_length)
+            path = storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+                break
+            except FileExistsError:
+                continue  # lost a race for this name, pick another
+        self.name, self.path = name, path
+
+    def write(self, data: bytes) -> None:
+        os.write(self.fd, data)
+
+    def close(self) -> str:
+        os.close(self.fd)
+        if self.storage.file_permissions_mode is not None:
+            os.chmod(self.path, self.storage.file_permissions_mode)
+        return self.name
+
+    def abort(self) -> None:
+        os.close(self.fd)
+        os.remove(self.path)
+
+
+class S3MultipartSink:
+    """S3 multipart upload holding at most one part (>= 5 MiB) in memory."""
+
+    def __init__(self, storage, name: str, content_type: str, max_length: Optional[int] = None):
+        self.storage = storage
+        self.name = storage.get_available_name(name, max_length=max_length)
+        self.key = storage._normalize_name(self.name)
+        self.client = storage.connection.meta.client
+        self.bucket = storage.bucket_name
+        self.part_size = max(getattr(settings, "BOOK_IMAGE_S3_PART_SIZE", 8 * 1024 * 1024), 5 * 1024 * 1024)
+        params = storage.get_object_parameters(self.name)
+        params.setdefault("ContentType", content_type)
+        if "ACL" not in params and storage.default_acl:
+            params["ACL"] = storage.default_acl
+        self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **params)["UploadId"]
+        self.parts: List[dict] = []
+        self.buffer = bytearray()
+
+    def _flush(self) -> None:
+        number = len(self.parts) + 1
+        resp = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=self.buffer,
+        )
+        self.parts.append({"ETag": resp["ETag"], "PartNumber": number})
+        self.buffer.clear()
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) >= self.part_size:
+            self._flush()
+
+    def close(self) -> str:
+        if self.buffer or not self.parts:
+            self._flush()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts},
+        )
+        return self.name
+
+    def abort(self) -> None:
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+def open_sink(storage, name: str, content_type: str, max_length: Optional[int] = None):
+    if isinstance(storage, FileSystemStorage):
+        return FileSystemSink(storage, name, max_length)
+    if hasattr(storage, "bucket_name") and hasattr(storage, "connection"):
+        return S3MultipartSink(storage, name, content_type, max_length)
+    return None
+
+
+class StoredUpload(UploadedFile):
+    """An upload that is already in storage under `name`."""
+
+    def __init__(self, name: str, content_type: str, size: int, width: int, height: int):
+        super().__init__(file=io.BytesIO(), name=name, content_type=content_type, size=size)
+        self.stored_name = name
+        self.width, self.height = width, height
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    field_name = "image"
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        from .models import Book
+
+        self.model_field = Book._meta.get_field(self.field_name)
+        self.max_bytes = max_image_bytes()
+        self.active = False
+        self.sink = None
+        self.stored: List[StoredUpload] = []
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.active = field_name == self.field_name
+        self.sink = None
+        self.header = bytearray()
+        self.size = 0
+        self.image_info = None
+
+    def _reject(self, message: str):
+        self.abort()
+        raise ImageUploadRejected(message)
+
+    def _open(self, data: bytes, final: bool = False) -> Optional[bytes]:
+        """Buffer until the image header parses, then open the sink and hand back the buffer."""
+        self.header += data
+        try:
+            img = Image.open(io.BytesIO(bytes(self.header)))
+        except Image.DecompressionBombError:
+            self._reject("Image dimensions are too large.")
+        except (OSError, SyntaxError):
+            if len(self.header) < HEADER_LIMIT and not final:
+                return None
+            self._reject("Upload is not a supported image.")
+        if img.format not in ALLOWED_FORMATS:
+            self._reject(f"Unsupported image type {img.format}.")
+        if Image.MAX_IMAGE_PIXELS and img.width * img.height > Image.MAX_IMAGE_PIXELS:
+            self._reject("Image dimensions are too large.")
+        self.image_info = (ALLOWED_FORMATS[img.format], img.width, img.height)
+        field = self.model_field
+        name = field.generate_filename(None, self.file_name)
+        self.sink = open_sink(field.storage, name, self.image_info[0], field.max_length)
+        if self.sink is None:
+            self._reject("Storage backend does not support streaming uploads.")
+        buffered, self.header = bytes(self.header), bytearray()
+        return buffered
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        self.size += len(raw_data)
+        if self.size > self.max_bytes:
+            self._reject(f"Image exceeds {self.max_bytes} bytes.")
+        if self.sink is None:
+            raw_data = self._open(raw_data)
+            if raw_data is None:
+                return None
+        self.sink.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        if self.sink is None:  # the whole file fit in the header buffer
+            buffered = self._open(b"", final=True)
+            self.sink.write(buffered)
+        name = self.sink.close()
+        self.sink = None
+        content_type, width, height = self.image_info
+        upload = StoredUpload(name, content_type, file_size, width, height)
+        self.stored.append(upload)
+        return upload
+
+    def abort(self) -> None:
+        if self.sink is not None:
+            sink, self.sink = self.sink, None
+            sink.abort()
+
+    def upload_interrupted(self):
+        self.abort()
+
+    def release(self, keep: bool) -> None:
+        """End of request: abort a half-written upload; drop stored files unless the write succeeded."""
+        self.abort()
+        if not keep:
+            for upload in self.stored:
+                self.model_field.storage.delete(upload.stored_name)
+        self.stored = []
+
+
+def install_handler(request) -> None:
+    if getattr(settings, "BOOK_IMAGE_STREAMING_UPLOADS", True) and request.method in ("POST", "PUT", "PATCH"):
+        request.upload_handlers.insert(0, StreamingImageUploadHandler(request))
+
+
+def release_handlers(request, keep: bool) -> None:
+    for handler in getattr(request, "_upload_handlers", []):
+        if isinstance(handler, StreamingImageUploadHandler):
+            handler.release(keep)
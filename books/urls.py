@@ -1,12 +1,16 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, AIAdviceView
+from .views import BookViewSet, AIAdviceView, AsyncAIAdviceView, AIBatchAdviceView, BookFeedView, BookImportView
 
 router = DefaultRouter()
 router.register(r"books", BookViewSet, basename="book")
 
 urlpatterns = [
+    path("books/feed/", BookFeedView.as_view(), name="book-feed"),
+    path("books/import/", BookImportView.as_view(), name="book-import"),
     path("", include(router.urls)),
     path("ai/books/advice/", AIAdviceView.as_view(), name="ai-books-advice"),
+    path("ai/books/advice/async/", AsyncAIAdviceView.as_view(), name="ai-books-advice-async"),
+    path("ai/books/advice/batch/", AIBatchAdviceView.as_view(), name="ai-books-advice-batch"),
 ]
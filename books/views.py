@@ -1,10 +1,23 @@
 
+import asyncio
+import json
+import logging
+import math
 from typing import List
-from django.db.models import Q
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly,AllowAny
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly,AllowAny
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 from drf_spectacular.utils import (
@@ -14,9 +27,29 @@ from drf_spectacular.utils import (
 from .models import Book
 from .serializers import (
     BookSerializer,
+    BookReadSerializer,
     AIAdviceResponseSerializer,
 )
-from .ai import get_ai_advice
+from .admission import AIQuotaThrottle, admission_gauges, caller_key, get_limiter, take_quota
+from .ai import _error_advice, aget_ai_advice, get_ai_advice
+from .ai_cache import normalize_prompt
+from .aio import iterate_in_thread, run_db
+from .instrumentation import REGISTRY, cache_gauges
+from .facets import matching_counts, top_counts
+from .exports import CONTENT_TYPES as EXPORT_CONTENT_TYPES, export_chunks
+from .imports import CONTENT_TYPES, BookImport, ImportRejected, read_rows
+from .feed import FeedFilter, FeedFull, feed_gauges, get_hub, sse_body, start_listening
+from .conditional import detail_validators, list_validators, respond_conditionally
+from .query_cache import get_query_cache
+from .pagination import KeysetPagination
+from .search import bounded_terms, canonical, get_search_backend
+from .similar import get_ai_matcher, similar_books
+from .sync import DeltaFeed
+from .uploads import RequestTooLarge, install_handler, max_image_bytes, release_handlers
+
+logger = logging.getLogger(__name__)
+
+PROMPT_REQUIRED = "Provide a 'prompt' in query (?prompt=) or POST JSON body."
 
 def _split_params(values) -> List[str]:
     """Accepts repeated params or comma-separated; returns cleaned list."""
@@ -41,7 +74,7 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
         summary="List books (ads)",
         description=(
             "Public list of active ads. Filters:"
-            "\n- ?q= full-text (title/author/description)"
+            "\n- ?q= full-text (title/author/description), ranked by relevance"
             "\n- ?titles= (repeat or comma-separated)"
             "\n- ?authors= (repeat or comma-separated)"
         ),
@@ -64,29 +97,98 @@ class BookViewSet(viewsets.ModelViewSet):
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     parser_classes = (MultiPartParser, FormParser, JSONParser) 
+
+    def initialize_request(self, request, *args, **kwargs):
+        install_handler(request)
+        return super().initialize_request(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        response = None
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            return response
+        finally:
+            release_handlers(request, keep=response is not None and response.status_code < 400)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # reject before reading the body; the handler still enforces the limit on the actual bytes
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        if length > max_image_bytes() + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise RequestTooLarge()
+
+    def perform_content_negotiation(self, request, force=False):
+        # export writes its own format: an Accept of text/csv must not turn into a 406
+        return super().perform_content_negotiation(request, force=force or self.action == "export")
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        cache = get_query_cache()
+        key = cache.key_for(request) if cache else None
+        entry = cache.get(key) if cache else None
+        if entry is not None:
+            return respond_conditionally(request, entry["validators"], lambda: Response(entry["data"]))
+
+        queryset = self.filter_queryset(self.get_queryset())
+        validators = list_validators(request, queryset)
+
+        def render():
+            reader = BookReadSerializer(request)
+            rows = reader.rows(queryset)
+            page = self.paginate_queryset(rows)
+            if page is None:
+                response = Response(reader.many(rows))
+            else:
+                response = self.get_paginated_response(reader.many(page))
+            if cache and response.status_code == 200:
+                cache.set(key, {"validators": validators, "data": response.data})
+            return response
+
+        return respond_conditionally(request, validators, render)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return respond_conditionally(
+            request, detail_validators(request, instance), lambda: Response(self.get_serializer(instance).data)
+        )
+
     def get_queryset(self):
         qs = super().get_queryset()
-        q = self.request.query_params.get("q", "").strip()
-        titles = _split_params(self.request.query_params.getlist("titles"))
-        authors = _split_params(self.request.query_params.getlist("authors"))
-
-        cond = Q()
-        if q:
-            cond &= (Q(title__icontains=q) | Q(author__icontains=q) | Q(description__icontains=q))
-        if titles:
-            t_q = Q()
-            for t in titles:
-                t_q |= Q(title__icontains=t)
-            cond &= t_q
-        if authors:
-            a_q = Q()
-            for a in authors:
-                a_q |= Q(author__icontains=a)
-            cond &= a_q
-
-        if cond:
-            qs = qs.filter(cond).distinct()
-        return qs
+        params = self.request.query_params
+        locations = sorted({canonical(v) for v in params.getlist("location")} - {""})
+        if locations:
+            qs = qs.filter(location_key__in=locations)
+        return get_search_backend().search(
+            qs,
+            q=params.get("q", "").strip(),
+            titles=_split_params(params.getlist("titles")),
+            authors=_split_params(params.getlist("authors")),
+        )
+
+    @extend_schema(
+        tags=["Books"],
+        summary="Changes since a point in time (delta sync)",
+        description=(
+            "First sync: `?updated_since=<ISO 8601>`; afterwards pass back `cursor`."
+            " `results` are created/updated ads, `deleted` lists removed or deactivated ids."
+            " Follow `next` until it is null, then store `cursor`. 410 = re-download the list."
+        ),
+        parameters=[
+            OpenApiParameter("updated_since", OpenApiTypes.DATETIME, required=False, description="First sync start"),
+            OpenApiParameter("cursor", OpenApiTypes.STR, required=False, description="Token from the last response"),
+            OpenApiParameter("page_size", OpenApiTypes.INT, required=False),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=["get"], url_path="changes", pagination_class=None)
+    def changes(self, request, *args, **kwargs):
+        feed = DeltaFeed(request, KeysetPagination().get_page_size(request))
+        return Response(feed.page())
 
     @extend_schema(
         tags=["Books"],
@@ -100,12 +202,117 @@ class BookViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=["get"], url_path="search")
     def search(self, request, *args, **kwargs):
-        qs = self.get_queryset()
-        page = self.paginate_queryset(qs)
-        ser = self.get_serializer(page or qs, many=True, context={"request": request})
-        if page is not None:
-            return self.get_paginated_response(ser.data)
-        return Response(ser.data)
+        return self.list(request, *args, **kwargs)
+
+    @extend_schema(
+        tags=["Books"],
+        summary="Ad counts per location and per author (same filters as list)",
+        description=(
+            "`locations` and `authors`: `[{key, label, count}]`, most ads first. Pass a `key`"
+            " (or any spelling of a location) back as `?location=` on the list."
+        ),
+        parameters=[
+            OpenApiParameter("q", OpenApiTypes.STR, required=False),
+            OpenApiParameter("titles", OpenApiTypes.STR, required=False, many=True),
+            OpenApiParameter("authors", OpenApiTypes.STR, required=False, many=True),
+            OpenApiParameter("location", OpenApiTypes.STR, required=False, many=True),
+            OpenApiParameter("limit", OpenApiTypes.INT, required=False, description="Values per facet (default 20, max 100)"),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=["get"], url_path="facets", pagination_class=None)
+    def facets(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        if not any(request.query_params.get(p, "").strip() for p in ("q", "titles", "authors", "location")):
+            return Response(top_counts(limit))  # precomputed counters, no scan
+        cache = get_query_cache()
+        key = cache.key_for(request) if cache else None
+        data = cache.get(key) if cache else None
+        if data is None:
+            data = matching_counts(self.get_queryset(), limit)
+            if cache:
+                cache.set(key, data)
+        return Response(data)
+
+    @extend_schema(
+        tags=["Books"],
+        summary="Ads most like this one (title, author, description)",
+        description=(
+            "`results`: active ads in the list's item shape plus `score` (cosine similarity, 0-1),"
+            " best first. 503 with `Retry-After` until this server has a similarity index"
+            " (`manage.py rebuild_similar` builds it)."
+        ),
+        parameters=[
+            OpenApiParameter("limit", OpenApiTypes.INT, required=False, description="Default 10, max 50"),
+        ],
+        responses={200: OpenApiTypes.OBJECT, 503: OpenApiTypes.OBJECT},
+    )
+    @action(detail=True, methods=["get"], url_path="similar", pagination_class=None)
+    def similar(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return Response({"results": similar_books(self.get_object(), limit, request)})
+
+    @extend_schema(
+        tags=["Books"],
+        summary="Stream every matching ad as NDJSON or CSV (same filters as list)",
+        description=(
+            "Not paginated: one line per ad, list order. NDJSON lines have the list's item shape;"
+            " CSV has a header row and can be fed back to `/api/books/import/`."
+        ),
+        parameters=[
+            OpenApiParameter("output", OpenApiTypes.STR, required=False, enum=["ndjson", "csv"], description="Default ndjson"),
+            OpenApiParameter("q", OpenApiTypes.STR, required=False),
+            OpenApiParameter("titles", OpenApiTypes.STR, required=False, many=True),
+            OpenApiParameter("authors", OpenApiTypes.STR, required=False, many=True),
+            OpenApiParameter("location", OpenApiTypes.STR, required=False, many=True),
+        ],
+        responses={(200, "application/x-ndjson"): OpenApiTypes.STR, (200, "text/csv"): OpenApiTypes.STR},
+    )
+    @action(detail=False, methods=["get"], url_path="export", pagination_class=None)
+    def export(self, request, *args, **kwargs):
+        fmt = request.query_params.get("output", "ndjson")
+        if fmt not in EXPORT_CONTENT_TYPES:
+            return Response({"detail": f"output must be one of: {', '.join(EXPORT_CONTENT_TYPES)}."}, status=400)
+        chunks = export_chunks(self.filter_queryset(self.get_queryset()), fmt, request)
+        if isinstance(request._request, ASGIRequest):
+            chunks = iterate_in_thread(chunks)  # else Django buffers the whole export first
+        response = StreamingHttpResponse(chunks, content_type=EXPORT_CONTENT_TYPES[fmt])
+        response["Content-Disposition"] = f'attachment; filename="books.{fmt}"'
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+@extend_schema(
+    tags=["Books"],
+    summary="Bulk import ads from a CSV or NDJSON file",
+    description=(
+        "Send the file as the request body (`Content-Type: text/csv` with a header row, or"
+        " `application/x-ndjson`, one object per line) with the create fields; title and location"
+        " are required. Rows are owned by the caller. Returns `created`, `failed` and per-row"
+        " `errors` (`[{line, errors}]`); invalid rows don't stop the import."
+    ),
+    request={"text/csv": OpenApiTypes.BINARY, "application/x-ndjson": OpenApiTypes.BINARY},
+    responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT, 415: OpenApiTypes.OBJECT},
+)
+class BookImportView(APIView):
+    """Reads the body as a stream (books.imports); never goes through request.data."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        fmt = CONTENT_TYPES.get(request._request.content_type)
+        if fmt is None:
+            return Response({"detail": f"Content-Type must be one of: {', '.join(CONTENT_TYPES)}."}, status=415)
+        try:
+            rows = read_rows(request.stream, fmt)
+        except ImportRejected as exc:
+            return Response({"detail": str(exc)}, status=400)
+        return Response(BookImport(request.user).run(rows).summary())
 
 
 @extend_schema(
@@ -114,6 +321,8 @@ class BookViewSet(viewsets.ModelViewSet):
     description=(
         "Send a natural-language `prompt`. Returns: `ai`, `matched_books`, and `filter_query`"
         " for frontend redirect to `/api/books/?titles=...&authors=...`."
+        " 429 with `Retry-After` past the caller's quota (or while the model is saturated,"
+        " with `AI_SHED_RESPONSE=429`)."
     ),
     parameters=[
         OpenApiParameter("prompt", OpenApiTypes.STR, location=OpenApiParameter.QUERY, required=False,
@@ -123,37 +332,78 @@ class BookViewSet(viewsets.ModelViewSet):
 )
 class AIAdviceView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    throttle_classes = [AIQuotaThrottle]
+
+    # model output is untrusted: bound what it can turn into SQL
+    MAX_TOPICS = 8
+    MAX_SUGGESTIONS = 8
+    MAX_RESULTS = 50
+
+    @staticmethod
+    def _unique(values, limit: int) -> List[str]:
+        out: List[str] = []
+        seen = set()
+        for v in values:
+            v = v.strip() if isinstance(v, str) else ""
+            if v and v.casefold() not in seen:
+                seen.add(v.casefold())
+                out.append(v)
+        return out[:limit]
+
+    def _terms(self, data):
+        suggestions = [s for s in (data.get("suggested_books") or [])[: self.MAX_SUGGESTIONS] if isinstance(s, dict)]
+        topics = self._unique(data.get("topics") or [], self.MAX_TOPICS)
+        titles = self._unique((s.get("title") for s in suggestions), self.MAX_SUGGESTIONS)
+        authors = self._unique((s.get("author") for s in suggestions), self.MAX_SUGGESTIONS)
+
+        terms = bounded_terms(
+            [("title", t) for t in titles] + [("author", a) for a in authors] + [(None, t) for t in topics],
+            limit=self.MAX_TOPICS + 2 * self.MAX_SUGGESTIONS,
+        )
+        return terms, titles, authors
 
     def _match(self, data):
-        topics = [t.lower() for t in data.get("topics", [])]
-        suggestions = data.get("suggested_books", [])
-
-        q_objects = Q()
-        titles: List[str] = []
-        authors: List[str] = []
-
-        for t in topics:
-            q_objects |= Q(title__icontains=t) | Q(description__icontains=t) | Q(author__icontains=t)
-        for s in suggestions:
-            title = (s.get("title") or "").strip()
-            author = (s.get("author") or "").strip()
-            if title:
-                q_objects |= Q(title__icontains=title)
-                titles.append(title)
-            if author:
-                q_objects |= Q(author__icontains=author)
-                authors.append(author)
-
-        matched = Book.objects.filter(is_active=True).filter(q_objects).distinct()[:50]
-        return matched, titles, authors
+        terms, titles, authors = self._terms(data)
+        qs = Book.objects.filter(is_active=True).select_related("owner")
+        if terms:
+            # one ranked query: books hitting more (and rarer) terms come first (or nearest, BOOKS_AI_MATCH=similar)
+            qs = get_ai_matcher().match_any(qs, terms)
+        return qs[: self.MAX_RESULTS], titles, authors
+
+    def _payload(self, data):
+        matched, titles, authors = self._match(data)
+        reader = BookReadSerializer()
+        matched_books = reader.many(reader.rows(matched))
+        return {"ai": data, "matched_books": matched_books, "filter_query": {"titles": titles, "authors": authors}}
+
+    def _payloads(self, advice: List[dict]) -> List[dict]:
+        """`_payload` for each advice dict: one ranked query for all of them, then one row fetch."""
+        parsed = [self._terms(data) for data in advice]
+        active = Book.objects.filter(is_active=True)
+        ranked = get_ai_matcher().match_many(active, [terms for terms, _, _ in parsed], self.MAX_RESULTS)
+        if not all(terms for terms, _, _ in parsed):
+            latest = list(active.values_list("id", flat=True)[: self.MAX_RESULTS])
+            ranked = [ids if terms else latest for ids, (terms, _, _) in zip(ranked, parsed)]
+
+        reader = BookReadSerializer()
+        wanted = sorted({pk for ids in ranked for pk in ids})
+        books = {}
+        for start in range(0, len(wanted), 1000):  # under every backend's bound-parameter limit
+            rows = reader.rows(active.filter(id__in=wanted[start:start + 1000]).order_by())
+            books.update((book["id"], book) for book in reader.many(rows))
+        return [
+            {
+                "ai": data,
+                "matched_books": [books[pk] for pk in ids if pk in books],
+                "filter_query": {"titles": titles, "authors": authors},
+            }
+            for data, ids, (_, titles, authors) in zip(advice, ranked, parsed)
+        ]
 
     def _respond(self, prompt: str):
         if not prompt:
-            return Response({"detail": "Provide a 'prompt' in query (?prompt=) or POST JSON body."}, status=400)
-        data = get_ai_advice(prompt)
-        matched, titles, authors = self._match(data)
-        ser = BookSerializer(matched, many=True, context={"request": None})
-        return Response({"ai": data, "matched_books": ser.data, "filter_query": {"titles": titles, "authors": authors}})
+            return Response({"detail": PROMPT_REQUIRED}, status=400)
+        return Response(self._payload(get_ai_advice(prompt)))
 
     def get(self, request, *args, **kwargs):
         prompt = request.query_params.get("prompt", "").strip()
@@ -164,6 +414,209 @@ class AIAdviceView(APIView):
         return self._respond(prompt)
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAIAdviceView(View):
+    """ASGI variant of AIAdviceView with the same payload (serve through bookx.asgi).
+
+    The model call is awaited and matching runs on the bounded DB pool, so a slow
+    upstream holds a coroutine instead of a worker. A client disconnect cancels
+    the view and drops its queued work.
+    """
+    http_method_names = ["get", "post"]
+
+    @staticmethod
+    def _authenticate(request):
+        for auth_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            result = auth_class().authenticate(request)
+            if result is not None:
+                return result[0]
+        return None
+
+    @classmethod
+    def _admit(cls, request, authenticate: bool, required: bool = False):
+        """(user, seconds until the caller's AI quota allows a call, 0 = now); blocking, so run on the DB pool.
+
+        A missing `required` user takes no quota: the caller answers 401 first, as DRF does.
+        """
+        user = cls._authenticate(request) if authenticate else None
+        if required and user is None:
+            return None, 0.0
+        return user, take_quota(caller_key(request, user))
+
+    @staticmethod
+    def _throttled(exc: Throttled):
+        response = JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+        response["Retry-After"] = str(exc.wait)
+        return response
+
+    async def _respond(self, request, prompt: str, wait: float):
+        if wait:
+            return self._throttled(Throttled(wait=math.ceil(wait)))
+        if not prompt:
+            return JsonResponse({"detail": PROMPT_REQUIRED}, status=400)
+        try:
+            data = await aget_ai_advice(prompt)
+            return JsonResponse(await run_db(AIAdviceView()._payload, data))
+        except Throttled as e:
+            return self._throttled(e)
+        except asyncio.CancelledError:
+            logger.info("AI advice request cancelled by client disconnect")
+            raise
+
+    async def get(self, request, *args, **kwargs):
+        # like the sync view: a token is optional on GET, but a bad one fails
+        try:
+            _, wait = await run_db(self._admit, request, "HTTP_AUTHORIZATION" in request.META)
+        except AuthenticationFailed as e:
+            data = e.detail if isinstance(e.detail, (dict, list)) else {"detail": e.detail}
+            return JsonResponse(data, status=e.status_code, safe=False)
+        return await self._respond(request, request.GET.get("prompt", "").strip(), wait)
+
+    async def post(self, request, *args, **kwargs):
+        # same rule as IsAuthenticatedOrReadOnly on the sync view
+        try:
+            user, wait = await run_db(self._admit, request, True, True)
+        except AuthenticationFailed as e:
+            data = e.detail if isinstance(e.detail, (dict, list)) else {"detail": e.detail}
+            return JsonResponse(data, status=e.status_code, safe=False)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        try:
+            body = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"detail": "Invalid JSON body."}, status=400)
+        prompt = body.get("prompt", "") if isinstance(body, dict) else ""
+        return await self._respond(request, str(prompt).strip(), wait)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AIBatchAdviceView(View):
+    """Advice for many prompts in one request, streamed as NDJSON (serve through bookx.asgi).
+
+    POST `{"prompts": [...]}` (authenticated). Prompts that normalize the same
+    (books.ai_cache) share one model call; at most `AI_BATCH_CONCURRENCY`
+    calls are in flight. Whatever advice is ready is matched in one ranked
+    query, so each line `{"index", "prompt", "ai", "matched_books",
+    "filter_query"}` is written as soon as its prompt is done, in completion
+    order. A failed item gets the safe empty advice instead of failing the batch.
+    Under WSGI the same body is buffered until the last item.
+
+    A batch takes one token of the caller's AI quota. Its model calls go
+    through the per-process limiter but are never shed: at most
+    `AI_MAX_CONCURRENCY` of them are in flight, each waiting for a slot behind
+    any queued interactive request.
+    """
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            user, wait = await run_db(AsyncAIAdviceView._admit, request, True, True)
+        except AuthenticationFailed as e:
+            data = e.detail if isinstance(e.detail, (dict, list)) else {"detail": e.detail}
+            return JsonResponse(data, status=e.status_code, safe=False)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        if wait:
+            return AsyncAIAdviceView._throttled(Throttled(wait=math.ceil(wait)))
+        try:
+            body = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"detail": "Invalid JSON body."}, status=400)
+        prompts = body.get("prompts") if isinstance(body, dict) else None
+        limit = getattr(settings, "AI_BATCH_MAX_PROMPTS", 1000)
+        if not isinstance(prompts, list) or not prompts:
+            return JsonResponse({"detail": "Provide a non-empty 'prompts' list in the JSON body."}, status=400)
+        if len(prompts) > limit:
+            return JsonResponse({"detail": f"At most {limit} prompts per batch."}, status=400)
+        prompts = [p.strip() if isinstance(p, str) else "" for p in prompts]
+        invalid = [i for i, p in enumerate(prompts) if not p]
+        if invalid:
+            return JsonResponse({"detail": "Every prompt must be a non-empty string.", "indexes": invalid}, status=400)
+        response = StreamingHttpResponse(self._stream(prompts), content_type="application/x-ndjson")
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def _stream(self, prompts: List[str]):
+        indexes = {}
+        for i, prompt in enumerate(prompts):
+            indexes.setdefault(normalize_prompt(prompt) or prompt, []).append(i)
+        # more would only park "ai" pool threads on the limiter
+        gate = asyncio.Semaphore(max(1, min(getattr(settings, "AI_BATCH_CONCURRENCY", 8), get_limiter().limit)))
+
+        async def advise(key):
+            prompt = prompts[indexes[key][0]]
+            async with gate:
+                try:
+                    return key, await aget_ai_advice(prompt, wait_for_slot=True)
+                except Exception as e:
+                    logger.warning("batch advice failed for one prompt: %r", e)
+                    return key, _error_advice(prompt, e)
+
+        view = AIAdviceView()
+        pending = {asyncio.ensure_future(advise(key)) for key in indexes}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # everything that finished while the last wave was matched goes into this one
+                ready = [task.result() for task in done]
+                first = [prompts[indexes[key][0]] for key, _ in ready]
+                payloads = await run_db(self._match_wave, view, first, [data for _, data in ready])
+                lines = []
+                for (key, _), payload in zip(ready, payloads):
+                    for i in indexes[key]:
+                        lines.append(json.dumps({"index": i, "prompt": prompts[i], **payload}, cls=DjangoJSONEncoder))
+                yield "\n".join(lines) + "\n"
+        except asyncio.CancelledError:
+            logger.info("AI batch request cancelled by client disconnect")
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _match_wave(view: AIAdviceView, prompts: List[str], advice: List[dict]) -> List[dict]:
+        try:
+            return view._payloads(advice)
+        except Exception:
+            logger.exception("combined AI match failed; matching the batch items one by one")
+        payloads = []
+        for prompt, data in zip(prompts, advice):
+            try:
+                payloads.append(view._payload(data))
+            except Exception as e:
+                logger.warning("AI match failed for one batch item: %r", e)
+                payloads.append(view._payload(_error_advice(prompt, e)))
+        return payloads
+
+
+class BookFeedView(View):
+    """Server-Sent Events stream of committed Book changes (books.feed), same filters as the list.
+
+    Needs the ASGI app: under WSGI each open stream would pin a worker.
+    """
+    http_method_names = ["get"]
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"detail": "The live feed is only served by bookx.asgi."}, status=400)
+        hub = get_hub()
+        try:
+            sub = hub.subscribe(FeedFilter.from_params(request.GET))
+        except FeedFull:
+            response = JsonResponse({"detail": "Too many live feed connections; retry later."}, status=503)
+            response["Retry-After"] = "30"
+            return response
+        try:
+            start_listening()  # this process subscribes to the Redis channel from its first client on
+        except Exception:
+            hub.unsubscribe(sub)
+            raise
+        response = StreamingHttpResponse(sse_body(hub, sub), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+        return response
+
+
 class HealthView(APIView):
     """Simple health-check endpoint for deployment sanity."""
     authentication_classes = []
@@ -171,3 +624,14 @@ class HealthView(APIView):
 
     def get(self, request, *args, **kwargs):
         return Response({"status": "ok"})
+
+
+class MetricsView(View):
+    """Prometheus text exposition of this process's request metrics (books.instrumentation)."""
+
+    def get(self, request, *args, **kwargs):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        if token and request.headers.get("Authorization", "") != f"Bearer {token}":
+            return HttpResponse(status=401)
+        body = REGISTRY.render({**cache_gauges(), **feed_gauges(), **admission_gauges()})
+        return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,16 @@
-
 import os
 from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE','bookx.settings')
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from books.feed import WS_PATH, websocket_app  # noqa: E402  (needs the app registry loaded above)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"] == WS_PATH:
+            return await websocket_app(scope, receive, send)
+        await receive()
+        await send({"type": "websocket.close", "code": 1000})
+        return
+    return await django_application(scope, receive, send)
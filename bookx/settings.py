@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "books.instrumentation.InstrumentationMiddleware",  # first, so it times everything below
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",   # serve static files
@@ -77,6 +78,15 @@ DATABASES = {
     )
 }
 
+# --------------------------------------------------------------------------------------
+# Cache (REDIS_URL = shared across workers; otherwise per-process memory)
+# --------------------------------------------------------------------------------------
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bookx"}}
+
 AUTH_PASSWORD_VALIDATORS = []  # keep simple for now; add validators in production if needed
 
 # --------------------------------------------------------------------------------------
@@ -110,9 +120,34 @@ if os.getenv("AWS_STORAGE_BUCKET_NAME"):
     AWS_S3_SIGNATURE_VERSION = os.getenv("AWS_S3_SIGNATURE_VERSION", "s3v4")
     AWS_QUERYSTRING_AUTH = os.getenv("AWS_QUERYSTRING_AUTH", "False").lower() in {"1", "true", "yes"}
     AWS_S3_OBJECT_PARAMETERS = {"CacheControl": "max-age=86400"}
+    # S3-compatible stand-ins (MinIO, moto server) for local testing
+    AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
+    BOOK_IMAGE_S3_PART_SIZE = int(os.getenv("BOOK_IMAGE_S3_PART_SIZE", str(8 * 1024 * 1024)))
     # If using public media without CloudFront:
     # MEDIA_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com/"
 
+# Streaming image uploads (books/uploads.py)
+BOOK_IMAGE_STREAMING_UPLOADS = os.getenv("BOOK_IMAGE_STREAMING_UPLOADS", "True").lower() in {"1", "true", "yes"}
+BOOK_IMAGE_MAX_BYTES = int(os.getenv("BOOK_IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# Cache-Control max-age (seconds) on book list/detail responses, which also carry ETag/Last-Modified
+BOOKS_HTTP_MAX_AGE = int(os.getenv("BOOKS_HTTP_MAX_AGE", "30"))
+
+# Image derivatives (books/images.py): size name -> longest edge in px
+BOOK_IMAGE_SIZES = {"thumb": 320, "detail": 1280}
+BOOK_IMAGE_STRIP_EXIF = os.getenv("BOOK_IMAGE_STRIP_EXIF", "True").lower() in {"1", "true", "yes"}
+
+# Background jobs (books/tasks.py): "thread" = in-process worker threads, "sync" = inline
+BOOKS_TASKS_MODE = os.getenv("BOOKS_TASKS_MODE", "thread")
+BOOKS_TASKS_WORKERS = int(os.getenv("BOOKS_TASKS_WORKERS", "1"))
+
+# Bulk import (books/imports.py): rows per bulk_create/transaction, per-row errors listed in the response
+BOOKS_IMPORT_BATCH_SIZE = int(os.getenv("BOOKS_IMPORT_BATCH_SIZE", "1000"))
+BOOKS_IMPORT_MAX_ERRORS = int(os.getenv("BOOKS_IMPORT_MAX_ERRORS", "1000"))
+
+# Export (books/exports.py): rows fetched per round trip of the (server-side) cursor
+BOOKS_EXPORT_CHUNK_SIZE = int(os.getenv("BOOKS_EXPORT_CHUNK_SIZE", "500"))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # --------------------------------------------------------------------------------------
@@ -120,12 +155,18 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # --------------------------------------------------------------------------------------
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "books.authentication.CachedJWTAuthentication",  # JWTAuthentication minus the per-request user query
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "books.pagination.KeysetPagination",
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", "20")),
+    "DEFAULT_RENDERER_CLASSES": (
+        "books.instrumentation.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_PARSER_CLASSES": (
         "rest_framework.parsers.JSONParser",
         "rest_framework.parsers.FormParser",
@@ -177,9 +218,16 @@ LOGGING = {
     "disable_existing_loggers": False,
     "formatters": {
         "simple": {"format": "[{levelname}] {message}", "style": "{"},
+        "json": {"format": "{message}", "style": "{"},  # books.requests messages are JSON already
     },
     "handlers": {
         "console": {"class": "logging.StreamHandler", "formatter": "simple"},
+        "requests": {"class": "logging.StreamHandler", "formatter": "json"},
+    },
+    "loggers": {
+        "books.requests": {
+            "handlers": ["requests"], "level": os.getenv("REQUEST_LOG_LEVEL", "INFO"), "propagate": False,
+        },
     },
     "root": {"handlers": ["console"], "level": os.getenv("LOG_LEVEL", "INFO")},
 }
@@ -189,3 +237,80 @@ LOGGING = {
 # --------------------------------------------------------------------------------------
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# Gemini REST client (books/ai.py): one pooled session per process, deadline per call
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "10"))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "3"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "10"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30"))
+
+# Thread pools behind the async advice view (books/aio.py)
+AI_ASYNC_THREADS = int(os.getenv("AI_ASYNC_THREADS", "64"))
+ASYNC_DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", "8"))
+# Batch advice (/api/ai/books/advice/batch/): prompts per request, model calls in flight per request
+AI_BATCH_MAX_PROMPTS = int(os.getenv("AI_BATCH_MAX_PROMPTS", "1000"))
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "8"))
+
+# AI advice cache (books/ai_cache.py). AI_CACHE_ALIAS names a CACHES entry for a shared tier.
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_NEGATIVE_TTL = int(os.getenv("AI_CACHE_NEGATIVE_TTL", "30"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1024"))
+AI_CACHE_ALIAS = os.getenv("AI_CACHE_ALIAS", "")
+
+# AI admission (books/admission.py). Per process: model calls at once, calls waiting for a slot
+# and how long they wait. Under gthread a waiting call holds a request thread, so by default the
+# AI endpoints get at most GUNICORN_THREADS - 1 threads; under uvicorn calls wait on the "ai" pool.
+_AI_ASGI = os.getenv("GUNICORN_WORKER_CLASS", "gthread") == "uvicorn"
+_AI_THREADS = int(os.getenv("GUNICORN_THREADS", "4"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", str(GEMINI_POOL_SIZE if _AI_ASGI else max(1, _AI_THREADS // 2))))
+AI_QUEUE_SIZE = int(os.getenv("AI_QUEUE_SIZE", str(2 * AI_MAX_CONCURRENCY if _AI_ASGI else max(0, _AI_THREADS - 1 - AI_MAX_CONCURRENCY))))
+AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", "2"))
+AI_SHED_RESPONSE = os.getenv("AI_SHED_RESPONSE", "fallback")  # fallback = suggestions with `_warning`; 429 = Retry-After
+# Quota per user (or client IP): token bucket of AI_RATE_BURST, refilled at AI_RATE_PER_MINUTE (0 = off).
+# Store: empty = Redis with REDIS_URL, else per process; or a dotted path to a class with take(key, rate, burst)
+AI_RATE_PER_MINUTE = int(os.getenv("AI_RATE_PER_MINUTE", "30"))
+AI_RATE_BURST = int(os.getenv("AI_RATE_BURST", "10"))
+AI_RATE_STORE = os.getenv("AI_RATE_STORE", "")
+
+# Dotted path to a books.search backend class; empty = pick from the DB vendor
+BOOKS_SEARCH_BACKEND = os.getenv("BOOKS_SEARCH_BACKEND", "")
+
+# List/search result cache (books/query_cache.py); empty alias disables it. Off without Redis: a
+# per-process locmem generation only sees its own worker's writes, so other workers would serve
+# stale pages for up to BOOKS_QUERY_CACHE_TTL. Opt in with BOOKS_QUERY_CACHE_ALIAS=default if that is fine.
+BOOKS_QUERY_CACHE_ALIAS = os.getenv("BOOKS_QUERY_CACHE_ALIAS", "default" if REDIS_URL else "")
+BOOKS_QUERY_CACHE_TTL = int(os.getenv("BOOKS_QUERY_CACHE_TTL", "300" if REDIS_URL else "30"))
+
+# Request instrumentation (books/instrumentation.py), scraped at /api/metrics/
+BOOKS_INSTRUMENTATION = os.getenv("BOOKS_INSTRUMENTATION", "1") == "1"
+BOOKS_N_PLUS_ONE_THRESHOLD = int(os.getenv("BOOKS_N_PLUS_ONE_THRESHOLD", "5"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # if set, /api/metrics/ needs "Authorization: Bearer <token>"
+
+# Principals behind JWTs (books/authentication.py): cached per user id, dropped when the user is saved.
+# Empty = query the user every request. Off without Redis: with per-process locmem a deactivated user
+# would keep working on the other workers for up to BOOKS_AUTH_CACHE_TTL.
+BOOKS_AUTH_CACHE_ALIAS = os.getenv("BOOKS_AUTH_CACHE_ALIAS", "default" if REDIS_URL else "")
+BOOKS_AUTH_CACHE_TTL = int(os.getenv("BOOKS_AUTH_CACHE_TTL", "60"))
+
+# "More like this" index (books/similar.py): memory-mapped files on local disk, one per host, outside the source tree
+BOOKS_SIMILAR_DIR = os.getenv(
+    "BOOKS_SIMILAR_DIR", str(Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "bookx" / "similar")
+)
+# 1 = a web worker that starts without an index builds one in the background; 0 = only `manage.py rebuild_similar`
+BOOKS_SIMILAR_AUTO_BUILD = os.getenv("BOOKS_SIMILAR_AUTO_BUILD", "0") == "1"
+BOOKS_SIMILAR_DIM = int(os.getenv("BOOKS_SIMILAR_DIM", "128"))  # columns per book; applies from the next rebuild
+BOOKS_SIMILAR_MIN_SCORE = float(os.getenv("BOOKS_SIMILAR_MIN_SCORE", "0.05"))  # cosine below this isn't "similar"
+BOOKS_AI_MATCH = os.getenv("BOOKS_AI_MATCH", "search")  # similar = rank AI suggestions with the index instead
+
+# Delta sync (books/sync.py): deletes are remembered this long; resume cursors lag by a few seconds
+BOOKS_TOMBSTONE_RETENTION_DAYS = int(os.getenv("BOOKS_TOMBSTONE_RETENTION_DAYS", "90"))
+BOOKS_SYNC_LAG_SECONDS = int(os.getenv("BOOKS_SYNC_LAG_SECONDS", "5"))
+
+# Live feed (books/feed.py, ASGI only). Broker: empty = Redis pub/sub with REDIS_URL, else in-process
+BOOKS_FEED_BROKER = os.getenv("BOOKS_FEED_BROKER", "")
+BOOKS_FEED_MAX_SUBSCRIBERS = int(os.getenv("BOOKS_FEED_MAX_SUBSCRIBERS", "1000"))  # per process
+BOOKS_FEED_BUFFER = int(os.getenv("BOOKS_FEED_BUFFER", "100"))  # queued events per subscriber
+BOOKS_FEED_HEARTBEAT = int(os.getenv("BOOKS_FEED_HEARTBEAT", "15"))  # seconds between SSE pings
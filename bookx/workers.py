@@ -0,0 +1,12 @@
+"""gunicorn worker serving bookx.asgi (GUNICORN_WORKER_CLASS=uvicorn in gunicorn.conf.py)."""
+from uvicorn.workers import UvicornWorker as _UvicornWorker
+
+
+class UvicornWorker(_UvicornWorker):
+    # Django has no lifespan support; "auto" would log a failed probe on every boot
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto", "lifespan": "off"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the stock worker ignores graceful_timeout: open feed streams would hold shutdown until SIGKILL
+        self.config.timeout_graceful_shutdown = max(self.cfg.graceful_timeout - 1, 1)
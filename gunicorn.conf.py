@@ -0,0 +1,82 @@
+"""gunicorn settings; `gunicorn` with no arguments (the Procfile's web process) loads this file.
+
+Tuned from the environment:
+
+    WEB_CONCURRENCY            worker processes (default 2 x CPUs + 1, at most 8)
+    GUNICORN_WORKER_CLASS      gthread (default, bookx.wsgi) or uvicorn (bookx.asgi: async AI
+                               view and the live feed); any other gunicorn worker class is passed on
+    GUNICORN_THREADS           threads per gthread worker (default 4)
+    GUNICORN_TIMEOUT           seconds a silent worker lives before it is replaced (default 30)
+    GUNICORN_GRACEFUL_TIMEOUT  seconds in-flight requests get after SIGTERM (default 25)
+    GUNICORN_KEEPALIVE         idle keep-alive seconds (default 5; keep above the proxy's)
+    GUNICORN_MAX_REQUESTS      recycle a worker after this many requests, 0 = never (default)
+    GUNICORN_PRELOAD           1 = import Django once in the master, then fork (default)
+"""
+import gc
+import os
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_worker = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+_asgi = _worker == "uvicorn"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+wsgi_app = "bookx.asgi:application" if _asgi else "bookx.wsgi:application"
+worker_class = "bookx.workers.UvicornWorker" if _asgi else _worker
+workers = _env_int("WEB_CONCURRENCY", min(2 * _cpus() + 1, 8))
+threads = _env_int("GUNICORN_THREADS", 4)
+
+# shared, read-only pages after fork: faster worker start and restarts, less memory per worker
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 25)  # under the usual 30s SIGKILL of PaaS stops
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 0)
+max_requests_jitter = max_requests // 10
+
+# worker heartbeats on tmpfs; a slow disk can otherwise make healthy workers look hung
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    # move the preloaded objects out of the collector's reach, so GC passes in the
+    # workers don't write to (and so copy) the pages they share with the master
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # nothing opened while preloading in the master may be shared by the workers
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    # with BOOKS_SIMILAR_AUTO_BUILD=1, a host without a similarity index (local disk, see books.similar)
+    # starts building it now rather than on the first request that needs it. One worker builds, the others skip.
+    from books.similar import start_build
+
+    start_build()
+
+
+def worker_exit(server, worker):
+    # let queued background jobs (image variants, tombstone pruning) finish within the grace period
+    from books.tasks import drain
+
+    if not drain(timeout=max(graceful_timeout - 5, 1)):
+        server.log.warning("worker %s exited with background jobs still queued", worker.pid)